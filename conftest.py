@@ -0,0 +1,18 @@
+"""
+Configuration for running the tests with pytest.
+"""
+
+import shutil
+import tempfile
+
+from flexx import config
+
+
+# Let the cache of generated JS live in a temporary dir, rather than
+# writing to the application data dir of the user.
+_js_cache_dir = tempfile.mkdtemp(prefix='flexx_jscache_')
+config.js_cache_dir = _js_cache_dir
+
+
+def pytest_unconfigure():
+    shutil.rmtree(_js_cache_dir, ignore_errors=True)
@@ -101,6 +101,23 @@ class CLI:
         except FetchError:
             print('There appears to be no local server at port %i' % port)
 
+    def cmd_prebuild(self, *module_names):
+        """ generate the JS for the apps in the given modules in parallel,
+        and store it in the JS cache, so that serving these apps starts
+        faster, e.g. flexx prebuild myapps.app1 myapps.app2
+        """
+        if not module_names:
+            return self.cmd_help('prebuild')
+        import importlib
+        from flexx import app, config
+        if not config.js_cache:
+            print('The JS cache is disabled; nothing to store the JS in.')
+            return
+        for module_name in module_names:
+            importlib.import_module(module_name)
+        app.assets.prebuild()
+        print('prebuilt %i modules' % len(app.assets.modules))
+
     def cmd_log(self, port=None, level='info'):
         """ Start listening to log messages from a server process - STUB
         flexx log port level
@@ -14,9 +14,78 @@ config = Config('flexx', '~appdata/.flexx.cfg',
                         'values to pass cross-origin checks.'),
         ws_timeout=(20, int, 'If the websocket is idle for this amount of seconds, '
                  'it is closed.'),
+        ws_batch=(False, bool, 'Whether to combine the commands that are send '
+                  'to the client in one event loop iteration into a single '
+                  'websocket message. Property values that are superseded '
+                  'within such a message are not send.'),
+        ws_batch_size=(1000, int, 'The maximum number of commands in a '
+                       'batched websocket message.'),
+        ws_batch_latency=(0.0, float, 'The maximum time in seconds that batched '
+                          'commands are held back. Zero means until the end '
+                          'of the current event loop iteration.'),
+        ws_delta=(False, bool, 'Whether setting a dict or list property of '
+                  'a JsComponent from Python sends only the changes with '
+                  'respect to the value that was previously send. Assumes '
+                  'that the property is not also mutated in JS.'),
+        ws_chunk_size=(1048576, int, 'Websocket messages larger than this '
+                       'number of bytes are send in chunks, so that a large '
+                       'message does not block other traffic. Zero means no '
+                       'chunking.'),
+        ws_max_message_size=(10485760, int, 'The maximum size in bytes of a '
+                             'websocket message from a client, also when it '
+                             'is send in chunks. The connection is closed '
+                             'when a client sends a larger message.'),
+        ws_high_watermark=(16777216, int, 'When this number of bytes is waiting '
+                           'to be send to a client, it is considered congested.'),
+        ws_low_watermark=(4194304, int, 'Session.co_send_ready() waits until '
+                          'the number of bytes waiting to be send to the client '
+                          'is below this value.'),
+        ws_congestion_policy=('drop', str, 'What to do when a client is '
+                              'congested: "drop" holds back commands and drops '
+                              'superseded property values, "block" holds back '
+                              'commands (producers should use '
+                              'Session.co_send_ready()), and "disconnect" '
+                              'closes the connection.'),
+        ws_max_queue_size=(67108864, int, 'The maximum number of bytes that '
+                           'can be waiting to be send to a client. When a '
+                           'client lags this much behind, the connection is '
+                           'closed, regardless of ws_congestion_policy.'),
+        ws_decode_threshold=(0, int, 'Websocket messages of at least this '
+                             'number of bytes are decoded in a worker thread, '
+                             'so that the server stays responsive. Zero means '
+                             'that messages are always decoded on the IO loop.'),
+        ws_decode_workers=(2, int, 'The number of worker threads to decode '
+                           'large websocket messages.'),
+        session_threads=(0, int, 'The number of worker threads that run the '
+                         'event loops of sessions (each session is assigned to '
+                         'one). Zero means that all sessions run in the main '
+                         'event loop.'),
+        ws_compression=(False, bool, 'Whether to compress websocket messages '
+                        'using the permessage-deflate extension (if the browser '
+                        'supports it).'),
+        ws_blob_compression=(0, int, 'Binary blobs (e.g. numpy arrays) of at '
+                             'least this number of bytes are zlib-compressed '
+                             'when send to the client. Zero means no compression. '
+                             'Not useful when ws_compression is set.'),
         ssl_certfile=('', str, 'The cert file for https server.'),
         ssl_keyfile=('', str, 'The key file for https server.'),
         cookie_secret=('flexx_secret', str, 'The secret key to encode cookies.'),
+        js_cache=(True, bool, 'Whether to store the JavaScript that PScript '
+                  'generates for Component classes and PScript modules in a '
+                  'cache on disk (in the application data dir), so that it '
+                  'is not regenerated at the next start.'),
+        js_cache_size=(50, int, 'The maximum size of the JavaScript cache in '
+                       'MB. The least recently used entries are removed when '
+                       'the cache becomes larger.'),
+        js_cache_dir=('', str, 'The directory of the JavaScript cache. By '
+                      'default a directory in the application data dir.'),
+        asset_cache=(True, bool, 'Whether the browser stores the JavaScript '
+                     'and CSS that is pushed to it (in IndexedDB, by content '
+                     'hash), so that it is not send again in later sessions.'),
+        minify=(False, bool, 'Whether to minify the JavaScript bundles that '
+                'are served to the client (removing whitespace and comments, '
+                'and renaming local variables). A source map is served along, '
+                'so that the original code can be inspected in the browser.'),
 
         # flexx.webruntime
         webruntime=('', str, 'The default web runtime to use. '
@@ -20,6 +20,8 @@ Overview of classes:
 * SessionAssets: base class for Session that implements the assets/data part.
 * Session: object that handles connection between Python and JS. Has a
   websocket, and optionally a reference to the runtime.
+* LoopThread: a worker thread with its own event loop, in which sessions
+  can run (see config.session_threads).
 * WebSocket: tornado WS handler.
 * AppManager: keeps track of what apps are registered. Has functionality
   to instantiate apps and connect the websocket to them.
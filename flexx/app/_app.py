@@ -17,6 +17,7 @@ from .. import config, event
 from ._component2 import PyComponent, JsComponent
 from ._server import current_server
 from ._session import Session, get_page_for_export
+from ._threads import get_session_thread
 from ._assetstore import assets
 from . import logger
 
@@ -31,7 +32,7 @@ class ExporterWebSocketDummy:
     def __init__(self):
         self.commands = []
 
-    def write_command(self, cmd):
+    def write_command(self, cmd, key=None):
         self.commands.append(cmd)
 
 
@@ -115,7 +116,7 @@ class App:
         """
         return self._path or '__main__'
 
-    def serve(self, name=None):
+    def serve(self, name=None, prebuild=False):
         """ Start serving this app.
 
         This registers the given class with the internal app manager. The
@@ -125,6 +126,10 @@ class App:
             name (str, optional): the relative URL path to serve the app on.
                 If this is ``''`` (the empty string), this will be the main app.
                 If not given or None, the name of the component class is used.
+            prebuild (bool): if True, generate the JS for all known component
+                classes in parallel worker processes, and build all modules
+                (see ``AssetStore.prebuild()``). Useful when serving many apps;
+                pass it for the last app that is served. Default False.
         """
         # Note: this talks to the manager; it has nothing to do with the server
         if self._is_served:
@@ -133,6 +138,20 @@ class App:
             self._path = name
         manager.register_app(self)
         self._is_served = True
+        if prebuild:
+            assets.prebuild()
+
+    def prewarm(self, background=True):
+        """ Generate the JS and CSS for the module that defines this app's
+        component class, and the modules that it depends on. This is
+        otherwise done when the first session of this app needs it.
+
+        Arguments:
+            background (bool): whether to do this in a background thread
+                (the default), so that e.g. the server can start meanwhile.
+                In this case the thread is returned.
+        """
+        return assets.prewarm(self.cls.__jsmodule__, background=background)
 
     def launch(self, runtime=None, **runtime_kwargs):
         """ Launch this app as a desktop app in the given runtime.
@@ -424,7 +443,7 @@ class App:
             os.chdir(ori_dir)
         # Copy modules
         appdir = os.path.join(dirname, distdir, name)
-        assets.update_modules()
+        assets.prewarm()  # resolve all dependencies
         for module_name in {x.split(".")[0] for x in assets.modules.keys()}:
             if module_name == "__main__":
                 fname = os.path.join(appdir, "source", main_module + ".py")
@@ -577,7 +596,12 @@ class AppManager(event.Component):
         self._session_map[session.id] = session
         # Instantiate the component
         # This represents the "instance" of the App object (Component class + args)
-        app(flx_session=session, flx_is_app=True)
+        thread = get_session_thread(session)
+        if thread is None:
+            app(flx_session=session, flx_is_app=True)
+        else:
+            session._thread = thread  # the components live in this thread
+            thread.call_sync(app, flx_session=session, flx_is_app=True)
 
         # Now wait for the client to connect. The client will be served
         # a page that contains the session_id. Upon connecting, the id
@@ -587,8 +611,11 @@ class AppManager(event.Component):
         logger.debug('Instantiate app client %s' % session.app_name)
         return session
 
-    def connect_client(self, ws, name, session_id, cookies=None):
+    def connect_client(self, ws, name, session_id, cookies=None,
+                       client_assets=()):
         """ Connect a client to a session that was previously created.
+        The client_assets are the hashes of the assets that the client has
+        cached.
         """
         _, pending, connected = self._appinfo[name]
         # Search for the session with the specific id
@@ -605,7 +632,7 @@ class AppManager(event.Component):
         assert session.status == Session.STATUS.PENDING
         logger.info('New session %s %s' % (name, session_id))
         session._set_cookies(cookies)
-        session._set_ws(ws)
+        session._set_ws(ws, client_assets)
         connected.append(session)
         AppManager.total_sessions += 1
         self.connections_changed(session.app_name)
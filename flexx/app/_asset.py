@@ -73,10 +73,6 @@ def solve_dependencies(things, warn_missing=False):
                 break  # no changes, move to next index
     return [thingmap[name] for name in names]
 
-# todo: We could do (basic) minification of the JS
-# but it will make the code less readable, so better do this after we've
-# source maps.
-
 
 class Asset:
     """ Class to represent an asset (JS or CSS) to be included on the page.
@@ -218,7 +214,6 @@ class Bundle(Asset):
         self._assets = []
         self._module_name = name.rsplit('.', 1)[0].split('-')[0]
         self._modules = []
-        self._deps = set()
         self._need_sort = False
 
     def __repr__(self):
@@ -243,8 +238,6 @@ class Bundle(Asset):
         bundles, so that bundles themselves can be sorted.
         """
 
-        ext = '.' + self.name.rsplit('.')[-1].lower()
-
         # Check if module belongs here
         if not m.name.startswith(self._module_name):
             raise ValueError('Module %s does not belong in bundle %s.' %
@@ -254,20 +247,6 @@ class Bundle(Asset):
         self._modules.append(m)
         self._need_sort = True
 
-        # Add deps for this module
-        deps = set()
-        for dep in m.deps:
-            while '.' in dep:
-                deps.add(dep)
-                dep = dep.rsplit('.', 1)[0]
-            deps.add(dep)
-
-        # Clear deps that are represented by this bundle
-        for dep in deps:
-            if not (dep.startswith(self._module_name) or
-                    self._module_name.startswith(dep + '.')):
-                self._deps.add(dep + ext)
-
     @property
     def assets(self):
         """ The list of assets in this bundle (excluding modules).
@@ -286,8 +265,24 @@ class Bundle(Asset):
     @property
     def deps(self):
         """ The set of dependencies for this bundle, expressed in module names.
+        Determined lazily, since the dependencies of a module are only known
+        once its JS is generated.
         """
-        return self._deps
+        ext = '.' + self.name.rsplit('.')[-1].lower()
+
+        # Collect deps of the modules
+        deps = set()
+        for m in self._modules:
+            for dep in m.deps:
+                while '.' in dep:
+                    deps.add(dep)
+                    dep = dep.rsplit('.', 1)[0]
+                deps.add(dep)
+
+        # Clear deps that are represented by this bundle
+        return set(dep + ext for dep in deps
+                   if not (dep.startswith(self._module_name) or
+                           self._module_name.startswith(dep + '.')))
 
     def to_string(self):
         # Concatenate code strings and add TOC. Module objects do/cache the work.
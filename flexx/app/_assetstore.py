@@ -4,18 +4,35 @@ is to provide the assets (JavaScript and CSS files) and data (images,
 etc.) needed by the applications.
 """
 
+import os
+import gzip
+import json
+import hashlib
+import threading
+import multiprocessing
+
 from pscript import create_js_module, get_all_std_names, get_full_std_lib
 from pscript.stdlib import FUNCTION_PREFIX, METHOD_PREFIX
 
+from .. import config
 from ..event import _property
 from ..event._js import JS_EVENT
 from ..util.getresource import get_resoure_path
+from ..util.minify import minify_with_source_map
 
-from ._component2 import AppComponentMeta
+from ._component2 import AppComponentMeta, _js_codes
 from ._asset import Asset, Bundle, HEADER
-from ._modules import JSModule
+from ._modules import JSModule, jsmodule_lock
 from . import logger
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# The encodings that get_asset_bytes() supports, in order of preference
+COMPRESSIONS = ('br', 'gzip') if brotli else ('gzip', )
+
 
 INDEX = """
 <!doctype html>
@@ -189,6 +206,8 @@ class AssetStore:
         self._associated_assets = {}
         self._data = {}
         self._used_assets = set()  # between all sessions (for dump)
+        self._asset_cache = {}  # name -> dict with source bytes, hash, etc.
+        self._minify_cache = {}  # name -> (hash, minified, source map)
 
         # Create asset to reset CSS
         asset_reset = Asset('reset.css', RESET)
@@ -229,7 +248,10 @@ class AssetStore:
             return
 
         # Create flexx-core bootstrap bundle
-        self.update_modules()  # to collect _component2 and _clientcore
+        self.update_modules()  # to collect _component2
+        if 'flexx.app._clientcore' not in self._modules:  # dep of _component2
+            JSModule('flexx.app._clientcore', self._modules)
+            self.update_modules()
         asset_core = Bundle('flexx-core.js')
         asset_core.add_asset(asset_loader)
         asset_core.add_asset(asset_bsdf)
@@ -265,11 +287,15 @@ class AssetStore:
         It is safe (and pretty fast) to call this more than once since
         only missing modules are added. This gets called automatically
         by the Session object.
+
+        Note that the JS of the modules is not generated here, but when it
+        is first needed. Since dependencies can drag in more modules, this
+        should be called again after resolving the dependencies of a module.
         """
+        with jsmodule_lock:
+            self._update_modules()
 
-        # Dependencies can drag in more modules, therefore we store
-        # what modules we know of beforehand.
-        current_module_names = set(self._modules)
+    def _update_modules(self):
 
         # Track all known (i.e. imported) Component classes. We keep track
         # of what classes we've registered, so this is pretty efficient. This
@@ -277,14 +303,16 @@ class AssetStore:
         for cls in AppComponentMeta.CLASSES:
             if cls not in self._known_component_classes:
                 self._known_component_classes.add(cls)
+                self._asset_cache.clear()  # bundles may have changed
                 if cls.__jsmodule__ not in self._modules:
                     JSModule(cls.__jsmodule__, self._modules)  # auto-registers
-                self._modules[cls.__jsmodule__].add_variable(cls.__name__)
+                mod = self._modules[cls.__jsmodule__]
+                mod.add_variable(cls.__name__, lazy=True)  # JS is made when needed
 
         # Deal with new modules: store asset deps and bundle the modules
         mcount = 0
         bcount = 0
-        for name in set(self._modules).difference(current_module_names):
+        for name in [n for n in self._modules if n + '.js' not in self._assets]:
             mod = self.modules[name]
             mcount += 1
             # Get names of bundles to add this module to
@@ -303,8 +331,83 @@ class AssetStore:
                     self._assets[bundle_name].add_module(mod)
 
         if mcount:
+            self._asset_cache.clear()  # bundles have changed
             logger.info('Asset store collected %i new modules.' % mcount)
 
+    def prewarm(self, *module_names, background=False):
+        """ Generate the JS and CSS for the modules with the given names
+        and their dependencies (or for all known modules if no names are
+        given), so that this work is not done when a session first needs
+        them. If ``background`` is True, this is done in a (daemon) thread,
+        which is returned.
+        """
+        if background:
+            t = threading.Thread(target=self.prewarm, args=module_names,
+                                 name='flexx-prewarm', daemon=True)
+            t.start()
+            return t
+
+        with jsmodule_lock:
+            self._update_modules()
+            for name in module_names:
+                if name not in self._modules:
+                    raise ValueError('Cannot prewarm unknown module %r.' % name)
+            todo = list(module_names or self._modules)
+            done = set()
+            while todo:
+                name = todo.pop(0)
+                if name in done or name not in self._modules:
+                    continue  # e.g. flexx.event.js, which is an asset
+                done.add(name)
+                mod = self._modules[name]
+                mod.get_js()
+                mod.get_css()
+                todo.extend(sorted(mod.deps))
+            self._update_modules()  # bundle modules found via dependencies
+
+    def prebuild(self, processes=None):
+        """ Generate the JS for all known component classes using a pool of
+        ``processes`` worker processes (default the number of CPUs), and
+        then build all modules and their bundles. Intended to be called at
+        startup, before serving, by deployments with many apps. The
+        generated JS is also stored in the JS cache (if enabled).
+
+        The workers are forked, so that they know the same classes. Since
+        forking a process in which other threads are running is not safe,
+        this must be called before any threads are started (e.g. by the
+        server or ``prewarm(background=True)``). Where forking is not
+        available, or when other threads are running, the JS is generated
+        in this process.
+        """
+        processes = processes or os.cpu_count() or 1
+        with jsmodule_lock:
+            self._update_modules()
+            classes = list(AppComponentMeta.CLASSES)
+            todo = [i for i, cls in enumerate(classes) if cls.JS not in _js_codes]
+        processes = min(processes, len(todo))
+        if processes > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            processes = 1
+        elif processes > 1 and threading.active_count() > 1:
+            logger.warning('AssetStore.prebuild() does not fork because other '
+                           'threads are running; call it before starting any.')
+            processes = 1
+        if processes > 1:
+            # Fork without holding the lock, so that the workers do not
+            # inherit it in a locked state.
+            chunks = [todo[i::processes] for i in range(processes)]
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(processes) as pool:
+                results = pool.map(_generate_js, chunks)
+            with jsmodule_lock:
+                for indices, codes in zip(chunks, results):
+                    for i, code in zip(indices, codes):
+                        if classes[i].JS not in _js_codes:
+                            classes[i].JS.CODE = code
+            logger.info('Generated JS for %i component classes in %i '
+                        'processes.' % (len(todo), processes))
+        # Resolve dependencies, build the modules, and bundle them
+        self.prewarm()
+
     def get_asset(self, name):
         """ Get the asset instance corresponding to the given name or None
         if it not known.
@@ -318,6 +421,70 @@ class AssetStore:
         self._used_assets.add(asset.name)
         return asset
 
+    def get_asset_hash(self, name):
+        """ Get a hash (str) of the current source of the asset with the
+        given name. Changes when the source changes, so that it can be
+        used in urls for assets that can be cached indefinitely.
+        """
+        return self._get_asset_cache(name)['hash']
+
+    def get_asset_bytes(self, name, encoding=None):
+        """ Get the source of the asset with the given name as bytes.
+        If encoding is given, it must be one of ``COMPRESSIONS`` ('gzip',
+        or 'br' if the brotli package is available). The result is cached.
+        """
+        cache = self._get_asset_cache(name)
+        if encoding is None:
+            return cache['source']
+        elif encoding not in COMPRESSIONS:
+            raise ValueError('Unsupported asset encoding %r' % encoding)
+        if encoding not in cache:
+            if encoding == 'br':
+                cache[encoding] = brotli.compress(cache['source'])
+            else:
+                cache[encoding] = gzip.compress(cache['source'], 9)
+        return cache[encoding]
+
+    def get_source_map(self, name):
+        """ Get the source map (as bytes) of the JS asset with the given
+        name, or None if the asset is not minified (see ``config.minify``).
+        """
+        return self._get_asset_cache(name).get('map', None)
+
+    def _get_asset_cache(self, name):
+        try:
+            return self._asset_cache[name]
+        except KeyError:
+            pass
+        # Assets are served from the IO thread, while sessions in other
+        # threads may be adding modules to the bundles, see update_modules().
+        with jsmodule_lock:
+            asset = self.get_asset(name)
+            source = asset.to_string().encode()
+            hash = hashlib.sha256(source).hexdigest()[:16]
+            cache = dict(source=source, hash=hash)
+            if (config.minify and isinstance(asset, Bundle) and
+                    name.endswith('.js')):
+                cache['source'], cache['map'] = self._minify(name, source, hash)
+                hash = hashlib.sha256(cache['source']).hexdigest()[:16]
+                cache['hash'] = hash
+            self._asset_cache[name] = cache
+            return cache
+
+    def _minify(self, name, source, hash):
+        # Minifying takes a while, so keep the result for as long as the
+        # bundle does not change, also when the asset cache is cleared.
+        entry = self._minify_cache.get(name, None)
+        if entry is None or entry[0] != hash:
+            code, source_map = minify_with_source_map(
+                source.decode(), name, source_name=name[:-3] + '.src.js')
+            code += '\n//# sourceMappingURL=%s.map\n' % name
+            entry = hash, code.encode(), json.dumps(source_map).encode()
+            self._minify_cache[name] = entry
+            logger.debug('Minified %s from %i to %i bytes' %
+                         (name, len(source), len(entry[1])))
+        return entry[1:]
+
     def get_data(self, name):
         """ Get the data (as bytes) corresponding to the given name or None
         if it not known.
@@ -460,5 +627,13 @@ class AssetStore:
         return d
 
 
+def _generate_js(indices):
+    """ Generate the JS for the component classes at the given indices in
+    AppComponentMeta.CLASSES. Runs in a worker process of prebuild().
+    """
+    classes = AppComponentMeta.CLASSES
+    return [classes[i].JS.CODE for i in indices]
+
+
 # Our singleton asset store
 assets = AssetStore()
@@ -228,6 +228,13 @@ class JsSession:
         self._pending_commands = []  # to pend raw commands during init
         self._asset_count = 0
         self._ws = None
+        self._send_queue = []  # encoded messages that wait for a chunked message
+        self._chunks = None  # to reassemble a chunked message
+        self._chunk_size = 1048576  # larger messages are send in chunks
+        self._asset_db = None  # IndexedDB database to cache assets in
+        self._cached_assets = {}  # hash -> entry with name, code and time
+        self._missing_assets = {}  # names of assets requested from the server
+        self._held_commands = None  # commands that wait for missing assets
         self.last_msg = None
         # self.classes = {}
         self.instances = {}
@@ -257,7 +264,51 @@ class JsSession:
                 print('Command that failed to encode:')
                 print(command)
                 raise err
-            self._ws.send(bb)
+            if len(self._send_queue) > 0 or bb.byteLength > self._chunk_size:
+                self._send_queue.push(bb)
+                if len(self._send_queue) == 1:
+                    self._send_queued()
+            else:
+                self._ws.send(bb)
+
+    def _send_queued(self):
+        """ Send the queued messages, splitting large ones into chunks. To not
+        flood the browser's send buffer, we wait when it is too full.
+        """
+        while len(self._send_queue) > 0:
+            if self._ws is None:
+                self._send_queue = []
+                return
+            elif self._ws.bufferedAmount > self._chunk_size:
+                window.setTimeout(self._send_queued, 10)
+                return
+            bb = self._send_queue.pop(0)
+            if bb.byteLength <= self._chunk_size:
+                self._ws.send(bb)
+            else:
+                # Split into chunks, which are send via the queue
+                chunks = []
+                for offset in range(0, bb.byteLength, self._chunk_size):
+                    n = min(self._chunk_size, bb.byteLength - offset)
+                    view = window.DataView(bb, offset, n)
+                    chunk = ['CHUNK', offset, bb.byteLength, view]
+                    chunks.push(serializer.encode(chunk))
+                self._send_queue = chunks.concat(self._send_queue)
+
+    def _receive_chunk(self, command):
+        """ Collect the chunks of a large message, and process the message
+        when it is complete.
+        """
+        offset, total, data = command[1], command[2], command[3]
+        if offset == 0:
+            self._chunks = window.Uint8Array(total)
+        self._chunks.set(window.Uint8Array(data.buffer, data.byteOffset,
+                                           data.byteLength),
+                         offset)
+        if offset + data.byteLength == total:
+            bb = self._chunks
+            self._chunks = None
+            self._receive_raw_command(bb)
 
     def instantiate_component(self, module, cname, id, args, kwargs, active_components):
         # Maybe we still have the instance?
@@ -329,9 +380,19 @@ class JsSession:
         ws.binaryType = "arraybuffer"
         self.status = 2
 
+        hi_sent = False
         def on_ws_open(evt):
             window.console.info('Socket opened with session id ' + self.id)
-            self.send_command('HI_FLEXX', self.id)
+            # Don't wait for the asset cache forever (e.g. when IndexedDB
+            # is blocked by another tab); just get all assets in that case.
+            window.setTimeout(on_asset_cache_open, 1000, [])
+            self._open_asset_cache(on_asset_cache_open)
+        def on_asset_cache_open(hashes):
+            nonlocal hi_sent
+            if hi_sent:
+                return
+            hi_sent = True
+            self.send_command('HI_FLEXX', self.id, hashes)
         def on_ws_message(evt):
             msg = evt.data  # bsdf-encoded command
             if not msg:
@@ -366,6 +427,70 @@ class JsSession:
         ws.onclose = on_ws_close
         ws.onerror = on_ws_error
 
+    def _open_asset_cache(self, callback):
+        """ Open the IndexedDB database in which the assets that the server
+        pushes are stored by their hash, load the assets, and call the
+        callback with the list of their hashes. Assets that have not been
+        used for a week are removed.
+        """
+        indexedDB = window.indexedDB
+        if not indexedDB:
+            return callback([])
+        try:
+            request = indexedDB.open('flexx-assets', 1)
+        except Exception:  # e.g. in a sandboxed iframe
+            return callback([])
+
+        def on_upgrade(evt):
+            evt.target.result.createObjectStore('assets', {'keyPath': 'hash'})
+        def on_error(evt):
+            window.console.warn('Could not load the asset cache.')
+            self._asset_db = None
+            self._cached_assets = {}
+            callback([])
+        def on_open(evt):
+            self._asset_db = evt.target.result
+            transaction = self._asset_db.transaction('assets', 'readwrite')
+            cursor_request = transaction.objectStore('assets').openCursor()
+            cursor_request.onsuccess = on_cursor
+            cursor_request.onerror = on_error
+        def on_cursor(evt):
+            cursor = evt.target.result
+            if not cursor:
+                return callback(self._cached_assets.keys())
+            entry = cursor.value
+            if time() - entry.time > 604800:
+                cursor.delete()
+            else:
+                self._cached_assets[entry.hash] = entry
+            cursor['continue']()
+
+        request.onupgradeneeded = on_upgrade
+        request.onsuccess = on_open
+        request.onerror = on_error
+
+    def _store_asset(self, name, hash, code):
+        """ Store an asset in the cache, replacing other versions of it.
+        Assets that are already stored only get their time updated, once
+        per day.
+        """
+        entry = self._cached_assets.get(hash, None)
+        if self._asset_db is None or (entry and time() - entry.time < 86400):
+            return
+        entry = {'hash': hash, 'name': name, 'code': code, 'time': time()}
+        old_hashes = [key for key, other in self._cached_assets.items()
+                      if other.name == name and key != hash]
+        try:
+            transaction = self._asset_db.transaction('assets', 'readwrite')
+            store = transaction.objectStore('assets')
+            for key in old_hashes:
+                store.delete(key)
+                self._cached_assets.pop(key)
+            store.put(entry)
+        except Exception as err:  # e.g. quota exceeded
+            window.console.warn('Could not cache asset %s: %s' % (name, err))
+        self._cached_assets[hash] = entry
+
     def _process_commands(self):
         """ A less direct way to process commands, which gives the
         browser time to draw about every other JS asset. This is a
@@ -392,9 +517,29 @@ class JsSession:
         """ Process a command send from the server.
         """
         cmd = command[0]
+        if self._held_commands is not None and cmd != 'CHUNK':
+            # Wait for the missing assets to arrive, keeping the order
+            if cmd == 'BATCH':
+                for subcommand in command[1]:
+                    self._receive_command(subcommand)
+            elif cmd == 'DEFINE' and command[2] in self._missing_assets:
+                self._missing_assets.pop(command[2])
+                self._held_commands.insert(0, command)  # before the others
+                if len(self._missing_assets.keys()) == 0:
+                    self._release_held_commands()
+            else:
+                self._held_commands.push(command)
+            return command
         if cmd == 'PING':
             # Used for roundtrip stuff, do at least one iter loop here ...
             window.setTimeout(self.send_command, 10, 'PONG', command[1])
+        elif cmd == 'BATCH':
+            # Multiple commands that the server combined into one message
+            for subcommand in command[1]:
+                self._receive_command(subcommand)
+        elif cmd == 'CHUNK':
+            # Part of a large message
+            self._receive_chunk(command)
         elif cmd == 'INIT_DONE':
             window.flexx.spin(None)
             while len(self._pending_commands):
@@ -442,7 +587,19 @@ class JsSession:
             self.instances.pop(command[1], None)  # Drop reference
         elif cmd == 'DEFINE':
             #and command[1] == 'JS' or command[1] == 'DEFINE-JS-EVAL '):
-            kind, name, code = command[1:]
+            kind, name, code, hash = command[1:]
+            # The server omits the code if we have the asset in our cache.
+            # If it got lost from the cache, ask the server to send it again.
+            if code is None:
+                if hash not in self._cached_assets:
+                    window.console.warn('Asset %s missing from cache.' % name)
+                    self._missing_assets[name] = True
+                    self._held_commands = []
+                    self.send_command('ASSET_MISSING', name, hash)
+                    return command
+                code = self._cached_assets[hash].code
+            if hash:
+                self._store_asset(name, hash, code)
             window.flexx.spin()
             address = window.location.protocol + '//' + self.ws_url.split('/')[2]
             code += '\n//# sourceURL=%s/flexx/assets/shared/%s\n' % (address, name)
@@ -472,6 +629,20 @@ class JsSession:
             window.console.error('Invalid command: "' + cmd + '"')
         return command
 
+    def _release_held_commands(self):
+        """ Process the commands that were held back while waiting for
+        missing assets. If another asset turns out to be missing, the
+        remaining commands are held back again.
+        """
+        commands = self._held_commands
+        self._held_commands = None
+        while len(commands):
+            command = commands.pop(0)
+            if self._held_commands is not None:
+                self._held_commands.push(command)
+            else:
+                self._receive_command(command)
+
     def call_after_roundtrip(self, callback, *args):
         ping_to_schedule_at = self._ping_counter + 1
         if len(self._ping_calls) == 0 or self._ping_calls[-1][0] < ping_to_schedule_at:
@@ -5,12 +5,13 @@ PyComponent and JsComponent classes (and their proxies).
 """
 
 import sys
+import threading
 
 from pscript import window, JSString, this_is_js
 
 from .. import event
 
-from ..event import Component, loop, Dict
+from ..event import Component, Dict
 from ..event._component import (with_metaclass, ComponentMeta)
 
 from ..event._property import Property
@@ -19,6 +20,7 @@ from ..event._action import ActionDescriptor
 from ..event._js import create_js_component_class
 
 from ._asset import get_mod_name
+from ._jscache import jscache, get_class_key
 from . import logger
 
 
@@ -32,6 +34,13 @@ from ._clientcore import serializer, bsdf
 
 manager = None  # Set by __init__ to prevent circular dependencies
 
+# The JS for a component class is generated when it is first needed (see
+# ComponentMetaJS.CODE). These map JS classes to their Python class, and to
+# their generated code.
+_js_class_owners = {}
+_js_codes = {}
+_js_lock = threading.RLock()
+
 
 def make_proxy_action(action):
     # Note: the flx_prefixes are picked up by the code in flexx.event that
@@ -98,6 +107,33 @@ class ComponentMetaJS(ComponentMeta):
         name = name.encode() if sys.version_info[0] == 2 else name
         return super().__init__(name, *args)
 
+    @property
+    def CODE(cls):
+        """ The JS code for this class (a JSString with meta info). It is
+        generated (or obtained from the JS cache) on first use, so that
+        component classes that are never used in a session cost nothing.
+        """
+        try:
+            return _js_codes[cls]
+        except KeyError:
+            pass
+        with _js_lock:  # generate only once, also with multiple threads
+            if cls not in _js_codes:
+                try:
+                    owner = _js_class_owners[cls]
+                except KeyError:
+                    raise AttributeError('CODE')
+                _js_codes[cls] = owner._get_js()
+            return _js_codes[cls]
+
+    @CODE.setter
+    def CODE(cls, code):
+        _js_codes[cls] = code
+
+    @CODE.deleter
+    def CODE(cls):
+        _js_codes.pop(cls, None)  # will be re-generated when needed
+
 
 class AppComponentMeta(ComponentMeta):
     """ Meta class for PyComponent and JsComponent
@@ -148,9 +184,14 @@ class AppComponentMeta(ComponentMeta):
         else:
             cls.JS.__proxy_properties__ = cls.__properties__
             cls.__emitters__ = cls.JS.__emitters__
+            # Keep track of the autogenerated setter actions, so that
+            # superseded values do not have to be send to JS
+            cls.__proxy_setters__ = [name for name in cls.JS.__actions__
+                                     if getattr(cls.JS, name)._func.__name__ ==
+                                     'flx_setter']
 
-        # Set JS on the JS class
-        cls.JS.CODE = cls._get_js()
+        # Make the JS class generate its code when needed (via cls.JS.CODE)
+        _js_class_owners[cls.JS] = cls
 
         # Register this class. The classes in this list will be automatically
         # "pushed to JS" in a JIT fashion. We have to make sure that we include
@@ -236,12 +277,24 @@ class AppComponentMeta(ComponentMeta):
 
     def _get_js(cls):
         """ Get source code for this class plus the meta info about the code.
+        The code is obtained from the JS cache if possible.
         """
         # Since classes are defined in a module, we can safely name the classes
         # by their plain name.
         cls_name = cls.__name__
         base_class = cls.JS.mro()[1]
         base_class_name = '%s.prototype' % base_class.__name__
+        key = get_class_key(cls.JS, cls_name, base_class_name)
+        js = None if key is None else jscache.get(key)
+        if js is None:
+            js = cls._create_js(cls_name, base_class_name)
+            if key is not None:
+                jscache.set(key, js)
+        return js
+
+    def _create_js(cls, cls_name, base_class_name):
+        """ Generate the source code for this class.
+        """
         code = []
 
         # Add this class
@@ -326,7 +379,8 @@ class BaseAppComponent(Component):
         if session is not None:
             self._session = session
         else:
-            active = loop.get_active_components()  # Note that self is active too
+            # Note that self is active too
+            active = self._flx_loop.get_active_components()
             active = active[-2] if len(active) > 1 else None
             if active is not None:
                 self._session = active._session
@@ -337,6 +391,11 @@ class BaseAppComponent(Component):
         # Register this component with the session (sets _id and _uid)
         if self._session is None:
             raise RuntimeError('%s needs a session!' % (custom_id or self._id))
+        if not this_is_js():
+            thread = getattr(self._session, '_thread', None)
+            if thread is not None and not thread.is_current():
+                raise RuntimeError('%s must be instantiated in the thread of '
+                                   'its session.' % (custom_id or self._id))
         self._session._register_component(self, custom_id)
         self._root = self._session.app
 
@@ -408,12 +467,20 @@ class LocalComponent(BaseAppComponent):
                                            self._id, [], props)
                 self._has_proxy = True
 
-    def emit(self, type, info=None):
-        # Overload emit() to send events to the proxy object at the other end
-        ev = super().emit(type, info)
+    def _comp_dispatch_event(self, ev):
+        # Overload to send events to the proxy object at the other end
+        super()._comp_dispatch_event(ev)
         if self._has_proxy is True and self._session.status > 0:
             # implicit: and self._disposed is False:
+            type = ev.type
             if type in self.__proxy_properties__:
+                if 'removed' in ev:
+                    # The proxy knows which items are removed by a mutation
+                    ev2 = {}
+                    for key in ev.keys():
+                        if key != 'removed':
+                            ev2[key] = ev[key]
+                    ev = ev2
                 self._session.send_command('INVOKE', self._id, '_emit_at_proxy', [ev])
             elif type in self.__event_types_at_proxy:
                 self._session.send_command('INVOKE', self._id, '_emit_at_proxy', [ev])
@@ -478,8 +545,9 @@ class ProxyComponent(BaseAppComponent):
             # Instantiate JavaScript version of this class
             if local_inst is True:  # i.e. only if Python "instantiated" it
                 property_values['flx_has_proxy'] = True
-                active_components = [c for c in loop.get_active_components()[:-1]
-                                     if isinstance(c, (PyComponent, JsComponent))]
+                active_components = [
+                    c for c in self._flx_loop.get_active_components()[:-1]
+                    if isinstance(c, (PyComponent, JsComponent))]
                 self._session.send_command('INSTANTIATE', self.__jsmodule__,
                                            self.__class__.__name__, self._id,
                                            self._flx_init_args, property_values,
@@ -496,7 +564,12 @@ class ProxyComponent(BaseAppComponent):
         """
         assert not kwargs
         # if self._session.status > 0, mmm, or rather error?
-        self._session.send_command('INVOKE', self._id, name, args)
+        if this_is_js():
+            self._session.send_command('INVOKE', self._id, name, args)
+        elif name in self.__proxy_setters__:
+            self._session._send_set_command(self._id, name, args)
+        else:
+            self._session.send_command('INVOKE', self._id, name, args)
 
     def _proxy_emitter(self, name, *args, **kwargs):
         """ To handle use of placeholder emitters.
@@ -631,6 +704,20 @@ class JsComponent(with_metaclass(AppComponentMeta, ProxyComponent)):
         node.addEventListener(type, callback, capture)
         self._event_listeners.push((node, type, callback, capture))
 
+    def _flx_apply_mutations(self, prop_name, mutations):
+        """ Apply a series of partial mutations to a dict or list property,
+        so that a large value does not have to be send in full each time
+        that it changes. Invoked from Python; it is not an action, so that
+        it is not available on the Python side. The mutations are applied
+        in the same way as an action, i.e. in order with pending actions.
+        """
+        def flx_apply_mutations():
+            for mutation in mutations:
+                self._mutate(prop_name, mutation[1], mutation[0], mutation[2])
+        flx_apply_mutations._name = '_flx_apply_mutations'  # for the profiler
+        flx_apply_mutations._ob1 = lambda: self
+        self._flx_loop.add_action_invokation(flx_apply_mutations, [])
+
     def _dispose(self):
         super()._dispose()
         while len(self._event_listeners) > 0:
@@ -21,7 +21,7 @@ reprs = json.dumps
 ## Main loop functions
 
 
-def start():
+def start(workers=None):
     """
     Start the server and event loop. This function generally does not
     return until the application is stopped (although it may in
@@ -29,8 +29,21 @@ def start():
 
     In more detail, this calls ``run_forever()`` on the asyncio event loop
     associated with the current server.
+
+    Arguments:
+        workers (int, optional): if larger than one, serve from this
+            number of processes (Unix only), see ``AbstractServer.fork()``.
+            Each session lives in one process, so this helps when there
+            are many sessions, but sessions cannot share state via Python.
+            Note that the client connects its websocket directly to the
+            private port of the worker that holds its session, so these
+            ports must be reachable by the client; this does not work
+            behind a reverse proxy or firewall that only exposes the
+            main port.
     """
     server = current_server()
+    if workers and workers > 1:
+        server.fork(workers)
     server.start()
 
 
@@ -125,7 +138,7 @@ class NoteBookHelper:
             self._commands = []
             display(Javascript('\n'.join(lines)))
 
-    def write_command(self, cmd):
+    def write_command(self, cmd, key=None):
         assert isinstance(cmd, tuple) and len(cmd) >= 1
         self._commands.append(cmd)
 
@@ -0,0 +1,259 @@
+"""
+A persistent cache for the JavaScript that PScript generates for Component
+classes and PScript modules. Transpiling is by far the most expensive step
+of starting a Flexx app, but its result only changes when the Python source
+changes. Therefore the generated code (and its meta info) is stored on disk,
+in a directory under the application data dir.
+
+Entries are content-addressed: the key is a hash of the Python source
+files involved, the values that are embedded in the JS (e.g. property
+defaults), and a fingerprint of the implementation of Flexx and PScript
+(their versions, and the size and modification time of their source
+files). Thus entries are never stale; old entries are simply not used
+anymore, and are eventually evicted when the cache grows too large.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+
+import pscript
+from pscript import JSString
+
+from .. import config, __version__
+from ..util.config import appdata_dir
+from . import logger
+
+
+# The meta info of JSString objects that is stored, and which of it are sets
+META_KEYS = ('filename', 'linenr', 'vars_defined', 'vars_global',
+             'vars_unknown', 'std_functions', 'std_methods')
+META_SETS = ('vars_defined', 'vars_global', 'vars_unknown',
+             'std_functions', 'std_methods')
+
+
+class JSCache:
+    """ A cache of generated JS (JSString objects) on disk. Each entry is
+    a json file named after its key. Errors (e.g. a read-only file system)
+    are logged and then ignored, since the cache is only an optimization.
+    """
+
+    def __init__(self, dirname=None):
+        self._dirname = dirname
+        self._lock = threading.Lock()
+        self._file_hashes = {}  # (filename, mtime, size) -> hash
+        self._fingerprint = None
+        self._evicted = False
+
+    @property
+    def dirname(self):
+        """ The directory where the cache is stored. If not given on
+        instantiation, this is ``config.js_cache_dir``, or a directory in
+        the application data dir.
+        """
+        if self._dirname is not None:
+            return self._dirname
+        return config.js_cache_dir or os.path.join(appdata_dir(), 'flexx',
+                                                   'jscache')
+
+    def get_file_hash(self, filename):
+        """ Get a hash of the contents of the given file, or None if
+        the file cannot be read. Cached as long as the file does not change.
+        """
+        try:
+            st = os.stat(filename)
+        except (OSError, TypeError):
+            return None
+        key = filename, st.st_mtime_ns, st.st_size
+        hash = self._file_hashes.get(key, None)
+        if hash is None:
+            try:
+                with open(filename, 'rb') as f:
+                    hash = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                return None
+            self._file_hashes[key] = hash
+        return hash
+
+    def get_fingerprint(self):
+        """ Get a fingerprint of the implementation that generates the JS:
+        the Python version, Flexx and PScript versions, and the size and
+        modification time of their source files (for development installs).
+        """
+        if self._fingerprint is None:
+            parts = [sys.version, __version__, pscript.__version__]
+            flexx_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            pscript_dir = os.path.dirname(os.path.abspath(pscript.__file__))
+            dirs = (os.path.join(flexx_dir, 'event'),
+                    os.path.join(flexx_dir, 'app'),
+                    pscript_dir)
+            for dirname in dirs:
+                for fname in sorted(os.listdir(dirname)):
+                    if fname.endswith('.py'):
+                        st = os.stat(os.path.join(dirname, fname))
+                        parts.append('%s %i %i' % (fname, st.st_mtime_ns,
+                                                   st.st_size))
+            self._fingerprint = self.get_key(*parts)
+        return self._fingerprint
+
+    def get_key(self, *parts):
+        """ Get a key (str) from the given str parts.
+        """
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(part.encode())
+            h.update(b'\x00')
+        return h.hexdigest()[:32]
+
+    def get(self, key):
+        """ Get the JSString for the given key, or None if not cached.
+        """
+        if not config.js_cache:
+            return None
+        filename = os.path.join(self.dirname, key + '.json')
+        try:
+            with open(filename, 'rb') as f:
+                d = json.loads(f.read().decode())
+            code, meta = d['code'], d['meta']
+            os.utime(filename)  # keep track of when the entry was last used
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # not there, or corrupt (e.g. written by another version)
+        js = JSString(code)
+        js.meta = meta
+        for k in META_SETS:
+            if k in js.meta:
+                js.meta[k] = set(js.meta[k])
+        return js
+
+    def set(self, key, js):
+        """ Store the given JSString under the given key.
+        """
+        if not config.js_cache:
+            return
+        meta = {}
+        for k in META_KEYS:
+            if k in js.meta:
+                val = js.meta[k]
+                meta[k] = sorted(val) if k in META_SETS else val
+        data = json.dumps(dict(code=str(js), meta=meta)).encode()
+        filename = os.path.join(self.dirname, key + '.json')
+        tempname = '%s.%i.%i.tmp' % (filename, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.dirname, exist_ok=True)
+            with open(tempname, 'wb') as f:
+                f.write(data)
+            os.replace(tempname, filename)  # atomic
+        except OSError as err:
+            logger.debug('Could not write to JS cache: %s' % str(err))
+            return
+        # Evict once per process, not for every entry
+        if not self._evicted:
+            self._evicted = True
+            self.evict()
+
+    def evict(self, max_size=None):
+        """ Remove the least recently used entries until the total size of
+        the cache is below ``max_size`` (in MB), or ``config.js_cache_size``.
+        """
+        max_bytes = (config.js_cache_size if max_size is None else max_size) * 2**20
+        with self._lock:
+            try:
+                entries = []
+                for fname in os.listdir(self.dirname):
+                    filename = os.path.join(self.dirname, fname)
+                    st = os.stat(filename)
+                    if not fname.endswith('.tmp'):
+                        entries.append((st.st_mtime, st.st_size, filename))
+                    elif st.st_mtime < time.time() - 60:
+                        os.remove(filename)  # left behind by a crash
+                entries.sort()
+                total = sum(e[1] for e in entries)
+                for mtime, size, filename in entries:
+                    if total <= max_bytes:
+                        break
+                    os.remove(filename)
+                    total -= size
+            except OSError as err:
+                logger.debug('Could not evict JS cache entries: %s' % str(err))
+
+    def clear(self):
+        """ Remove all entries.
+        """
+        self.evict(0)
+
+
+jscache = JSCache()
+
+
+def get_module_key(mod):
+    """ Get the cache key for the JS of the given PScript module, or None
+    if the module's source is not available.
+    """
+    hash = jscache.get_file_hash(getattr(mod, '__file__', None))
+    if hash is None:
+        return None
+    return jscache.get_key('module', jscache.get_fingerprint(), mod.__name__, hash)
+
+
+def get_class_key(cls, *parts):
+    """ Get the cache key for the JS of the given Component class (i.e. the
+    JS variant of a PyComponent or JsComponent), or None if its source is
+    not available. The key includes the source of the modules that define
+    the class and its bases, and the values that end up in the JS.
+    """
+    from ..event import Property
+    parts = ['class', jscache.get_fingerprint()] + list(parts)
+    filenames = set()
+    for c in cls.mro()[:-1]:  # skip object
+        filenames.add(getattr(sys.modules.get(c.__module__), '__file__', None))
+    for name, val in cls.__dict__.items():
+        func = getattr(val, '_func', val)
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            # Actions, reactions, emitters, and functions. The file hash
+            # is not enough, e.g. for two same-named classes in one file.
+            filenames.add(code.co_filename)
+            parts.append('%s %s %s %i %s' % (name, _to_json([
+                getattr(val, '_mode', None), getattr(val, '_interval', None),
+                getattr(val, '_connection_strings', None)]),
+                getattr(func, '__qualname__', ''), code.co_firstlineno,
+                _get_code_hash(code)))
+        elif isinstance(val, Property):
+            parts.append('%s %s.%s %s %s' % (name, val.__class__.__module__,
+                                             val.__class__.__name__,
+                                             _to_json(val._default),
+                                             _to_json(val._data)))
+        else:
+            parts.append('%s %s' % (name, _to_json(val)))
+    for filename in sorted(filenames, key=str):
+        hash = jscache.get_file_hash(filename)
+        if hash is None:
+            return None  # e.g. defined in the notebook
+        parts.append(hash)
+    return jscache.get_key(*parts)
+
+
+def _get_code_hash(code):
+    """ Get a hash of the given code object, which is the same between
+    processes (nested code objects are hashed recursively, and sets sorted).
+    """
+    h = hashlib.sha256(code.co_code)
+    h.update(' '.join(code.co_names + code.co_varnames).encode())
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            const = _get_code_hash(const)
+        elif isinstance(const, frozenset):
+            const = sorted(repr(c) for c in const)
+        h.update(repr(const).encode())
+        h.update(b'\x00')
+    return h.hexdigest()[:16]
+
+
+def _to_json(val):
+    try:
+        return json.dumps(val, sort_keys=True)
+    except (TypeError, ValueError):
+        return repr(type(val))
@@ -10,6 +10,7 @@ import json
 import time
 import types
 import logging
+import threading
 
 from pscript import (py2js, JSString, RawJS, JSConstant, create_js_module,
                         get_all_std_names)
@@ -22,11 +23,17 @@ from ..event._js import create_js_component_class
 from ._clientcore import bsdf
 from ._component2 import BaseAppComponent, PyComponent, JsComponent, StubComponent
 from ._asset import Asset, get_mod_name, module_is_package
+from ._jscache import jscache, get_module_key
 from . import logger
 
 
 pscript_types = type, types.FunctionType  # class or function
 
+# Resolving dependencies mutates the modules in the store (and may generate
+# JS for component classes), which may happen in a thread that pre-warms
+# the JS (see AssetStore.prewarm()).
+jsmodule_lock = threading.RLock()
+
 if sys.version_info > (3, ):
     json_types = None.__class__, bool, int, float, str, tuple, list, dict
 else:  # pragma: no cover
@@ -144,6 +151,7 @@ class JSModule:
         # Stuff defined in this module (in JS)
         # We use dicts so that we can "overwrite" them in interactive mode
         self._component_classes = {}
+        self._pending_classes = []  # component classes with unresolved deps
         self._pscript_code = {}
         self._js_values = {}
         # Dependencies
@@ -153,8 +161,13 @@ class JSModule:
         self._css_cache = None
 
         if is_pscript_module(self._pymodule):
-            # PScript module; transpile as a whole
-            js = py2js(self._pymodule, inline_stdlib=False, docstrings=False)
+            # PScript module; transpile as a whole (or get from the cache)
+            key = get_module_key(self._pymodule)
+            js = None if key is None else jscache.get(key)
+            if js is None:
+                js = py2js(self._pymodule, inline_stdlib=False, docstrings=False)
+                if key is not None:
+                    jscache.set(key, js)
             self._pscript_code['__all__'] = js
             self._provided_names.update([n for n in js.meta['vars_defined']
                                          if not n.startswith('_')])
@@ -192,6 +205,7 @@ class JSModule:
         """ The (unsorted) set of dependencies (names of other modules) for
         this module.
         """
+        self._resolve_pending_classes()
         return set(self._deps.keys())
 
     @property
@@ -229,7 +243,7 @@ class JSModule:
         """
         return self._provided_names
 
-    def add_variable(self, name, is_global=False, _dep_stack=None):
+    def add_variable(self, name, is_global=False, lazy=False, _dep_stack=None):
         """ Mark the variable with the given name as used by JavaScript.
         The corresponding object must be a module, Component, class or function,
         or a json serializable value.
@@ -241,6 +255,10 @@ class JSModule:
         If ``is_global``, the name is considered global; it may be declared in
         this module, but it may also be a JS global. So we try to resolve the
         name, but do not care if it fails.
+
+        If ``lazy`` and the object is a component class defined in this
+        module, the JS for the class is not generated (and its dependencies
+        are not resolved) until it is needed, e.g. by ``get_js()``.
         """
         _dep_stack = _dep_stack or []
         if name in self._imported_names:
@@ -315,7 +333,10 @@ class JSModule:
                     self._component_classes[name] = val
                     # Recurse
                     self._collect_dependencies_from_bases(val)
-                    self._collect_dependencies(val.JS.CODE, _dep_stack)
+                    if lazy:
+                        self._pending_classes.append(val)
+                    else:
+                        self._collect_dependencies(val.JS.CODE, _dep_stack)
                 else:
                     # Import from another module
                     self._import(val.__jsmodule__, val.__name__, name)
@@ -423,6 +444,17 @@ class JSModule:
         for name in reversed(sorted(vars_global)):
             self.add_variable(name, True, _dep_stack=_dep_stack)
 
+    def _resolve_pending_classes(self):
+        """
+        Collect the dependencies from the JS of the component classes that
+        were added to this module. This is postponed until the module is
+        actually used, because it requires generating the JS.
+        """
+        with jsmodule_lock:
+            while self._pending_classes:
+                cls = self._pending_classes.pop(0)
+                self._collect_dependencies(cls.JS.CODE, [cls.__name__])
+
     def _name_ispropclass(self, name):
         ob = getattr(event._property, name, None)
         if ob is not None:
@@ -460,6 +492,13 @@ class JSModule:
     def get_js(self):
         """ Get the JS code for this module.
         """
+        # The cache is invalidated when dependencies are resolved, which
+        # may happen in another thread, so build it under the lock.
+        with jsmodule_lock:
+            return self._get_js()
+
+    def _get_js(self):
+        self._resolve_pending_classes()
         if self._js_cache is None:
             # Collect JS and sort by linenr
             js = [cls.JS.CODE for cls in self._component_classes.values()]
@@ -512,16 +551,17 @@ class JSModule:
             # Create module
             self._js_cache = create_js_module(self.name, '\n\n'.join(js),
                                               imports, exports, 'amd-flexx')
-            self._js_cache = self._js_cache
         return self._js_cache
 
     def get_css(self):
         """ Get the CSS code for this module.
         """
-        if self._css_cache is None:
-            css = []
-            sorter = lambda x: x.JS.CODE.meta['linenr']
-            for cls in sorted(self._component_classes.values(), key=sorter):
-                css.append(cls.CSS)
-            self._css_cache = '\n\n'.join(css)
-        return self._css_cache
+        with jsmodule_lock:
+            self._resolve_pending_classes()
+            if self._css_cache is None:
+                css = []
+                sorter = lambda x: x.JS.CODE.meta['linenr']
+                for cls in sorted(self._component_classes.values(), key=sorter):
+                    css.append(cls.CSS)
+                self._css_cache = '\n\n'.join(css)
+            return self._css_cache
@@ -154,6 +154,27 @@ class AbstractServer:
         logger.info('Stopping Flexx event loop.')
         self._loop.call_soon_threadsafe(self._loop.stop)
 
+    def fork(self, workers):
+        """ Fork the given number of worker processes (Unix only) that
+        serve at the same address. Session ids include the id of the worker
+        that holds the session, and each worker also serves at a private
+        port, to which the client connects its websocket. In the parent
+        process this function does not return until all workers have
+        exited; in a worker it returns the worker id, after which this
+        server can be started. Must be called before the server is started.
+
+        The private ports are bound on the same host as the main port, and
+        the page embeds a websocket url with the worker's port. The origin
+        check accepts this cross-port connection. Therefore, the private
+        ports must be reachable by the client: a reverse proxy or firewall
+        that only forwards the main port breaks the websocket connection.
+        """
+        if not self._serving:
+            raise RuntimeError('Cannot fork a closed or non-serving server!')
+        if self._running:
+            raise RuntimeError('Cannot fork a running server.')
+        return self._fork(int(workers))
+
     def close(self):
         """ Close the connection. A closed server cannot be used again. """
         if self._running:
@@ -168,6 +189,9 @@ class AbstractServer:
     def _close(self):
         raise NotImplementedError()
 
+    def _fork(self, workers):
+        raise NotImplementedError()
+
     @property
     def serving(self):
         """ Get a tuple (hostname, port) that is being served.
@@ -4,6 +4,7 @@ Definition of the Session class.
 
 import re
 import sys
+import copy
 import time
 import json
 import base64
@@ -12,8 +13,10 @@ import hashlib
 import asyncio
 import weakref
 import datetime
+import threading
 from http.cookies import SimpleCookie
 
+from ..event import DictProp, ListProp
 from ..event._component import new_type
 
 from ._component2 import PyComponent, JsComponent, AppComponentMeta
@@ -21,6 +24,7 @@ from ._asset import Asset, Bundle, solve_dependencies
 from ._assetstore import AssetStore, INDEX
 from ._assetstore import assets as assetstore
 from ._clientcore import serializer
+from ._threads import WebSocketProxy
 from . import logger
 
 from .. import config
@@ -51,6 +55,30 @@ def get_random_string(length=24, allowed_chars=None):
     return ''.join(srandom.choice(allowed_chars) for i in range(length))
 
 
+# When serving from multiple processes, session ids are prefixed with the id
+# of the worker that holds the session. Set via set_worker_id().
+_worker_id = None
+
+
+def set_worker_id(worker_id):
+    """ Set the id (an int) of the worker process that this is. Sessions
+    created after this call have an id that includes the worker id.
+    """
+    global _worker_id
+    _worker_id = None if worker_id is None else int(worker_id)
+
+
+def get_worker_id(session_id=None):
+    """ Get the id of the worker process that holds the session with
+    the given id, or the id of this worker if no session id is given.
+    Returns None if not serving from multiple processes.
+    """
+    if session_id is None:
+        return _worker_id
+    m = re.match(r'^w(\d+)_', session_id)
+    return int(m.group(1)) if m else None
+
+
 class Session:
     """ A connection between Python and the client runtime (JavaScript).
 
@@ -77,6 +105,8 @@ class Session:
 
         # Id and name of the app
         self._id = get_random_string()
+        if _worker_id is not None:
+            self._id = 'w%i_%s' % (_worker_id, self._id)
         self._app_name = app_name
 
         # To keep track of what modules are defined at the client
@@ -84,15 +114,21 @@ class Session:
         self._present_modules = set()  # module names that, plus deps
         self._present_assets = set()  # names of used associated assets
         self._assets_to_ignore = set()  # user settable
+        self._client_assets = set()  # hashes of assets cached by the client
 
         # Data for this session (in addition to the data provided by the store)
         self._data = {}
+        self._data_lock = threading.Lock()  # data is served from the IO thread
 
         # More vars
         self._runtime = None  # init web runtime, will be set when used
         self._ws = None  # init websocket, will be set when a connection is made
         self._closing = False  # Flag to help with shutdown
 
+        # The worker thread in which this session runs, or None for the
+        # default loop. Set by the app manager, see _threads.py.
+        self._thread = None
+
         # PyComponent or JsComponent instance, can be None if app_name is __default__
         self._component = None
 
@@ -101,6 +137,9 @@ class Session:
         self._component_instances = weakref.WeakValueDictionary()
         self._dead_component_ids = set()
 
+        # The last dict/list values that were send to JsComponents, for ws_delta
+        self._sent_values = {}  # id -> {prop_name: value}
+
         # Keep track of roundtrips. The _ping_calls elements are:
         # [ping_count, {objects}, *(callback, args)]
         self._ping_calls = []
@@ -171,6 +210,15 @@ class Session:
         else:
             return self.STATUS.CLOSED  # connection closed
 
+    @property
+    def send_pressure(self):
+        """ The amount of data that is waiting to be send to the client,
+        relative to ``flexx.config.ws_high_watermark``. A value above one
+        means that the client cannot keep up, in which case
+        ``flexx.config.ws_congestion_policy`` applies.
+        """
+        return getattr(self._ws, 'send_pressure', 0.0)
+
     @property
     def present_modules(self):
         """ The set of module names that is (currently) available at the client.
@@ -185,9 +233,20 @@ class Session:
         """
         return self._assets_to_ignore
 
+    @property
+    def client_assets(self):
+        """ The set of hashes of the assets that the client has cached
+        from previous sessions (see ``config.asset_cache``). These assets
+        are loaded from the cache instead of being pushed to the client.
+        """
+        return set(self._client_assets)
+
     def close(self):
         """ Close the session: close websocket, close runtime, dispose app.
         """
+        if self._thread is not None and not self._thread.is_current():
+            self._thread.call_soon(self.close)
+            return
         # Stop guarding objects to break down any circular refs
         self._ping_calls = []
         self._closing = True  # suppress warnings for session being closed.
@@ -203,25 +262,36 @@ class Session:
                 self._component.dispose()
                 self._component = None
             # Discard data
-            self._data = {}
+            with self._data_lock:
+                self._data = {}
         finally:
             self._closing = False
 
     ## Hooking up with app, websocket, runtime
 
-    def _set_ws(self, ws):
+    def _set_ws(self, ws, client_assets=()):
         """ A session is always first created, so we know what page to
         serve. The client will connect the websocket, and communicate
         the session_id so it can be connected to the correct Session
-        via this method
+        via this method. The client also tells the hashes of the assets
+        that it has cached, which are then not send again.
         """
+        if self._thread is not None and not self._thread.is_current():
+            # Let the websocket be used from our thread
+            return self._thread.call_sync(self._set_ws,
+                                          WebSocketProxy(ws, ws.io_loop),
+                                          client_assets)
         if self._ws is not None:
             raise RuntimeError('Session is already connected.')
+        if config.asset_cache:
+            self._client_assets.update(client_assets)
         # Set websocket object - this is what changes the status to CONNECTED
         self._ws = ws
         self._ws.write_command(("PRINT", "Flexx session says hi"))
-        # Send pending commands
+        # Send pending commands, leaving out the code that the client has
         for command in self._pending_commands:
+            if command[0] == 'DEFINE' and command[4] in self._client_assets:
+                command = command[:3] + (None, command[4])
             self._ws.write_command(command)
         self._ws.write_command(('INIT_DONE', ))
 
@@ -329,11 +399,12 @@ class Session:
         """
         if not isinstance(name, str):
             raise TypeError('Session.add_data() name must be a str.')
-        if name in self._data:
-            raise ValueError('Session.add_data() got existing name %r.' % name)
         if not isinstance(data, bytes):
             raise TypeError('Session.add_data() data must be bytes.')
-        self._data[name] = data
+        with self._data_lock:
+            if name in self._data:
+                raise ValueError('Session.add_data() got existing name %r.' % name)
+            self._data[name] = data
         return 'flexx/data/%s/%s' % (self.id, name)  # relative path for  export
 
     def remove_data(self, name):
@@ -341,19 +412,21 @@ class Session:
         consider using actions instead. Note that data is automatically
         released when the session is closed.
         """
-        self._data.pop(name, None)
+        with self._data_lock:
+            self._data.pop(name, None)
 
     def get_data_names(self):
         """ Get a list of names of the data provided by this session.
         """
-        return list(self._data.keys())
+        with self._data_lock:
+            return list(self._data.keys())
 
     def get_data(self, name):
         """ Get the data corresponding to the given name. This can be
         data local to the session, or global data. Returns None if data
         by that name is unknown.
         """
-        if True:
+        with self._data_lock:
             data = self._data.get(name, None)
         if data is None:
             data = self._store.get_data(name)
@@ -394,6 +467,7 @@ class Session:
 
     def _unregister_component(self, component):
         self._dead_component_ids.add(component.id)
+        self._sent_values.pop(component.id, None)
         # self.keep_alive(component)  # does not work on pypy; deletion in final
         # Because we use weak refs, and we want to be able to keep (the id of)
         # the object so that INVOKE on it can be silently ignored (because it
@@ -473,6 +547,7 @@ class Session:
         self._store.update_modules()  # Ensure up-to-date module definition
         mod = self._store.modules[mod_name]
         collect_module_and_deps(mod)
+        self._store.update_modules()  # Bundle modules found via dependencies
         f = lambda m: (m.name.startswith('__main__'), m.name)
         modules = solve_dependencies(sorted(modules, key=f))
 
@@ -507,13 +582,28 @@ class Session:
             if asset.name in self._assets_to_ignore:
                 continue
             logger.debug('Loading asset %s' % asset.name)
-            # Determine command suffix. All our sources come in bundles,
-            # for which we use eval because it makes sourceURL work on FF.
-            # (It does not work in Chrome in either way.)
-            suffix = asset.name.split('.')[-1].upper()
-            if suffix == 'JS' and isinstance(asset, Bundle):
-                suffix = 'JS-EVAL'
-            self.send_command('DEFINE', suffix, asset.name, asset.to_string())
+            self._send_asset(asset)
+
+    def _send_asset(self, asset):
+        """ Send the DEFINE command for the given asset.
+        """
+        # Determine command suffix. All our sources come in bundles,
+        # for which we use eval because it makes sourceURL work on FF.
+        # (It does not work in Chrome in either way.)
+        suffix = asset.name.split('.')[-1].upper()
+        if suffix == 'JS' and isinstance(asset, Bundle):
+            suffix = 'JS-EVAL'
+        # The client stores the asset by its hash (if given). If the
+        # client already has it, we only send the hash.
+        hash = None
+        if config.asset_cache:
+            hash = self._store.get_asset_hash(asset.name)
+        if hash is not None and hash in self._client_assets:
+            source = None
+        else:
+            # The store provides the source, which may be minified
+            source = self._store.get_asset_bytes(asset.name).decode()
+        self.send_command('DEFINE', suffix, asset.name, source, hash)
 
     ## Communication with the client
 
@@ -532,11 +622,67 @@ class Session:
             #raise RuntimeError('Cannot send commands; app is closed')
             logger.warning('Cannot send commands; app is closed')
 
+    def _send_set_command(self, id, name, args):
+        """ Send the INVOKE command for a plain property setter. When
+        commands are batched, values that are superseded before the
+        batch is send are not transmitted at all. With ws_delta, only the
+        changes to dict and list values are send.
+        """
+        if config.ws_delta and len(args) == 1:
+            if self._send_delta_command(id, name, args[0]):
+                return
+        command = ('INVOKE', id, name, args)
+        if self.status == self.STATUS.CONNECTED and not self._closing:
+            self._ws.write_command(command, (id, name))
+        else:
+            self.send_command(*command)
+
+    def _send_delta_command(self, id, name, value):
+        """ Send the changes of a dict or list property with respect to the
+        value that was send previously, instead of the value itself. Returns
+        False if the property is not a dict or list property.
+        """
+        prop_name = name[4:]  # set_foo or _set_foo
+        component = self._component_instances.get(id, None)
+        prop = getattr(component.__class__, prop_name, None)
+        if not isinstance(prop, (DictProp, ListProp)):
+            return False
+        sent_values = self._sent_values.setdefault(id, {})
+        old = sent_values.pop(prop_name, None)
+        if not isinstance(value, (dict, tuple, list)):
+            return False  # let the validator at the other end complain
+
+        # Deep copy, so that in-place changes of the value are detected too
+        new = copy.deepcopy(value)
+        if isinstance(new, tuple):
+            new = list(new)
+        sent_values[prop_name] = new
+
+        mutations = None
+        if isinstance(prop, DictProp) and isinstance(old, dict):
+            mutations = _get_dict_mutations(old, new)
+        elif isinstance(prop, ListProp) and isinstance(old, list):
+            mutations = _get_list_mutations(old, new)
+
+        # Note that these commands do not supersede each-other in a batch
+        if mutations is None:
+            self.send_command('INVOKE', id, name, [new])
+        elif mutations:
+            self.send_command('INVOKE', id, '_flx_apply_mutations',
+                              [prop_name, mutations])
+        return True
+
     def _receive_command(self, command):
         """ Received a command from JS.
         """
+        if self._thread is not None and not self._thread.is_current():
+            self._thread.call_soon(self._receive_command, command)
+            return
         cmd = command[0]
-        if cmd == 'EVALRESULT':
+        if cmd == 'BATCH':
+            for subcommand in command[1]:
+                self._receive_command(subcommand)
+        elif cmd == 'EVALRESULT':
             self._eval_result[command[2]] = command[1]
         elif cmd == 'PRINT':
             print('JS:', command[1])
@@ -598,6 +744,11 @@ class Session:
         elif cmd == 'DISPOSE_ACK':  # Gets send from proxy to local
             self._component_instances.pop(command[1], None)
             self._dead_component_ids.discard(command[1])
+        elif cmd == 'ASSET_MISSING':
+            # The client lost an asset from its cache, send it with code
+            name, hash = command[1:]
+            self._client_assets.discard(hash)
+            self._send_asset(self._store.get_asset(name))
         else:
             logger.error('Unknown command received from JS:\n%s' % command)
 
@@ -634,6 +785,16 @@ class Session:
         while count < 1:
             await asyncio.sleep(0.02)
 
+    async def co_send_ready(self):
+        """ Coroutine to wait until the amount of data that is waiting to be
+        send to the client is below ``flexx.config.ws_low_watermark``.
+        Coroutines that produce a lot of data can use this to not overwhelm
+        slow clients.
+        """
+        co_send_ready = getattr(self._ws, 'co_send_ready', None)
+        if co_send_ready is not None:
+            await co_send_ready()
+
     async def co_eval(self, js):
         """ Coroutine to evaluate JS in the client, wait for the result,
         and then return it. It is recomended to use this method only
@@ -685,6 +846,65 @@ class Session:
         if len(self._ping_calls) > 0:
             send_ping_later(self)
 
+def _is_equal(a, b):
+    """ Compare two values that may be (or contain) numpy arrays.
+    """
+    try:
+        if hasattr(a, 'dtype') or hasattr(b, 'dtype'):
+            import numpy as np
+            return type(a) is type(b) and np.array_equal(a, b)
+        return type(a) is type(b) and bool(a == b)
+    except Exception:
+        return False  # e.g. a list that contains arrays
+
+
+def _get_dict_mutations(old, new):
+    """ Get the mutations that turn dict old into dict new, or None if
+    sending the new dict is cheaper.
+    """
+    removed = [key for key in old if key not in new]
+    changed = {}
+    for key, val in new.items():
+        if not (key in old and _is_equal(old[key], val)):
+            changed[key] = val
+    if len(removed) + len(changed) > len(new) // 2:
+        return None
+    mutations = []
+    if changed:
+        mutations.append(('replace', changed, -1))
+    if removed:
+        mutations.append(('remove', removed, -1))
+    return mutations
+
+
+def _get_list_mutations(old, new):
+    """ Get the mutations that turn list old into list new, or None if
+    sending the new list is cheaper. Only the section between the common
+    head and tail of the two lists is considered to be changed.
+    """
+    n = min(len(old), len(new))
+    i1 = 0
+    while i1 < n and _is_equal(old[i1], new[i1]):
+        i1 += 1
+    i2 = 0
+    while i2 < n - i1 and _is_equal(old[-1 - i2], new[-1 - i2]):
+        i2 += 1
+    old_count = len(old) - i1 - i2
+    new_items = new[i1:len(new) - i2]
+    if len(new_items) > len(new) // 2:
+        return None
+    # Replace what we can, then remove or insert the rest
+    n = min(old_count, len(new_items))
+    mutations = []
+    if n > 0:
+        mutations.append(('replace', new_items[:n], i1))
+    if old_count > n:
+        mutations.append(('remove', old_count - n, i1 + n))
+    elif len(new_items) > n:
+        mutations.append(('insert', new_items[n:], i1 + n))
+    return mutations
+
+
 def send_ping_later(session):
     # This is to prevent the prevention of the session from being discarded due
     # to a ref lingering in an asyncio loop.
@@ -700,13 +920,20 @@ def send_ping_later(session):
 ## Functions to get page
 # These could be methods, but are only for internal use
 
-def get_page(session):
+def get_page(session, ws_url=None):
     """ Get the string for the HTML page to render this session's app.
     Not a lot; all other JS and CSS assets are pushed over the websocket.
+    If ws_url is not given, the client derives it from the page location.
     """
+    if session._thread is not None:
+        return session._thread.call_sync(_get_page_for_session, session, ws_url)
+    return _get_page_for_session(session, ws_url)
+
+
+def _get_page_for_session(session, ws_url):
     css_assets = [assetstore.get_asset('reset.css')]
     js_assets = [assetstore.get_asset('flexx-core.js')]
-    return _get_page(session, js_assets, css_assets, 3, False)
+    return _get_page(session, js_assets, css_assets, 3, False, ws_url)
 
 
 def get_page_for_export(session, commands, link=0):
@@ -769,7 +996,7 @@ def get_page_for_export(session, commands, link=0):
     return _get_page(session, js_assets, css_assets, link, True)
 
 
-def _get_page(session, js_assets, css_assets, link, export):
+def _get_page(session, js_assets, css_assets, link, export, ws_url=None):
     """ Compose index page. Depending on the value of link and the types
     of assets, the assets are either embedded or linked.
     """
@@ -786,14 +1013,22 @@ def _get_page(session, js_assets, css_assets, link, export):
                     # Special case, is always embedded, see get_page_for_export()
                     html = asset.to_html('', 0)
                 else:
-                    html = asset.to_html(pre_path + '/shared/{}', link)
+                    path = pre_path + '/shared/{}'
+                    if not export and not asset.remote:
+                        # Versioned url, so the asset can be cached for good
+                        path += '?v=' + assetstore.get_asset_hash(asset.name)
+                    html = asset.to_html(path, link)
             codes.append(html)
             if export and assets is js_assets:
                 codes.append('<script>window.flexx.spin();</script>')
         codes.append('')  # whitespace between css and js assets
 
-    codes.append('<script>flexx.create_session("%s", "%s");</script>\n' %
-                 (session.app_name, session.id))
+    if ws_url:
+        codes.append('<script>flexx.create_session("%s", "%s", "%s");</script>\n' %
+                     (session.app_name, session.id, ws_url))
+    else:
+        codes.append('<script>flexx.create_session("%s", "%s");</script>\n' %
+                     (session.app_name, session.id))
 
     src = INDEX
     if link in (0, 1):
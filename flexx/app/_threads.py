@@ -0,0 +1,127 @@
+"""
+Worker threads that run the event loops of sessions.
+
+By default, all sessions share the (default) Flexx event loop, which runs
+in the main thread. When ``flexx.config.session_threads`` is set, each
+new session is assigned to one of a pool of worker threads, each running
+its own asyncio loop and Flexx event loop. The components of a session
+are created in its thread and thus belong to that loop, so that a busy
+session does not stall the others. Communication with the client goes
+via the websocket handler, which lives in the thread of the server.
+"""
+
+import asyncio
+import weakref
+import threading
+import concurrent.futures
+
+from ..event._loop import Loop
+
+from .. import config
+
+
+class LoopThread(threading.Thread):
+    """ A thread that runs an asyncio event loop, with a Flexx event
+    loop integrated into it. The thread is started on instantiation.
+    """
+
+    def __init__(self, name):
+        super().__init__(name=name, daemon=True)
+        self.loop = None  # the Flexx event loop
+        self.asyncio_loop = None
+        self.sessions = weakref.WeakSet()  # sessions assigned to this thread
+        self._ready = threading.Event()
+        self.start()
+        self._ready.wait()
+
+    def run(self):
+        self.asyncio_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.asyncio_loop)
+        self.loop = Loop()  # integrates with the current thread and asyncio loop
+        self._ready.set()
+        self.asyncio_loop.run_forever()
+
+    def is_current(self):
+        """ Get whether this thread is the current thread.
+        """
+        return threading.current_thread() is self
+
+    def call_soon(self, func, *args):
+        """ Call the given function in this thread (thread-safe).
+        """
+        self.loop.call_soon(func, *args)
+
+    def call_sync(self, func, *args, **kwargs):
+        """ Call the given function in this thread, wait for it to finish,
+        and return the result (or raise the error).
+        """
+        if self.is_current():
+            return func(*args, **kwargs)
+        future = concurrent.futures.Future()
+        def wrapper():
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as err:
+                future.set_exception(err)
+        self.loop.call_soon(wrapper)
+        return future.result()
+
+    def stop(self):
+        """ Stop the asyncio loop, which ends the thread.
+        """
+        self.asyncio_loop.call_soon_threadsafe(self.asyncio_loop.stop)
+
+
+class WebSocketProxy:
+    """ Wraps a websocket handler, so that it can be used by a session
+    that runs in a worker thread: commands are written via io_loop, the
+    asyncio loop that the websocket runs in.
+    """
+
+    def __init__(self, ws, io_loop):
+        self._ws = ws
+        self._io_loop = io_loop
+
+    @property
+    def close_code(self):
+        return self._ws.close_code
+
+    @property
+    def send_pressure(self):
+        return getattr(self._ws, 'send_pressure', 0.0)
+
+    def write_command(self, cmd, key=None):
+        self._io_loop.call_soon_threadsafe(self._ws.write_command, cmd, key)
+
+    def close_this(self):
+        self._io_loop.call_soon_threadsafe(self._ws.close_this)
+
+    async def co_send_ready(self):
+        co_send_ready = getattr(self._ws, 'co_send_ready', None)
+        if co_send_ready is not None:
+            future = asyncio.run_coroutine_threadsafe(co_send_ready(),
+                                                      self._io_loop)
+            await asyncio.wrap_future(future)
+
+
+_threads = []
+_lock = threading.Lock()
+
+
+def get_session_thread(session):
+    """ Get the worker thread for the given (new) session, or None if
+    sessions should run in the default loop. Threads are created as
+    needed, up to ``flexx.config.session_threads``, after which sessions
+    are assigned to the thread with the fewest sessions.
+    """
+    n = config.session_threads
+    if n <= 0:
+        return None
+    with _lock:
+        if len(_threads) < n:
+            thread = LoopThread('flexx-session-%i' % (len(_threads) + 1))
+            _threads.append(thread)
+        else:
+            thread = min(_threads[:n], key=lambda t: len(t.sessions))
+        thread.sessions.add(session)
+    return thread
@@ -5,12 +5,13 @@ Serve web page and handle web sockets using Tornado.
 import json
 import time
 import asyncio
+import collections
 import socket
 import mimetypes
 import traceback
 import threading
 from urllib.parse import urlparse
-# from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 import tornado
 from tornado import gen, netutil
@@ -20,11 +21,13 @@ from tornado.websocket import WebSocketHandler, WebSocketClosedError
 from tornado.httpserver import HTTPServer
 from tornado.platform.asyncio import AsyncIOMainLoop
 
+from ..event import _loop
 from ._app import manager
-from ._session import get_page
+from ._session import get_page, set_worker_id, get_worker_id
 from ._server import AbstractServer
-from ._assetstore import assets
-from ._clientcore import serializer
+from ._assetstore import assets, COMPRESSIONS
+from ._clientcore import serializer, bsdf
+from ._component2 import BsdfComponentExtension
 
 from . import logger
 from .. import config
@@ -35,8 +38,6 @@ if tornado.version_info < (4, ):
 # todo: generalize -> Make Tornado mnore of an implementation detail.
 # So we can use e.g. https://github.com/aaugustin/websockets
 
-# todo: threading, or even multi-process
-#executor = ThreadPoolExecutor(4)
 
 IMPORT_TIME = time.time()
 
@@ -53,11 +54,13 @@ class TornadoServer(AbstractServer):
     def __init__(self, *args, **kwargs):
         self._app = None
         self._server = None
+        self._server_kwargs = {}
         super().__init__(*args, **kwargs)
 
-    def _open(self, host, port, **kwargs):
+    def _open(self, host, port, sockets=None, worker_ports=None, **kwargs):
         # Note: does not get called if host is False. That way we can
         # run Flexx in e.g. JLab's application.
+        self._server_kwargs = kwargs.copy()
 
         # Hook Tornado up with asyncio. Flexx' BaseServer makes sure
         # that the correct asyncio event loop is current (for this thread).
@@ -86,22 +89,31 @@ class TornadoServer(AbstractServer):
             if 'keyfile' not in kwargs['ssl_options']:
                 kwargs['ssl_options']['keyfile'] = config.ssl_keyfile
 
+        # Compress large blobs (bsdf.js can decompress zlib)
+        threshold = config.ws_blob_compression
+        serializer._parse_options(compression=1 if threshold > 0 else 0,
+                                  compression_threshold=threshold)
+
         if config.tornado_debug:
             app_kwargs = dict(debug=True)
         else:
             app_kwargs = dict()
+        app_kwargs['websocket_max_message_size'] = config.ws_max_message_size
         # Create tornado application
         self._app = Application([(r"/flexx/ws/(.*)", WSHandler),
                                  (r"/flexx/(.*)", MainHandler),
                                  (r"/(.*)", AppHandler), ], **app_kwargs)
         self._app._io_loop = self._io_loop
+        self._app._flexx_worker_ports = worker_ports
         # Create tornado server, bound to our own ioloop
         if tornado.version_info < (5, ):
             kwargs['io_loop'] = self._io_loop
         self._server = HTTPServer(self._app, **kwargs)
 
         # Start server (find free port number if port not given)
-        if port:
+        if sockets:
+            self._server.add_sockets(sockets)
+        elif port:
             # Turn port into int, use hashed port number if a string was given
             try:
                 port = int(port)
@@ -125,6 +137,8 @@ class TornadoServer(AbstractServer):
                 port = sock.getsockname()[1]
 
         # Notify address, so its easy to e.g. copy and paste in the browser
+        if sockets:
+            port = sockets[0].getsockname()[1]
         self._serving = self._app._flexx_serving = host, port
         proto = 'http'
         if 'ssl_options' in kwargs:
@@ -135,6 +149,36 @@ class TornadoServer(AbstractServer):
     def _close(self):
         self._server.stop()
 
+    def _fork(self, workers):
+        from tornado.process import fork_processes
+
+        host, port = self._serving
+        sockets = list(self._server._sockets.values())
+        # Build the JS and CSS of all modules now, so that the workers
+        # share the result (copy-on-write) instead of each building it.
+        assets.prewarm()
+        # Each worker gets a private socket, so that a client can connect
+        # its websocket to the worker that holds its session.
+        private_sockets = [netutil.bind_sockets(0, host, family=socket.AF_INET)[0]
+                           for i in range(workers)]
+        worker_ports = [sock.getsockname()[1] for sock in private_sockets]
+
+        worker_id = fork_processes(workers)  # only returns in the workers
+
+        for i, sock in enumerate(private_sockets):
+            if i != worker_id:
+                sock.close()
+        set_worker_id(worker_id)
+        # The inherited event loop must not be used; serve from a fresh one
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        _loop.loop.integrate(self._loop, reset=False)
+        self._open(host, port, sockets + [private_sockets[worker_id]],
+                   worker_ports, **self._server_kwargs)
+        logger.info('Worker %i serves its sessions at port %i' %
+                    (worker_id, worker_ports[worker_id]))
+        return worker_id
+
     @property
     def app(self):
         """ The Tornado Application object being used."""
@@ -282,13 +326,24 @@ class AppHandler(FlexxHandler):
             # If session_id matches a pending app, use that session
             session = manager.get_session_by_id(session_id)
             if session and session.status == session.STATUS.PENDING:
-                self.write(get_page(session).encode())
+                self.write(get_page(session, self._get_ws_url(app_name)).encode())
             else:
                 self.redirect('/%s/' % app_name)  # redirect for normal serve
         else:
             # Create session - websocket will connect to it via session_id
             session = manager.create_session(app_name, request=self.request)
-            self.write(get_page(session).encode())
+            self.write(get_page(session, self._get_ws_url(app_name)).encode())
+
+    def _get_ws_url(self, app_name):
+        # When serving from multiple processes, the websocket must connect
+        # to the private port of this worker. Otherwise the client decides.
+        worker_ports = getattr(self.application, '_flexx_worker_ports', None)
+        if not worker_ports:
+            return None
+        proto = 'wss' if self.request.protocol == 'https' else 'ws'
+        port = worker_ports[get_worker_id()]
+        return '%s://%s:%i/flexx/ws/%s' % (proto, self.request.host_name,
+                                           port, app_name)
 
 
 class MainHandler(RequestHandler):
@@ -340,6 +395,13 @@ class MainHandler(RequestHandler):
 
         # Checks
         if asset_provider is None:
+            worker_id = get_worker_id(session_id)
+            worker_ports = getattr(self.application, '_flexx_worker_ports', None)
+            if worker_ports and worker_id is not None and worker_id != get_worker_id():
+                # The session lives in another worker process
+                return self.redirect('%s://%s:%i%s' % (
+                    self.request.protocol, self.request.host_name,
+                    worker_ports[worker_id], self.request.uri))
             return self.write('Invalid session %r' % session_id)
         if not filename:
             return self.write('Root dir for %s/%s' % (selector, path))
@@ -352,6 +414,17 @@ class MainHandler(RequestHandler):
                 return self.redirect('/flexx/assetview/%s/%s#L%s' %
                     (session_id or 'shared', fname.replace('/:', ':'), where))
 
+            # Source map of a minified asset
+            if filename.endswith('.js.map'):
+                try:
+                    res = asset_provider.get_source_map(filename[:-4])
+                except KeyError:
+                    res = None
+                if res is None:
+                    return self.send_error(404)
+                self.set_header('Content-Type', 'application/json')
+                return self.write(res)
+
             # Retrieve asset
             try:
                 res = asset_provider.get_asset(filename)
@@ -359,7 +432,7 @@ class MainHandler(RequestHandler):
                 self.write('Could not load asset %r' % filename)
             else:
                 self._guess_mime_type(filename)
-                self.write(res.to_string())
+                self._write_asset(res.name)
 
         elif selector == 'assetview':
 
@@ -398,6 +471,31 @@ class MainHandler(RequestHandler):
         else:
             raise RuntimeError('Invalid asset type %r' % selector)
 
+    def _write_asset(self, name):
+        """ Write a shared asset, with headers that allow the client to
+        cache it, and compressed if the client accepts that.
+        """
+        hash = assets.get_asset_hash(name)
+        if self.get_argument('v', '') == hash:
+            # The url changes when the asset does, see get_page()
+            self.set_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            self.set_header('Cache-Control', 'no-cache')  # revalidate via etag
+
+        accepted = self.request.headers.get('Accept-Encoding', '').split(',')
+        accepted = [e.split(';')[0].strip() for e in accepted]
+        encodings = [e for e in COMPRESSIONS if e in accepted]
+        encoding = encodings[0] if encodings else None
+        # Each encoding is a different representation, with its own etag
+        self.set_header('Etag', '"%s-%s"' % (hash, encoding or 'identity'))
+        self.set_header('Vary', 'Accept-Encoding')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        if encoding:
+            self.set_header('Content-Encoding', encoding)
+        self.write(assets.get_asset_bytes(name, encoding))
+
     def _get_info(self, selector, info):
         """ Provide some rudimentary information about the server.
         Note that this is publicly accesible.
@@ -484,6 +582,53 @@ class MessageCounter:
         self._stop = True
 
 
+class DeferredComponent:
+    """ Placeholder for a component in a message that is decoded in a
+    worker thread. It is resolved to the real component on the IO loop.
+    """
+
+    __slots__ = ['d']
+
+    def __init__(self, d):
+        self.d = d
+
+
+class DeferredComponentExtension(BsdfComponentExtension):
+
+    def decode(self, s, d):
+        return DeferredComponent(d)
+
+
+def resolve_deferred_components(ob):
+    """ Replace DeferredComponent objects in the given decoded object.
+    """
+    if isinstance(ob, DeferredComponent):
+        return BsdfComponentExtension.decode(None, None, ob.d)
+    elif isinstance(ob, list):
+        for i in range(len(ob)):
+            ob[i] = resolve_deferred_components(ob[i])
+    elif isinstance(ob, dict):
+        for key in ob:
+            ob[key] = resolve_deferred_components(ob[key])
+    return ob
+
+
+_decode_executor = None
+_thread_serializer = bsdf.BsdfLiteSerializer(
+    bsdf.standard_extensions + [DeferredComponentExtension])
+
+
+def decode_in_thread(message):
+    """ Decode a message in a worker thread. Returns a future.
+    """
+    global _decode_executor
+    if _decode_executor is None:
+        _decode_executor = ThreadPoolExecutor(max(1, config.ws_decode_workers),
+                                              thread_name_prefix='flexx-decode')
+    return IOLoop.current().run_in_executor(_decode_executor,
+                                            _thread_serializer.decode, message)
+
+
 class WSHandler(WebSocketHandler):
     """ Handler for websocket.
     """
@@ -505,6 +650,10 @@ class WSHandler(WebSocketHandler):
 
         self._session = None
         self._mps_counter = MessageCounter()
+        # The asyncio loop that this handler runs in, for use by other threads
+        self.io_loop = IOLoop.current().asyncio_loop
+
+        self._init_queues()
 
         # Don't collect messages to send them more efficiently, just send asap
         # self.set_nodelay(True)
@@ -519,6 +668,34 @@ class WSHandler(WebSocketHandler):
         else:
             self.close(1003, "Could not associate socket with an app.")
 
+    def get_compression_options(self):
+        """ Enable the permessage-deflate extension if so configured.
+        """
+        if config.ws_compression:
+            return {}
+        return None
+
+    def _init_queues(self):
+        # Commands that are held back to be send as a single message
+        self._batch = []
+        self._batch_keys = {}  # key -> index in batch
+        self._batch_scheduled = False
+
+        # Messages that wait for a chunked message to be send, or for the
+        # client to catch up. Items are [bytes, key].
+        self._send_queue = None
+        self._send_queue_keys = {}  # key -> item
+        self._queued_bytes = 0
+        self._pending_bytes = 0  # written, but not yet send
+        self._send_waiters = []  # futures for co_send_ready()
+        self._lagged = False  # whether the client exceeded ws_max_queue_size
+
+        # Buffer to reassemble a chunked message that we receive, and
+        # messages that wait for a message that is decoded in a thread
+        self._chunks = None
+        self._chunks_received = 0
+        self._receive_queue = None
+
     # todo: @gen.coroutine?
     def on_message(self, message):
         """ Called when a new message is received from JS.
@@ -529,21 +706,66 @@ class WSHandler(WebSocketHandler):
         we should at some point define a real formalized protocol.
         """
         self._mps_counter.trigger()
+        self._receive_message(message)
+
+    def _receive_message(self, message):
+        if self._receive_queue is not None:
+            # Keep the order
+            self._receive_queue.append(message)
+        elif 0 < config.ws_decode_threshold <= len(message):
+            self._receive_queue = collections.deque([message])
+            IOLoop.current().spawn_callback(self._receive_queued)
+        else:
+            try:
+                command = serializer.decode(message)
+            except Exception as err:
+                err.skip_tb = 1
+                logger.exception(err)
+                return
+            self._receive_command(command)
 
+    async def _receive_queued(self):
+        """ Decode the queued messages, large ones in a worker thread,
+        and process the commands in order.
+        """
         try:
-            command = serializer.decode(message)
-        except Exception as err:
-            err.skip_tb = 1
-            logger.exception(err)
+            while self._receive_queue:
+                message = self._receive_queue.popleft()
+                try:
+                    if 0 < config.ws_decode_threshold <= len(message):
+                        command = await decode_in_thread(message)
+                        command = resolve_deferred_components(command)
+                    else:
+                        command = serializer.decode(message)
+                except Exception as err:
+                    err.skip_tb = 1
+                    logger.exception(err)
+                    continue
+                self._receive_command(command)
+        finally:
+            self._receive_queue = None
+
+    def _receive_command(self, command):
+        if command[0] == 'CHUNK':
+            bb = self._receive_chunk(command)
+            if bb is None:
+                pass
+            elif self._receive_queue is not None:
+                self._receive_queue.appendleft(bb)  # next in line
+            else:
+                self._receive_message(bb)
+            return
 
         self._pongtime = time.time()
         if self._session is None:
             if command[0] == 'HI_FLEXX':
                 session_id = command[1]
+                # Hashes of the assets that the client has cached
+                client_assets = command[2] if len(command) > 2 else ()
                 try:
-                    self._session = manager.connect_client(self, self.app_name,
-                                                           session_id,
-                                                           cookies=self.cookies)
+                    self._session = manager.connect_client(
+                        self, self.app_name, session_id, cookies=self.cookies,
+                        client_assets=client_assets)
                 except Exception as err:
                     self.close(1003, "Could not launch app: %r" % err)
                     raise
@@ -554,6 +776,45 @@ class WSHandler(WebSocketHandler):
                 err.skip_tb = 1
                 logger.exception(err)
 
+    def _receive_chunk(self, command):
+        """ Collect the chunks of a large message. Returns the message
+        when it is complete. The chunks must come in order, from a
+        connected client, and the message cannot be larger than
+        ``config.ws_max_message_size``. Otherwise the connection is closed.
+        """
+        try:
+            _, offset, total, data = command
+            n = len(data)
+        except (TypeError, ValueError):
+            return self._reject_chunk('invalid chunk')
+        if self._session is None:
+            return self._reject_chunk('chunk before handshake')
+        elif not (isinstance(offset, int) and isinstance(total, int)):
+            return self._reject_chunk('invalid chunk')
+        elif not 0 < total <= config.ws_max_message_size:
+            return self._reject_chunk('message too big')
+        elif self._chunks is None and offset != 0:
+            return self._reject_chunk('chunk out of order')
+        elif self._chunks is not None and (offset != self._chunks_received or
+                                           total != len(self._chunks)):
+            return self._reject_chunk('chunk out of order')
+        elif n == 0 or offset + n > total:
+            return self._reject_chunk('invalid chunk size')
+        if offset == 0:
+            self._chunks = bytearray(total)
+        self._chunks[offset:offset + n] = data
+        self._chunks_received = offset + n
+        if self._chunks_received < total:
+            return None
+        bb, self._chunks = self._chunks, None
+        return bb
+
+    def _reject_chunk(self, reason):
+        logger.warning('Closing websocket: %s.' % reason)
+        self._chunks = None
+        self.close(1009, reason)
+        return None
+
     def on_close(self):
         """ Called when the connection is closed.
         """
@@ -561,6 +822,7 @@ class WSHandler(WebSocketHandler):
         reason = self.close_reason or self.known_reasons.get(code, '')
         logger.debug('Websocket closed: %s (%i)' % (reason, code))
         self._mps_counter.stop()
+        self._resolve_send_waiters()
         if self._session is not None:
             manager.disconnect_client(self._session)
             self._session = None  # Allow cleaning up
@@ -607,13 +869,165 @@ class WSHandler(WebSocketHandler):
 
     # --- methods
 
-    def write_command(self, cmd):
+    def write_command(self, cmd, key=None):
+        """ Send a command to the client. If batching is enabled, a
+        pending command with the same (non-None) key is superseded by
+        this command, which takes its place in the batch.
+        """
         assert isinstance(cmd, tuple) and len(cmd) >= 1
+        if not config.ws_batch:
+            self._write_command(cmd, key)
+            return
+        # Hold the command back, so that all commands that are send in this
+        # iteration of the event loop go out in one message.
+        if key is not None:
+            index = self._batch_keys.get(key, None)
+            if index is not None:
+                # Take the position of the first value, so that the client
+                # does not see commands that came after it before it
+                self._batch[index] = cmd
+                return
+            self._batch_keys[key] = len(self._batch)
+        self._batch.append(cmd)
+        if len(self._batch) >= config.ws_batch_size:
+            self._flush_batch()
+        elif self._batch_scheduled is False:
+            self._batch_scheduled = True
+            latency = config.ws_batch_latency
+            if latency > 0:
+                IOLoop.current().call_later(latency, self._flush_batch)
+            else:
+                IOLoop.current().add_callback(self._flush_batch)
+
+    def _flush_batch(self):
+        """ Send the commands that are held back. Multiple commands are
+        combined in a BATCH command, which the client unpacks.
+        """
+        self._batch_scheduled = False
+        commands, self._batch = self._batch, []
+        self._batch_keys = {}
+        if len(commands) == 1:
+            self._write_command(commands[0])
+        elif len(commands) > 1:
+            self._write_command(('BATCH', commands))
+
+    def _write_command(self, cmd, key=None):
+        if self._lagged:
+            return  # closing, see _queue_message()
         bb = serializer.encode(cmd)
+        if self.send_pressure > 1 and config.ws_congestion_policy == 'disconnect':
+            logger.warning('Closing websocket because the client cannot keep up.')
+            self.close(1008, 'client cannot keep up')
+        elif self._send_queue is not None:
+            # Keep the order
+            self._queue_message(bb, key)
+        elif (self._pending_bytes > config.ws_high_watermark or
+                0 < config.ws_chunk_size < len(bb)):
+            # Client is congested, or this is a large message
+            self._send_queue = collections.deque()
+            self._queue_message(bb, key)
+            IOLoop.current().spawn_callback(self._write_queued)
+        else:
+            try:
+                self._write_message(bb)
+            except WebSocketClosedError:
+                self.close(1000, 'closed by client')
+
+    def _queue_message(self, bb, key):
+        if key is not None and config.ws_congestion_policy == 'drop':
+            old_item = self._send_queue_keys.get(key, None)
+            if old_item is not None:
+                # Replace the superseded message, at its position in the queue
+                self._queued_bytes += len(bb) - len(old_item[0])
+                old_item[0] = bb
+            else:
+                item = [bb, key]
+                self._send_queue_keys[key] = item
+                self._send_queue.append(item)
+                self._queued_bytes += len(bb)
+        else:
+            self._send_queue.append([bb, key])
+            self._queued_bytes += len(bb)
+        # Enforce a hard limit, whatever the policy
+        if self._pending_bytes + self._queued_bytes > config.ws_max_queue_size:
+            logger.warning('Closing websocket because the client lags too '
+                           'far behind.')
+            self._lagged = True
+            self._send_queue.clear()
+            self._send_queue_keys = {}
+            self._queued_bytes = 0
+            self.close(1008, 'client cannot keep up')
+
+    async def _write_queued(self):
+        """ Send the queued messages, splitting large ones into chunks.
+        We wait for each write to complete, so that other traffic (e.g.
+        pings and other sessions) can go in between, and so that we do not
+        buffer more data than the connection can handle.
+        """
+        chunk_size = config.ws_chunk_size
         try:
-            self.write_message(bb, binary=True)
+            while self._send_queue:
+                item = self._send_queue.popleft()
+                bb, key = item
+                if self._send_queue_keys.get(key, None) is item:
+                    self._send_queue_keys.pop(key)
+                if chunk_size <= 0 or len(bb) <= chunk_size:
+                    self._queued_bytes -= len(bb)
+                    await self._write_message(bb)
+                    continue
+                view = memoryview(bb)
+                for offset in range(0, len(bb), chunk_size):
+                    chunk = ('CHUNK', offset, len(bb),
+                             view[offset:offset + chunk_size])
+                    self._queued_bytes -= len(chunk[3])
+                    await self._write_message(serializer.encode(chunk))
         except WebSocketClosedError:
             self.close(1000, 'closed by client')
+        finally:
+            self._send_queue = None
+            self._send_queue_keys = {}
+            self._queued_bytes = 0
+
+    def _write_message(self, bb):
+        """ Write a message, and keep track of how many bytes have not
+        been send yet.
+        """
+        future = self.write_message(bb, binary=True)
+        n = len(bb)
+        self._pending_bytes += n
+        future.add_done_callback(lambda f: self._message_send(n))
+        return future
+
+    def _message_send(self, n):
+        self._pending_bytes -= n
+        if self._send_waiters:
+            if self._pending_bytes + self._queued_bytes <= config.ws_low_watermark:
+                self._resolve_send_waiters()
+
+    def _resolve_send_waiters(self):
+        waiters, self._send_waiters = self._send_waiters, []
+        for f in waiters:
+            if not f.done():
+                f.set_result(None)
+
+    @property
+    def send_pressure(self):
+        """ The number of bytes that are waiting to be send, relative to
+        the high watermark.
+        """
+        nbytes = self._pending_bytes + self._queued_bytes
+        return nbytes / max(1, config.ws_high_watermark)
+
+    async def co_send_ready(self):
+        """ Coroutine that waits until the number of bytes that are waiting
+        to be send is below the low watermark.
+        """
+        if self.close_code is not None:
+            return
+        elif self._pending_bytes + self._queued_bytes > config.ws_low_watermark:
+            f = asyncio.get_event_loop().create_future()
+            self._send_waiters.append(f)
+            await f
 
     def close(self, *args):
         try:
@@ -624,6 +1038,7 @@ class WSHandler(WebSocketHandler):
     def close_this(self):
         """ Call this to close the websocket
         """
+        self._flush_batch()
         self.close(1000, 'closed by server')
 
     def check_origin(self, origin):
@@ -646,6 +1061,10 @@ class WSHandler(WebSocketHandler):
             return True  # Passed most strict test, hooray!
         elif serving_hostname == '0.0.0.0' and serving_port == connecting_port:
             return True  # host on all addressses; best we can do is check port
+        elif (getattr(self.application, '_flexx_worker_ports', None) and
+                serving_hostname == connecting_hostname and
+                connecting_port == str(self.application._flexx_serving[1])):
+            return True  # page at the shared port, websocket at a worker's port
         elif connecting_host in config.host_whitelist:
             return True
         else:
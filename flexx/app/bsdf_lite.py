@@ -67,6 +67,57 @@ def encode_type_id(b, ext_id):
         return b  # noqa
 
 
+class _SegmentWriter(object):
+    """ File-like object that collects the written data in a list of
+    segments. Large blobs (e.g. the buffer of a numpy array) are stored
+    by reference, rather than being copied.
+    """
+
+    MIN_SEGMENT_SIZE = 4096
+
+    def __init__(self):
+        self._segments = []
+        self._buffer = BytesIO()
+        self._size = 0
+
+    def write(self, bb):
+        n = len(bb)
+        if n >= self.MIN_SEGMENT_SIZE:
+            self._flush()
+            self._segments.append(memoryview(bb))
+        else:
+            self._buffer.write(bb)
+        self._size += n
+
+    def tell(self):
+        return self._size
+
+    def _flush(self):
+        if self._buffer.tell() > 0:
+            self._segments.append(memoryview(self._buffer.getvalue()))
+            self._buffer = BytesIO()
+
+    def get_segments(self):
+        self._flush()
+        return self._segments
+
+
+class _BytesReader(BytesIO):
+    """ File-like object to read from bytes, which can also read blobs as
+    views on the original data, rather than copies.
+    """
+
+    def __init__(self, bb):
+        BytesIO.__init__(self, bb)
+        self._view = memoryview(bb)
+
+    def read_view(self, n):
+        i = self.tell()
+        view = self._view[i:i + n]
+        self.seek(i + len(view))
+        return view
+
+
 class BsdfLiteSerializer(object):
     """ Instances of this class represent a BSDF encoder/decoder.
 
@@ -80,8 +131,10 @@ class BsdfLiteSerializer(object):
     * compression (int or str): ``0`` or "no" for no compression (default),
       ``1`` or "zlib" for Zlib compression (same as zip files and PNG), and
       ``2`` or "bz2" for Bz2 compression (more compact but slower writing).
-      Note that some BSDF implementations (e.g. JavaScript) may not support
-      compression.
+      Note that some BSDF implementations may not support compression
+      (the JavaScript implementation supports zlib).
+    * compression_threshold (int): blobs smaller than this number of bytes
+      are not compressed (default 0).
     * use_checksum (bool): whether to include a checksum with binary blobs.
     * float64 (bool): Whether to write floats as 64 bit (default) or 32 bit.
 
@@ -96,7 +149,8 @@ class BsdfLiteSerializer(object):
             self.add_extension(extension)
         self._parse_options(**options)
 
-    def _parse_options(self, compression=0, use_checksum=False, float64=True):
+    def _parse_options(self, compression=0, compression_threshold=0,
+                       use_checksum=False, float64=True):
 
         # Validate compression
         if isinstance(compression, str):
@@ -106,6 +160,7 @@ class BsdfLiteSerializer(object):
             raise TypeError('Compression must be 0, 1, 2, '
                             '"no", "zlib", or "bz2"')
         self._compression = compression
+        self._compression_threshold = int(compression_threshold)
 
         # Other encoding args
         self._use_checksum = bool(use_checksum)
@@ -199,10 +254,14 @@ class BsdfLiteSerializer(object):
                 f.write(lencode(len(name_b)))
                 f.write(name_b)
                 self._encode(f, v, None)
-        elif isinstance(value, bytes):
+        elif isinstance(value, (bytes, memoryview)):
             f.write(x(b'b', ext_id))  # B for blob
+            if isinstance(value, memoryview):
+                value = value.cast('B')  # so that len() is the number of bytes
             # Compress
             compression = self._compression
+            if len(value) < self._compression_threshold:
+                compression = 0
             if compression == 0:
                 compressed = value
             elif compression == 1:
@@ -282,8 +341,9 @@ class BsdfLiteSerializer(object):
                      'handled by an extension.')
                 raise TypeError(t % value.__class__.__name__)
 
-    def _decode(self, f):
-        """ Main decoder function.
+    def _decode(self, f, blob_views=False):
+        """ Main decoder function. If blob_views is True, blobs are returned
+        as views on the data when possible.
         """
 
         # Get value
@@ -346,7 +406,8 @@ class BsdfLiteSerializer(object):
                 if n_name == 253: n_name = strunpack('<Q', f.read(8))[0]  # noqa
                 assert n_name > 0
                 name = f.read(n_name).decode('UTF-8')
-                value[name] = self._decode(f)
+                # Blobs that an extension converts do not need a copy
+                value[name] = self._decode(f, ext_id is not None)
         elif c == b'b':
             # Read blob header data (5 to 42 bytes)
             # Size
@@ -365,7 +426,10 @@ class BsdfLiteSerializer(object):
             alignment = strunpack('<B', f.read(1))[0]
             f.read(alignment)
             # Get data
-            compressed = f.read(used_size)
+            if blob_views and compression == 0 and hasattr(f, 'read_view'):
+                compressed = f.read_view(used_size)
+            else:
+                compressed = f.read(used_size)
             # Skip remaining space
             f.read(allocated_size - used_size)
             # Decompress
@@ -393,9 +457,17 @@ class BsdfLiteSerializer(object):
     def encode(self, ob):
         """ Save the given object to bytes.
         """
-        f = BytesIO()
+        return b''.join(self.encode_segments(ob))
+
+    def encode_segments(self, ob):
+        """ Save the given object to a list of memoryview objects, which
+        together form the encoded bytes. Large blobs (e.g. numpy arrays)
+        are not copied, so the segments should be consumed before these
+        are modified.
+        """
+        f = _SegmentWriter()
         self.save(f, ob)
-        return f.getvalue()
+        return f.get_segments()
 
     def save(self, f, ob):
         """ Write the given object to the given file object.
@@ -409,7 +481,7 @@ class BsdfLiteSerializer(object):
     def decode(self, bb):
         """ Load the data structure that is BSDF-encoded in the given bytes.
         """
-        f = BytesIO(bb)
+        f = _BytesReader(bb)
         return self.load(f)
 
     def load(self, f):
@@ -462,7 +534,8 @@ class Extension(object):
     * `encode(serializer, value) -> encoded_value`: the function to encode a
       value to more basic data types.
     * `decode(serializer, encoded_value) -> value`: the function to decode an
-      encoded value back to its intended representation.
+      encoded value back to its intended representation. Note that blobs in
+      an encoded dict may be memoryview objects.
 
     """
 
@@ -509,9 +582,13 @@ class NDArrayExtension(Extension):
                 hasattr(v, 'tobytes'))
 
     def encode(self, s, v):
+        try:
+            data = memoryview(v).cast('B')  # no copy for contiguous arrays
+        except Exception:
+            data = v.tobytes()
         return dict(shape=v.shape,
                     dtype=str(v.dtype),
-                    data=v.tobytes())
+                    data=data)
 
     def decode(self, s, v):
         try:
@@ -0,0 +1,76 @@
+"""
+Benchmark the time to define many JsComponent classes (as when importing
+an app with many widgets) and generate their JS, with and without the JS
+cache, and in parallel worker processes (prebuild). Since the JS is
+generated lazily, merely importing is also timed.
+Each case runs in a fresh process. Not run as part of the test suite; run
+this module directly.
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+
+
+CLASS_TEMPLATE = '''
+class Widget{i}(app.JsComponent):
+
+    title = event.StringProp('widget {i}', settable=True)
+    count = event.IntProp(0, settable=True)
+    items = event.ListProp([], settable=True)
+
+    @event.action
+    def increase(self, n=1):
+        self._mutate_count(self.count + n)
+        self._mutate_items([self.count], 'insert', len(self.items))
+
+    @event.reaction('title', 'count')
+    def _update(self, *events):
+        text = self.title + ': ' + str(self.count)
+        for ev in events:
+            if ev.type == 'count' and ev.new_value > 10:
+                text += '!'
+        window.console.log(text)
+
+    def _format(self, value):
+        return ', '.join([str(x) for x in value if x % 2 == 0])
+'''
+
+
+def write_module(dirname, n):
+    code = ['from flexx import app, event', 'from pscript import window']
+    code.extend(CLASS_TEMPLATE.format(i=i) for i in range(n))
+    with open(os.path.join(dirname, 'many_widgets.py'), 'wb') as f:
+        f.write('\n'.join(code).encode())
+
+
+def time_import(dirname, use_cache, build='prewarm'):
+    code = ('import time; import flexx.app; t0 = time.perf_counter(); '
+            'import many_widgets; %s'
+            'print(time.perf_counter() - t0)')
+    code = code % ('flexx.app.assets.%s(); ' % build if build else '')
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join([dirname] + sys.path)
+    env['FLEXX_JS_CACHE'] = str(use_cache)
+    out = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return float(out.decode().strip().splitlines()[-1])
+
+
+def bench_jscache(n=150):
+    with tempfile.TemporaryDirectory() as dirname:
+        write_module(dirname, n)
+        t_import = time_import(dirname, False, None)
+        t_nocache = time_import(dirname, False)
+        t_prebuild = time_import(dirname, False, 'prebuild')
+        time_import(dirname, True)  # fill the cache
+        t_cache = time_import(dirname, True)
+    print('defining %i JsComponent classes: %0.3f s' % (n, t_import))
+    print('defining and generating JS: without cache %0.3f s, '
+          'with cache %0.3f s' % (t_nocache, t_cache))
+    print('defining and generating JS in %i processes (prebuild): %0.3f s' %
+          (os.cpu_count(), t_prebuild))
+
+
+if __name__ == '__main__':
+    bench_jscache()
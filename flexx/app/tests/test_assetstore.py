@@ -4,10 +4,12 @@ Tests for Asset AssetStore and Session.
 
 import os
 import sys
+import gzip
 import tempfile
 import shutil
 
 from flexx.util.testing import run_tests_if_main, raises, skip
+from flexx.util.logging import capture_log
 
 from flexx.app._assetstore import assets, AssetStore as _AssetStore
 from flexx.app._session import Session
@@ -24,12 +26,19 @@ class AssetStore(_AssetStore):
     _test_mode = True
 
 
+class LazyComponent(app.JsComponent):
+
+    def _say_hi(self):
+        print('hi from lazy component')
+
+
 def test_asset_store_collect():
 
     s = AssetStore()
     s.update_modules()
-    assert len(s.modules) > 1
     assert 'flexx.app._component2' in s.modules
+    s.prewarm()  # resolve dependencies
+    assert len(s.modules) > 1
 
     assert 'JsComponent.prototype =' in s.get_asset('flexx.app._component2.js').to_string()
     assert 'JsComponent.prototype =' in s.get_asset('flexx.app.js').to_string()
@@ -46,6 +55,7 @@ def test_asset_store_collect2():
 
     s = AssetStore()
     s.update_modules()
+    s.prewarm()
     assert len(s.modules) > 10
     assert 'flexx.ui._widget' in s.modules
 
@@ -55,6 +65,112 @@ def test_asset_store_collect2():
     assert '$Widget =' not in s.get_asset('flexx.app.js').to_string()
 
 
+def test_asset_store_lazy_js():
+    from flexx.app._component2 import _js_codes
+
+    del LazyComponent.JS.CODE  # as it was after defining the class
+    mod_name = LazyComponent.__jsmodule__
+
+    # Collecting modules does not generate the JS
+    s = AssetStore()
+    s.update_modules()
+    assert mod_name in s.modules
+    assert LazyComponent.JS not in _js_codes
+
+    # Pre-warming does
+    t = s.prewarm(mod_name, background=True)
+    t.join()
+    assert LazyComponent.JS in _js_codes
+    assert 'hi from lazy component' in s.get_asset(mod_name + '.js').to_string()
+
+    with raises(ValueError):
+        s.prewarm('flxtest.not_a_module')
+
+
+PREBUILD_CODE = """
+from flexx import app, config
+from flexx.app._assetstore import AssetStore
+from flexx.app._component2 import AppComponentMeta
+from flexx.util.logging import capture_log
+
+config.js_cache = False
+
+class Foo(app.JsComponent):
+    def _say_hi(self):
+        print('hi from foo')
+
+class Bar(Foo):
+    pass
+
+# Restore the situation at class creation
+classes = list(AppComponentMeta.CLASSES)
+codes = [cls.JS.CODE for cls in classes]
+for cls in classes:
+    del cls.JS.CODE
+
+s = AssetStore()
+with capture_log('info') as logs:
+    s.prebuild(2)
+assert 'in 2 processes' in ' '.join(logs), logs  # the pool was used
+assert [cls.JS.CODE for cls in classes] == codes
+assert ([cls.JS.CODE.meta['linenr'] for cls in classes] ==
+        [code.meta['linenr'] for code in codes])
+assert 'hi from foo' in s.get_asset('__main__.js').to_string()
+print('generated JS for %i classes' % len(classes))
+"""
+
+
+def test_asset_store_prebuild():
+    import threading
+    import subprocess
+    import multiprocessing
+    import flexx
+    from flexx.app._component2 import AppComponentMeta
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        skip('prebuild needs fork')
+
+    # In subprocess, since prebuild() does not fork when threads are running.
+    # From a file, because PScript needs the source of the classes.
+    filename = os.path.join(tempfile.mkdtemp(), 'flexx_prebuild_test.py')
+    with open(filename, 'wb') as f:
+        f.write(PREBUILD_CODE.encode())
+    env = os.environ.copy()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(flexx.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    p = subprocess.Popen([sys.executable, filename], env=env,
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate(timeout=120)[0].decode()
+    shutil.rmtree(os.path.dirname(filename))
+    if p.returncode:
+        raise RuntimeError(out)
+    assert 'generated JS for 4 classes' in out
+
+    # Does not fork when other threads are running
+    classes = list(AppComponentMeta.CLASSES)
+    codes = [cls.JS.CODE for cls in classes]
+    assert LazyComponent in classes
+    event = threading.Event()
+    t = threading.Thread(target=event.wait)
+    t.start()
+    try:
+        for cls in classes:
+            del cls.JS.CODE
+        s = AssetStore()
+        with capture_log('warning') as logs:
+            s.prebuild(2)
+        generated = [cls.JS.CODE for cls in classes]
+    finally:
+        event.set()
+        t.join()
+        for cls, code in zip(classes, codes):
+            cls.JS.CODE = code
+    assert 'does not fork' in ' '.join(logs)
+    assert generated == codes
+    assert 'hi from lazy component' in s.get_asset(
+        LazyComponent.__jsmodule__ + '.js').to_string()
+
+
 def test_asset_store_adding_assets():
 
     s = AssetStore()
@@ -75,6 +191,60 @@ def test_asset_store_adding_assets():
         s.get_asset('foo-not-exists.js')  # does not exist
 
 
+def test_asset_store_bytes_and_hash():
+
+    s = AssetStore()
+    s.add_shared_asset('foo.js', 'XXX')
+    s.add_shared_asset('bar.js', 'YYY')
+
+    assert s.get_asset_bytes('foo.js') == b'XXX'
+    assert gzip.decompress(s.get_asset_bytes('foo.js', 'gzip')) == b'XXX'
+    assert s.get_asset_bytes('foo.js', 'gzip') is s.get_asset_bytes('foo.js', 'gzip')
+    with raises(ValueError):
+        s.get_asset_bytes('foo.js', 'zip')
+
+    h = s.get_asset_hash('foo.js')
+    assert isinstance(h, str) and len(h) == 16
+    assert h == s.get_asset_hash('foo.js')
+    assert h != s.get_asset_hash('bar.js')
+
+    with raises(KeyError):
+        s.get_asset_hash('foo-not-exists.js')
+
+
+def test_asset_store_minify():
+    import json
+    from flexx import config
+
+    s = AssetStore()
+    s.add_shared_asset('foo.js', 'var foo = 3;  // shared assets are not minified')
+    s.update_modules()
+    name = 'flexx.app._component2.js'
+    source = s.get_asset(name).to_string()
+    assert s.get_source_map(name) is None
+
+    config.minify = True
+    try:
+        s._asset_cache.clear()
+        code = s.get_asset_bytes(name).decode()
+        assert len(code) < 0.8 * len(source)
+        assert code.endswith('//# sourceMappingURL=%s.map\n' % name)
+        source_map = json.loads(s.get_source_map(name).decode())
+        assert source_map['file'] == name
+        assert source_map['sourcesContent'] == [source]
+        assert s.get_asset_hash(name) != s.get_asset_hash('foo.js')
+        assert s.get_source_map('foo.js') is None
+        assert 'not minified' in s.get_asset_bytes('foo.js').decode()
+        # The result is kept while the bundle does not change
+        s._asset_cache.clear()
+        assert s.get_asset_bytes(name).decode() == code
+        assert len(s._minify_cache) == 1
+    finally:
+        config.minify = False
+        s._asset_cache.clear()
+    assert s.get_asset_bytes(name).decode() == source
+
+
 def test_associate_asset():
 
     s = AssetStore()
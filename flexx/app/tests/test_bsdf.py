@@ -0,0 +1,105 @@
+""" Test the (vendored) BSDF implementations, in particular that
+what Python encodes can be decoded in JS.
+"""
+
+import os
+import json
+import base64
+import random
+
+from pscript.functions import evaljs
+
+from flexx.util.testing import run_tests_if_main, raises, skip
+from flexx.util.getresource import get_resoure_path
+from flexx.app import bsdf_lite
+
+
+def decode_in_js(bb):
+    """ Decode the given bsdf-encoded bytes in JS, and return the JSON
+    representation of the result, with blobs as lists of ints.
+    """
+    filename = get_resoure_path('bsdf.js').replace('\\', '/')
+    code = 'var bsdf = require(%s);\n' % json.dumps(filename)
+    code += 'var bb = Buffer.from("%s", "base64");\n' % base64.b64encode(bb).decode()
+    code += """
+    var ob = bsdf.decode(bb);
+    console.log(JSON.stringify(ob, function (key, val) {
+        if (val instanceof DataView) {
+            return Array.from(new Uint8Array(val.buffer, val.byteOffset, val.byteLength));
+        }
+        return val;
+    }));
+    """
+    return json.loads(evaljs(code, print_result=False))
+
+
+def test_compression_threshold():
+    blob1 = b'x' * 100
+    blob2 = b'x' * 1000
+
+    s = bsdf_lite.BsdfLiteSerializer(compression='zlib', compression_threshold=500)
+    bb = s.encode([blob1, blob2])
+    assert len(bb) < 300
+    assert s.decode(bb) == [blob1, blob2]
+    assert blob1 in bb and blob2 not in bb
+
+    s = bsdf_lite.BsdfLiteSerializer(compression='zlib')
+    bb = s.encode([blob1, blob2])
+    assert blob1 not in bb
+
+    with raises(TypeError):
+        bsdf_lite.BsdfLiteSerializer(compression='lz4')
+
+
+def test_zlib_in_js():
+    random.seed(0)
+    blobs = [b'',
+             b'x',
+             b'hello world ' * 1000,  # fixed codes
+             bytes(random.randrange(0, 16) for i in range(20000)),  # dynamic codes
+             os.urandom(3000),  # stored blocks
+             ]
+    s = bsdf_lite.BsdfLiteSerializer(compression='zlib')
+    bb = s.encode(dict(blobs=blobs, foo=3))
+    result = decode_in_js(bb)
+    assert result['foo'] == 3
+    assert [bytes(x) for x in result['blobs']] == blobs
+
+    # Plain blobs still work too
+    s = bsdf_lite.BsdfLiteSerializer()
+    result = decode_in_js(s.encode(blobs[:3]))
+    assert [bytes(x) for x in result] == blobs[:3]
+
+
+def test_ndarray_zero_copy():
+    try:
+        import numpy as np
+    except ImportError:
+        skip('No numpy')
+
+    s = bsdf_lite.BsdfLiteSerializer()
+    a = np.arange(10000, dtype=np.float32).reshape(100, 100)
+
+    # The segments contain the array's own buffer
+    segments = s.encode_segments(dict(foo=a))
+    assert any(seg.obj is a for seg in segments)
+    bb = s.encode(dict(foo=a))
+    assert bb == b''.join(segments)
+
+    # Decoding produces a view on the message
+    a2 = s.decode(bb)['foo']
+    assert a2.dtype == a.dtype and a2.shape == a.shape
+    assert np.all(a2 == a)
+    assert np.shares_memory(a2, np.frombuffer(bb, np.uint8))
+
+    # Non-contiguous arrays are copied
+    a3 = s.decode(s.encode(a[:, ::2]))
+    assert np.all(a3 == a[:, ::2])
+
+    # Plain blobs are decoded as bytes
+    blob = b'x' * 10000
+    assert s.decode(s.encode([blob, memoryview(blob)])) == [blob, blob]
+    assert isinstance(s.decode(s.encode(blob)), bytes)
+
+
+run_tests_if_main()
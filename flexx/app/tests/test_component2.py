@@ -177,6 +177,35 @@ def test_properties():
     assert MyJComponent2.JS.__reactions__ == ['track_foo']
 
 
+def test_proxy_setters():
+
+    class MyJComponent3(MyJComponent1):
+        bar = event.IntProp(settable=True)
+        spam = event.IntProp(settable=True)
+
+        @event.action
+        def set_spam(self, v):
+            self._mutate_spam(v * 2)
+
+    assert MyJComponent1.__proxy_setters__ == []
+    assert MyJComponent3.__proxy_setters__ == ['set_bar']
+    assert not hasattr(MyPComponent1, '__proxy_setters__')
+
+    # Plain setters are send as such, so that superseded values can be dropped
+    session = StubSession()
+    sent = []
+    session.send_command = lambda *command: sent.append(('cmd', ) + command)
+    session._send_set_command = lambda *command: sent.append(('set', ) + command)
+    m = MyJComponent3(flx_session=session)
+    sent[:] = []
+    m.set_bar(3)
+    m.set_spam(3)
+    m.increase_foo()
+    assert sent == [('set', m.id, 'set_bar', (3, )),
+                    ('cmd', 'INVOKE', m.id, 'set_spam', (3, )),
+                    ('cmd', 'INVOKE', m.id, 'increase_foo', ())]
+
+
 def test_cannot_instantiate_without_session():
 
     app.manager.remove_default_session()
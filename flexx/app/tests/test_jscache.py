@@ -0,0 +1,136 @@
+"""
+Test the persistent cache for generated JS.
+"""
+
+import os
+import time
+import tempfile
+
+from pscript import py2js
+
+from flexx.util.testing import run_tests_if_main
+
+from flexx import app, event, config
+from flexx.app._jscache import JSCache, jscache, get_class_key
+
+
+class CachedComponent(app.JsComponent):
+
+    foo = event.IntProp(3, settable=True)
+
+    @event.reaction('foo')
+    def on_foo(self, *events):
+        print(self.foo)
+
+
+def spam(x):
+    return [i for i in x if i > 0]
+
+
+def test_jscache_get_set():
+
+    cache = JSCache(tempfile.mkdtemp())
+    js1 = py2js(spam, inline_stdlib=False)
+    key = cache.get_key('foo', 'bar')
+    assert key != cache.get_key('foo', 'bar2')
+    assert cache.get(key) is None
+
+    cache.set(key, js1)
+    js2 = cache.get(key)
+    assert js2 == js1
+    assert js2.meta['linenr'] == js1.meta['linenr']
+    assert js2.meta['std_functions'] == js1.meta['std_functions']
+    assert isinstance(js2.meta['vars_unknown'], set)
+
+    # Corrupt entries are a miss
+    for data in (b'{"code": "x"}', b'[]', b'{"code'):
+        with open(os.path.join(cache.dirname, key + '.json'), 'wb') as f:
+            f.write(data)
+        assert cache.get(key) is None
+
+    # Disabled via config
+    config.js_cache = False
+    try:
+        assert cache.get(key) is None
+    finally:
+        config.js_cache = True
+
+
+def test_jscache_evict():
+
+    cache = JSCache(tempfile.mkdtemp())
+    js = py2js('x = "' + 'x' * 100000 + '"')  # > 0.1 MB per entry
+    for i in range(5):
+        cache.set(str(i), js)
+        os.utime(os.path.join(cache.dirname, str(i) + '.json'),
+                 (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get('0')  # mark as recently used
+
+    cache.evict(0.25)
+    assert sorted(os.listdir(cache.dirname)) == ['0.json', '4.json']
+    cache.clear()
+    assert os.listdir(cache.dirname) == []
+
+
+def test_jscache_class_key():
+
+    key1 = get_class_key(CachedComponent.JS, 'CachedComponent', 'base')
+    key2 = get_class_key(CachedComponent.JS, 'CachedComponent', 'base')
+    key3 = get_class_key(CachedComponent.JS, 'CachedComponent', 'base2')
+    assert key1 == key2 != key3
+
+    # Changing a value that ends up in the JS changes the key
+    CachedComponent.JS.foo._default = 4
+    try:
+        key4 = get_class_key(CachedComponent.JS, 'CachedComponent', 'base')
+    finally:
+        CachedComponent.JS.foo._default = 3
+    assert key4 != key1
+
+    # Same-named classes with different methods have different keys
+    def make_class(x):
+        class Sub(CachedComponent.JS):
+            def bar(self):
+                return 1
+        class Sub2(CachedComponent.JS):
+            def bar(self):
+                return 2
+        return Sub if x == 1 else Sub2
+    key5 = get_class_key(make_class(1), 'Sub', 'base')
+    key6 = get_class_key(make_class(2), 'Sub', 'base')
+    assert key5 != key6
+    assert key5 == get_class_key(make_class(1), 'Sub', 'base')
+
+    # Classes without source are not cached
+    Dynamic = type('Dynamic', (object, ), {'__module__': '__nonexistent__'})
+    assert get_class_key(Dynamic, 'Dynamic', 'base') is None
+
+
+def test_jscache_dir():
+    # The tests do not write to the cache of the user
+    assert config.js_cache_dir
+    assert jscache.dirname == config.js_cache_dir
+
+
+def test_jscache_component_js():
+
+    # Restore the situation at class creation
+    code = CachedComponent.JS.CODE
+    del CachedComponent.JS.CODE
+    dirname = jscache._dirname
+    jscache._dirname = tempfile.mkdtemp()
+    try:
+        js1 = CachedComponent._get_js()  # generates, and stores
+        assert len(os.listdir(jscache.dirname)) == 1
+        js2 = CachedComponent._get_js()  # from the cache
+        js3 = CachedComponent._create_js('CachedComponent', 'JsComponent.prototype')
+    finally:
+        jscache._dirname = dirname
+        CachedComponent.JS.CODE = code
+
+    assert js1 == js2 == js3 == code
+    for key in ('vars_unknown', 'std_functions', 'std_methods', 'linenr'):
+        assert js2.meta[key] == js3.meta[key]
+
+
+run_tests_if_main()
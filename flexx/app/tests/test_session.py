@@ -4,10 +4,14 @@ import gc
 import sys
 import weakref
 import asyncio
+import threading
 
-from flexx import app
+from flexx import app, event, config
 from flexx.app import Session
+from flexx.app._session import _get_dict_mutations, _get_list_mutations
+from flexx.app._session import set_worker_id, get_worker_id, get_page
 from flexx.app._assetstore import assets, AssetStore as _AssetStore
+from flexx.app._threads import get_session_thread
 
 
 class AssetStore(_AssetStore):
@@ -18,11 +22,38 @@ class Fooo1(app.PyComponent):
     x = 3
 
 
+class Fooo2(app.JsComponent):
+    d = event.DictProp(settable=True)
+    l = event.ListProp(settable=True)
+
+
 def test_session_basics():
 
     s = Session('xx')
     assert s.app_name == 'xx'
     assert 'xx' in repr(s)
+    assert s.send_pressure == 0
+
+
+def test_session_worker_id():
+
+    s = Session('xx')
+    assert get_worker_id() is None
+    assert get_worker_id(s.id) is None
+    assert 'create_session("xx", "%s");' % s.id in get_page(s)
+
+    set_worker_id(3)
+    try:
+        s = Session('xx')
+        assert s.id.startswith('w3_')
+        assert get_worker_id() == 3
+        assert get_worker_id(s.id) == 3
+    finally:
+        set_worker_id(None)
+    assert get_worker_id() is None
+
+    html = get_page(s, 'ws://foo:8080/flexx/ws/xx')
+    assert 'create_session("xx", "%s", "ws://foo:8080/flexx/ws/xx");' % s.id in html
 
 
 def test_get_component_instance_by_id():
@@ -91,6 +122,160 @@ def test_session_assets_data():
     assert s.get_data('bla') is None
 
 
+def test_session_receive_batch(capsys):
+
+    s = Session('')
+    s._receive_command(('BATCH', [('PRINT', 'foo'), ('PRINT', 'bar')]))
+    out = capsys.readouterr().out
+    assert out.splitlines() == ['JS: foo', 'JS: bar']
+
+
+def test_dict_mutations():
+
+    def check(d1, d2):
+        mutations = _get_dict_mutations(d1, d2)
+        d1 = d1.copy()
+        for mutation, objects, index in mutations:
+            event.mutate_dict(d1, dict(mutation=mutation, objects=objects,
+                                       index=index))
+        assert d1 == d2
+        return mutations
+
+    d = dict(a=1, b=2, c=3, d=4, e=5)
+    assert check(d, d) == []
+    assert check(d, dict(d, b=9)) == [('replace', {'b': 9}, -1)]
+    assert check(d, dict(d, f=6)) == [('replace', {'f': 6}, -1)]
+    d2 = d.copy()
+    d2.pop('c')
+    assert check(d, d2) == [('remove', ['c'], -1)]
+    d2['a'] = 0
+    assert check(d, d2) == [('replace', {'a': 0}, -1), ('remove', ['c'], -1)]
+
+    # Nested values are compared too
+    assert check(dict(d, x=[1, 2]), dict(d, x=[1, 3])) == [('replace',
+                                                            {'x': [1, 3]}, -1)]
+
+    # Send the whole dict if too much changes
+    assert _get_dict_mutations(d, dict(a=2, b=3, c=4, d=5, e=6)) is None
+    assert _get_dict_mutations({}, dict(a=1)) is None
+
+
+def test_list_mutations():
+
+    def check(l1, l2):
+        mutations = _get_list_mutations(l1, l2)
+        l1 = list(l1)
+        for mutation, objects, index in mutations:
+            event.mutate_array(l1, dict(mutation=mutation, objects=objects,
+                                        index=index))
+        assert l1 == l2
+        return mutations
+
+    l = list(range(10))
+    assert check(l, l) == []
+    assert check(l, l + [10]) == [('insert', [10], 10)]
+    assert check(l, [-1] + l) == [('insert', [-1], 0)]
+    assert check(l, l[:3] + [9, 9] + l[3:]) == [('insert', [9, 9], 3)]
+    assert check(l, l[:3] + l[5:]) == [('remove', 2, 3)]
+    assert check(l, l[:3] + [9] + l[4:]) == [('replace', [9], 3)]
+    assert check(l, l[:3] + [8, 9] + l[4:]) == [('replace', [8], 3),
+                                                 ('insert', [9], 4)]
+    assert check(l, l[:3] + [9] + l[6:]) == [('replace', [9], 3),
+                                             ('remove', 2, 4)]
+    assert check(l, []) == [('remove', 10, 0)]
+    assert check([1, 1, 1], [1, 1]) == [('remove', 1, 2)]
+
+    # Send the whole list if too much changes
+    assert _get_list_mutations(l, l[::-1]) is None
+    assert _get_list_mutations([], [1, 2]) is None
+
+
+def test_session_send_delta():
+
+    s = Session('')
+    config.ws_delta = True
+    try:
+        m = Fooo2(flx_session=s)
+        s._pending_commands = []
+        d = dict(a=1, b=2, c=3)
+        m.set_d(d)
+        d['b'] = 4  # in-place changes are detected too
+        m.set_d(d)
+        m.set_d(d)
+        m.set_l([1, 2, 3])
+        m.set_l([1, 2, 3, 4])
+        assert s._pending_commands == [
+            ('INVOKE', m.id, 'set_d', [dict(a=1, b=2, c=3)]),
+            ('INVOKE', m.id, '_flx_apply_mutations', ['d', [('replace', {'b': 4}, -1)]]),
+            ('INVOKE', m.id, 'set_l', [[1, 2, 3]]),
+            ('INVOKE', m.id, '_flx_apply_mutations', ['l', [('insert', [4], 3)]]),
+            ]
+        # Start over when the component is disposed
+        m._dispose()
+        assert m.id not in s._sent_values
+    finally:
+        config.ws_delta = False
+
+    # Without ws_delta, values are send in full
+    m = Fooo2(flx_session=s)
+    s._pending_commands = []
+    m.set_d(dict(a=1, b=2, c=3))
+    m.set_d(dict(a=1, b=4, c=3))
+    assert s._pending_commands == [
+        ('INVOKE', m.id, 'set_d', (dict(a=1, b=2, c=3), )),
+        ('INVOKE', m.id, 'set_d', (dict(a=1, b=4, c=3), )),
+        ]
+
+
+class RecordingWS:
+
+    def __init__(self):
+        self.close_code = None
+        self.commands = []
+        self.io_loop = asyncio.get_event_loop()
+
+    def write_command(self, cmd, key=None):
+        self.commands.append((cmd[0], threading.current_thread()))
+
+    def close_this(self):
+        self.close_code = 1000
+
+
+def test_session_in_thread():
+
+    config.session_threads = 1
+    try:
+        s1, s2 = Session('xx'), Session('xx')
+        t1, t2 = get_session_thread(s1), get_session_thread(s2)
+    finally:
+        config.session_threads = 0
+    assert get_session_thread(Session('xx')) is None
+    assert t1 is t2 and t1.is_alive()
+    assert not t1.is_current()
+    assert set(t1.sessions) == set([s1, s2])
+    s1._thread = t1
+
+    # Components must be created in the thread of their session
+    with raises(RuntimeError):
+        Fooo1(flx_session=s1)
+    m = t1.call_sync(Fooo1, flx_session=s1)
+    assert m._flx_loop is t1.loop
+    assert t1.call_sync(lambda: threading.current_thread()) is t1
+
+    # The websocket is written to from the thread in which it was connected
+    ws = RecordingWS()
+    s1._set_ws(ws)
+    assert s1.status == s1.STATUS.CONNECTED
+    asyncio.get_event_loop().run_until_complete(asyncio.sleep(0.01))
+    assert 'INIT_DONE' in [c[0] for c in ws.commands]
+    assert set(c[1] for c in ws.commands) == set([threading.current_thread()])
+
+    s1.close()
+    t1.call_sync(lambda: None)  # wait for the close to be processed
+    asyncio.get_event_loop().run_until_complete(asyncio.sleep(0.01))
+    assert s1.status == s1.STATUS.CLOSED
+
+
 def test_session_registering_component_classes():
     try:
         from flexx import ui
@@ -176,11 +361,9 @@ class SessionTester(Session):
     def send_command(self, *command):
         if command[0] == 'DEFINE':
             if 'JS' in command[1]:
-                _, _, name, _ = command
-                self.assets_js.append(name)
+                self.assets_js.append(command[2])
             elif 'CSS' in command[1]:
-                _, _, name, _ = command
-                self.assets_css.append(name)
+                self.assets_css.append(command[2])
 
 
 class FakeModule:
@@ -208,7 +391,7 @@ class FakeModule:
         self.deps.add(base.__jsmodule__)
         return cls
 
-    def add_variable(self, name):
+    def add_variable(self, name, lazy=False):
         assert name in [m.__name__ for m in self.component_classes]
 
     def get_js(self):
@@ -336,6 +519,67 @@ def test_module_loading5():
     assert s.assets_css == add_prefix(['foo.m1.css', 'bla.css', 'foo.m2.css', 'foo.m3.css'])
 
 
+class CommandWS:
+
+    def __init__(self):
+        self.close_code = None
+        self.commands = []
+
+    def write_command(self, cmd, key=None):
+        self.commands.append(cmd)
+
+
+def test_module_loading_client_assets():
+    """ Assets that the client has cached are not send again """
+    clear_test_classes()
+
+    store = AssetStore()
+    s = Session('', store)
+
+    m1 = FakeModule(store, 'foo.m1')
+    m2 = FakeModule(store, 'foo.m2')
+    m3 = FakeModule(store, 'foo.m3')
+    hashes = [store.get_asset_hash(add_prefix(name))
+              for name in ('foo.m1.js', 'foo.m2.css', 'foo.m3.js')]
+
+    Ma = m1.make_component_class('Ma')
+    Mb = m2.make_component_class('Mb')
+    Mc = m3.make_component_class('Mc')
+
+    # Defined before the client connects
+    s._register_component(Ma(flx_session=s))
+    ws = CommandWS()
+    s._set_ws(ws, hashes + ['xxxx'])
+    assert s.client_assets == set(hashes + ['xxxx'])
+    # Defined after the client connects
+    s._register_component(Mb(flx_session=s))
+    config.asset_cache = False
+    try:
+        s._register_component(Mc(flx_session=s))
+    finally:
+        config.asset_cache = True
+
+    defines = dict((c[2], c[3:]) for c in ws.commands if c[0] == 'DEFINE')
+    assert defines[add_prefix('foo.m1.js')] == (None, hashes[0])
+    assert defines[add_prefix('foo.m1.css')][0].endswith('foo.m1-CSS')
+    assert defines[add_prefix('foo.m2.css')] == (None, hashes[1])
+    assert defines[add_prefix('foo.m2.js')][0].endswith('foo.m2-JS')
+    assert defines[add_prefix('foo.m2.js')][1] == \
+        store.get_asset_hash(add_prefix('foo.m2.js'))
+    # Without the asset cache, everything is send, without a hash
+    assert defines[add_prefix('foo.m3.js')][0].endswith('foo.m3-JS')
+    assert defines[add_prefix('foo.m3.js')][1] is None
+
+    # When the asset got lost from the client's cache, it is send again
+    ws.commands = []
+    s._receive_command(('ASSET_MISSING', add_prefix('foo.m1.js'), hashes[0]))
+    assert len(ws.commands) == 1
+    assert ws.commands[0][:3] == ('DEFINE', 'JS-EVAL', add_prefix('foo.m1.js'))
+    assert ws.commands[0][3].endswith('foo.m1-JS')
+    assert ws.commands[0][4] == hashes[0]
+    assert s.client_assets == set(hashes[1:] + ['xxxx'])
+
+
 # clear_test_classes()
 # test_module_loading5()
 # clear_test_classes()
@@ -0,0 +1,457 @@
+from flexx.util.testing import run_tests_if_main, raises, skip
+
+import os
+import sys
+import gzip
+import socket
+import asyncio
+import subprocess
+
+from tornado import netutil
+from tornado.web import Application
+from tornado.httpserver import HTTPServer
+from tornado.httpclient import AsyncHTTPClient
+
+from flexx import config, app
+from flexx.app._assetstore import assets
+from flexx.app._clientcore import serializer
+from flexx.app._tornadoserver import WSHandler, MainHandler
+from flexx.app._tornadoserver import (DeferredComponent, _thread_serializer,
+                                      resolve_deferred_components)
+
+
+class StubSession:
+
+    def __init__(self):
+        self.commands = []
+
+    def _receive_command(self, command):
+        self.commands.append(command)
+
+
+class FakeWSHandler(WSHandler):
+    """ A WSHandler that is not connected, and that records the messages
+    that it would have send.
+    """
+
+    def __init__(self):
+        self._init_queues()
+        self.close_code = None
+        self.messages = []
+        self.futures = []
+        self.slow = False
+        self._session = StubSession()
+
+    def write_message(self, bb, binary=False):
+        assert binary
+        self.messages.append(serializer.decode(bb))
+        f = asyncio.Future()
+        if self.slow:
+            self.futures.append(f)  # resolve via send_all()
+        else:
+            f.set_result(None)
+        return f
+
+    def send_all(self):
+        futures, self.futures = self.futures, []
+        for f in futures:
+            f.set_result(None)
+
+    def close(self, code=None, reason=None):
+        self.close_code = code
+
+
+def run_loop_briefly():
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+
+def run_loop_until(condition, timeout=2.0):
+    """ Run the loop until the condition is met (e.g. when waiting for a
+    worker thread), and return whether it was met before the timeout.
+    """
+    loop = asyncio.get_event_loop()
+    for i in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        loop.run_until_complete(asyncio.sleep(0.01))
+    return condition()
+
+
+def test_write_command_no_batching():
+    ws = FakeWSHandler()
+    ws.write_command(('PRINT', 'foo'))
+    ws.write_command(('PRINT', 'bar'))
+    assert ws.messages == [['PRINT', 'foo'], ['PRINT', 'bar']]
+
+    with raises(AssertionError):
+        ws.write_command(['PRINT', 'foo'])
+
+
+def test_write_command_batching():
+    config.ws_batch = True
+    try:
+        ws = FakeWSHandler()
+        ws.write_command(('PRINT', 'foo'))
+        ws.write_command(('PRINT', 'bar'))
+        assert ws.messages == []
+        run_loop_briefly()
+        assert ws.messages == [['BATCH', [['PRINT', 'foo'], ['PRINT', 'bar']]]]
+
+        # A single command is send as-is
+        ws.messages = []
+        ws.write_command(('PRINT', 'foo'))
+        run_loop_briefly()
+        assert ws.messages == [['PRINT', 'foo']]
+    finally:
+        config.ws_batch = False
+
+
+def test_write_command_batching_superseded():
+    config.ws_batch = True
+    try:
+        ws = FakeWSHandler()
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [1]), ('c1', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'set_bar', [1]), ('c1', 'set_bar'))
+        ws.write_command(('INVOKE', 'c2', 'set_foo', [1]), ('c2', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [2]), ('c1', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [3]), ('c1', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'increase', []))
+        ws.write_command(('INVOKE', 'c1', 'increase', []))
+        run_loop_briefly()
+        assert len(ws.messages) == 1
+        assert ws.messages[0][1] == [['INVOKE', 'c1', 'set_foo', [3]],
+                                     ['INVOKE', 'c1', 'set_bar', [1]],
+                                     ['INVOKE', 'c2', 'set_foo', [1]],
+                                     ['INVOKE', 'c1', 'increase', []],
+                                     ['INVOKE', 'c1', 'increase', []]]
+
+        # The last value takes the place of the first, so that commands
+        # in between see the property changed, like without batching
+        ws.messages = []
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [1]), ('c1', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'bar', []))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [3]), ('c1', 'set_foo'))
+        run_loop_briefly()
+        assert ws.messages == [['BATCH', [['INVOKE', 'c1', 'set_foo', [3]],
+                                          ['INVOKE', 'c1', 'bar', []]]]]
+
+        # Keys are only considered within a batch
+        ws.messages = []
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [4]), ('c1', 'set_foo'))
+        run_loop_briefly()
+        assert ws.messages == [['INVOKE', 'c1', 'set_foo', [4]]]
+    finally:
+        config.ws_batch = False
+
+    # Without batching, nothing is dropped
+    ws = FakeWSHandler()
+    ws.write_command(('INVOKE', 'c1', 'set_foo', [1]), ('c1', 'set_foo'))
+    ws.write_command(('INVOKE', 'c1', 'set_foo', [2]), ('c1', 'set_foo'))
+    assert len(ws.messages) == 2
+
+
+def test_write_command_batching_size_cap():
+    config.ws_batch = True
+    config.ws_batch_size = 3
+    try:
+        ws = FakeWSHandler()
+        for i in range(5):
+            ws.write_command(('INVOKE', 'c1', 'set_foo', [i]), ('c1', 'set_foo'))
+        assert ws.messages == []  # superseded commands do not count
+        run_loop_briefly()
+        assert ws.messages == [['INVOKE', 'c1', 'set_foo', [4]]]
+        ws.messages = []
+        for i in range(7):
+            ws.write_command(('PRINT', str(i)))
+        assert len(ws.messages) == 2
+        assert ws.messages[0] == ['BATCH', [['PRINT', '0'], ['PRINT', '1'],
+                                            ['PRINT', '2']]]
+        run_loop_briefly()
+        assert len(ws.messages) == 3
+        assert ws.messages[2] == ['PRINT', '6']
+    finally:
+        config.ws_batch = False
+        config.ws_batch_size = 1000
+
+
+def test_write_command_chunked():
+    config.ws_chunk_size = 100
+    try:
+        ws = FakeWSHandler()
+        ws.write_command(('PRINT', 'x' * 250))
+        ws.write_command(('PRINT', 'foo'))  # must wait for the chunks
+        assert ws.messages == []
+        run_loop_briefly()
+        assert [m[0] for m in ws.messages] == ['CHUNK'] * 3 + ['PRINT']
+        assert ws.messages[-1] == ['PRINT', 'foo']
+        assert [m[1] for m in ws.messages[:3]] == [0, 100, 200]
+
+        # Reassemble at the other end
+        ws2 = FakeWSHandler()
+        for m in ws.messages[:2]:
+            assert ws2._receive_chunk(m) is None
+        bb = ws2._receive_chunk(ws.messages[2])
+        assert serializer.decode(bb) == ['PRINT', 'x' * 250]
+        assert ws2._chunks is None
+
+        # Small messages are send directly when no chunks are being send
+        ws.messages = []
+        ws.write_command(('PRINT', 'foo'))
+        assert ws.messages == [['PRINT', 'foo']]
+    finally:
+        config.ws_chunk_size = 1048576
+
+
+def test_receive_chunk_validation():
+    bb = serializer.encode(('PRINT', 'x' * 250))
+    n = len(bb)
+
+    def receive(ws, *chunks):
+        for offset, total, data in chunks:
+            ws._receive_command(('CHUNK', offset, total, data))
+        return ws.close_code
+
+    # Valid
+    ws = FakeWSHandler()
+    assert receive(ws, (0, n, bb[:100]), (100, n, bb[100:])) is None
+    assert ws._session.commands == [['PRINT', 'x' * 250]]
+
+    # Before the handshake
+    ws = FakeWSHandler()
+    ws._session = None
+    assert receive(ws, (0, n, bb[:100])) == 1009
+    assert ws._chunks is None
+
+    # Too big
+    config.ws_max_message_size = 200
+    try:
+        ws = FakeWSHandler()
+        assert receive(ws, (0, n, bb[:100])) == 1009
+        assert ws._chunks is None
+    finally:
+        config.ws_max_message_size = 10485760
+
+    # Out of order, or not starting at zero
+    assert receive(FakeWSHandler(), (100, n, bb[100:])) == 1009
+    assert receive(FakeWSHandler(), (0, n, bb[:100]), (150, n, bb[150:])) == 1009
+    assert receive(FakeWSHandler(), (0, n, bb[:100]), (100, n + 1, bb[100:])) == 1009
+
+    # Sizes that do not add up
+    assert receive(FakeWSHandler(), (0, n, bb + b'xx')) == 1009
+    assert receive(FakeWSHandler(), (0, n, b'')) == 1009
+    assert receive(FakeWSHandler(), (0, -1, bb)) == 1009
+    assert receive(FakeWSHandler(), (0, 'x', bb)) == 1009
+    ws = FakeWSHandler()
+    ws._receive_command(('CHUNK', 0, n))
+    assert ws.close_code == 1009
+
+
+def test_write_command_congested():
+    config.ws_high_watermark = 100
+    config.ws_low_watermark = 50
+    try:
+        # Drop superseded property values (the default)
+        ws = FakeWSHandler()
+        ws.slow = True
+        ws.write_command(('PRINT', 'x' * 200))
+        run_loop_briefly()
+        assert ws.send_pressure > 1
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [1]), ('c1', 'set_foo'))
+        ws.write_command(('PRINT', 'foo'))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [2]), ('c1', 'set_foo'))
+        assert len(ws.messages) == 1
+        pressure = ws.send_pressure
+        for i in range(4):
+            ws.send_all()
+            run_loop_briefly()
+        assert ws.send_pressure == 0 < pressure
+        assert ws.messages[1:] == [['INVOKE', 'c1', 'set_foo', [2]],
+                                   ['PRINT', 'foo']]
+        assert not ws._send_queue_keys
+
+        # Hold back, but do not drop
+        config.ws_congestion_policy = 'block'
+        ws = FakeWSHandler()
+        ws.slow = True
+        ws.write_command(('PRINT', 'x' * 200))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [1]), ('c1', 'set_foo'))
+        ws.write_command(('INVOKE', 'c1', 'set_foo', [2]), ('c1', 'set_foo'))
+        ready = []
+
+        async def producer():
+            await ws.co_send_ready()
+            ready.append(ws.send_pressure)
+
+        asyncio.get_event_loop().create_task(producer())
+        run_loop_briefly()
+        assert not ready
+        for i in range(4):
+            ws.send_all()
+            run_loop_briefly()
+        assert len(ws.messages) == 3
+        assert len(ready) == 1 and ready[0] <= 0.5  # below low watermark
+
+        # Disconnect
+        config.ws_congestion_policy = 'disconnect'
+        ws = FakeWSHandler()
+        ws.slow = True
+        ws.write_command(('PRINT', 'x' * 200))
+        assert ws.close_code is None
+        ws.write_command(('PRINT', 'foo'))
+        assert ws.close_code == 1008
+        assert len(ws.messages) == 1
+
+        # The queue is limited under every policy
+        config.ws_max_queue_size = 1000
+        for policy in ('drop', 'block'):
+            config.ws_congestion_policy = policy
+            ws = FakeWSHandler()
+            ws.slow = True
+            ws.write_command(('PRINT', 'x' * 200))
+            for i in range(20):
+                ws.write_command(('INVOKE', 'c1', 'set_foo', ['x' * 30]),
+                                 ('c1', 'set_foo'))
+            if policy == 'drop':
+                assert ws.close_code is None  # superseded values are replaced
+                for i in range(20):
+                    ws.write_command(('PRINT', 'x' * 30))
+            assert ws.close_code == 1008
+            ws.write_command(('PRINT', 'foo'))  # ignored after closing
+            assert ws._queued_bytes == 0 and not ws._send_queue
+
+    finally:
+        config.ws_high_watermark = 16777216
+        config.ws_low_watermark = 4194304
+        config.ws_congestion_policy = 'drop'
+        config.ws_max_queue_size = 67108864
+
+
+def test_receive_in_thread():
+    config.ws_decode_threshold = 1000
+    try:
+        ws = FakeWSHandler()
+        ws._receive_message(serializer.encode(('PRINT', 'foo')))
+        assert ws._session.commands == [['PRINT', 'foo']]
+
+        # Large messages are decoded in a thread, but the order is kept
+        ws._receive_message(serializer.encode(('PRINT', 'x' * 2000)))
+        ws._receive_message(serializer.encode(('PRINT', 'bar')))
+        assert len(ws._session.commands) == 1
+        assert run_loop_until(lambda: len(ws._session.commands) == 3)
+        assert ws._session.commands[1:] == [['PRINT', 'x' * 2000], ['PRINT', 'bar']]
+        assert ws._receive_queue is None
+
+        # Also when chunked
+        ws._session.commands = []
+        bb = serializer.encode(('PRINT', 'y' * 2000))
+        ws._receive_message(serializer.encode(('CHUNK', 0, len(bb), bb[:1500])))
+        ws._receive_message(serializer.encode(('CHUNK', 1500, len(bb), bb[1500:])))
+        ws._receive_message(serializer.encode(('PRINT', 'bar')))
+        assert run_loop_until(lambda: len(ws._session.commands) == 2)
+        assert ws._session.commands == [['PRINT', 'y' * 2000], ['PRINT', 'bar']]
+    finally:
+        config.ws_decode_threshold = 0
+
+
+class MyPyComponent(app.PyComponent):
+    pass
+
+
+def test_deferred_components():
+    session = app.manager.get_default_session()
+    if session is None:
+        session = app.manager.create_default_session()
+    c = MyPyComponent()
+
+    bb = serializer.encode(('INVOKE', 'x', 'foo', [c, dict(c=c)]))
+    command = _thread_serializer.decode(bb)
+    assert isinstance(command[3][0], DeferredComponent)
+    command = resolve_deferred_components(command)
+    assert command[3] == [c, dict(c=c)]
+
+
+def test_compression_options():
+    ws = FakeWSHandler()
+    assert ws.get_compression_options() is None
+    config.ws_compression = True
+    try:
+        assert ws.get_compression_options() == {}
+    finally:
+        config.ws_compression = False
+
+
+def test_asset_caching():
+    [sock] = netutil.bind_sockets(0, 'localhost', family=socket.AF_INET)
+    server = HTTPServer(Application([(r"/flexx/(.*)", MainHandler)]))
+    server.add_sockets([sock])
+    url = 'http://localhost:%i/flexx/assets/shared/reset.css' % sock.getsockname()[1]
+
+    def fetch(url, headers=None):
+        client = AsyncHTTPClient()
+        coro = client.fetch(url, headers=headers, raise_error=False,
+                            decompress_response=False)
+        return asyncio.get_event_loop().run_until_complete(coro)
+
+    try:
+        source = assets.get_asset('reset.css').to_string().encode()
+        hash = assets.get_asset_hash('reset.css')
+
+        # Not versioned: can be cached, but must revalidate
+        r = fetch(url)
+        assert r.code == 200 and r.body == source
+        assert r.headers['Cache-Control'] == 'no-cache'
+        etag = r.headers['Etag']
+        assert hash in etag
+
+        r = fetch(url, {'If-None-Match': etag})
+        assert r.code == 304 and not r.body
+
+        # Versioned: cache forever
+        r = fetch(url + '?v=' + hash)
+        assert 'immutable' in r.headers['Cache-Control']
+
+        # Compressed
+        r = fetch(url, {'Accept-Encoding': 'gzip, deflate'})
+        assert r.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(r.body) == source
+        assert r.headers['Etag'] != etag
+    finally:
+        server.stop()
+
+
+FORK_CODE = """
+import sys
+from tornado.httpclient import AsyncHTTPClient
+from flexx import app
+
+class Foo(app.PyComponent):
+    pass
+
+app.serve(Foo)
+server = app.create_server(host='localhost', port=0)
+worker_id = server.fork(2)
+port = server.app._flexx_worker_ports[worker_id]
+r = server._loop.run_until_complete(
+    AsyncHTTPClient().fetch('http://localhost:%i/Foo/' % port))
+ws_url = 'ws://localhost:%i/flexx/ws/Foo' % port
+print('worker %i %s' % (worker_id, ws_url in r.body.decode()), flush=True)
+sys.exit(0)
+"""
+
+
+def test_fork():
+    if not hasattr(os, 'fork'):
+        skip('fork needs Unix')
+    # In subprocess, because the parent process exits when the workers do
+    p = subprocess.Popen([sys.executable, '-c', FORK_CODE], env=os.environ,
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.communicate(timeout=60)[0].decode()
+    if p.returncode:
+        raise RuntimeError(out)
+    # Each worker serves the page with a websocket url to its own port
+    assert 'worker 0 True' in out
+    assert 'worker 1 True' in out
+
+
+run_tests_if_main()
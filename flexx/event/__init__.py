@@ -12,7 +12,7 @@ del sys
 
 # flake8: noqa
 from ._dict import Dict
-from ._loop import Loop, loop
+from ._loop import Loop, loop, get_current_loop
 from ._action import Action, action
 from ._reaction import Reaction, reaction
 from ._emitter import emitter, Emitter
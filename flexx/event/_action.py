@@ -5,7 +5,7 @@ Implements the action decorator, class and desciptor.
 import weakref
 import inspect
 
-from ._loop import loop
+from ._loop import get_current_loop
 from . import logger
 
 
@@ -147,6 +147,7 @@ class Action:
         """ Invoke the action.
         """
         ob = self._ob1()
+        loop = get_current_loop() if ob is None else ob._flx_loop
         if loop.can_mutate(ob):
             func = self._func_once
             self._func_once = self._func
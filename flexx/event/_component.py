@@ -6,13 +6,13 @@ events and changes in properties.
 
 import sys
 
-from ._dict import Dict
+from ._dict import Event
 from ._attribute import Attribute
 from ._action import ActionDescriptor, Action
 from ._reaction import ReactionDescriptor, Reaction, looks_like_method
 from ._property import Property
 from ._emitter import EmitterDescriptor
-from ._loop import loop, this_is_js
+from ._loop import get_current_loop, this_is_js
 from . import logger
 
 
@@ -45,8 +45,41 @@ class ComponentMeta(type):
     * Set the name of property desciptors.
     * Set __actions__, __reactions__, __emitters__ and __properties__ class attributes.
     * Create private methods (e.g. mutator functions and prop validators).
+    * Store the values of new properties in slots, if the class opts in.
     """
 
+    def __new__(meta, name, bases, dct):
+        # Store the values of new properties in slots, which take less memory
+        # than the instance dict. This is opt-in (via __flx_slots__), since
+        # two classes that add slots cannot be combined. A class with more
+        # than one Component base keeps its values in the instance dict.
+        # Private properties are skipped, since their slot names would be
+        # mangled.
+        use_slots = dct.get('__flx_slots__', None)
+        if use_slots is None:
+            use_slots = any(getattr(b, '__flx_slots__', False) for b in bases)
+        n_bases = len([b for b in bases if isinstance(b, ComponentMeta)])
+        if use_slots and n_bases == 1 and '__slots__' not in dct:
+            slots = []
+            for key, val in dct.items():
+                private_name = '_' + key + '_value'
+                if (isinstance(val, Property) and
+                        not private_name.startswith('__') and
+                        private_name not in dct and
+                        not any(hasattr(b, private_name) for b in bases)):
+                    slots.append(private_name)
+            if slots:
+                dct['__slots__'] = tuple(slots)
+        try:
+            return type.__new__(meta, name, bases, dct)
+        except TypeError as err:
+            if n_bases < 2:
+                raise
+            raise TypeError('Cannot create %s: %s. Two Component classes that '
+                            'store their property values in slots cannot be '
+                            'combined; set ``__flx_slots__ = False`` on one '
+                            'of them.' % (name, err))
+
     def __init__(cls, name, bases, dct):
         cls._finish_properties(dct)
         cls._init_hook1(name, bases, dct)
@@ -74,6 +107,9 @@ class ComponentMeta(type):
         * Create a mutator function for convenience.
         * Create validator function.
         * If needed, create a corresponding set_xx action.
+
+        In Python, the mutator and setter use a function that is compiled
+        for the property, which is faster than the generic ``_mutate()``.
         """
         for name in list(dct.keys()):
             if name.startswith('__'):
@@ -89,11 +125,13 @@ class ComponentMeta(type):
                 # Create validator method
                 cls._set_cls_attr(dct, '_' + name + '_validate', val._validate_py)
                 # Create mutator method
-                cls._set_cls_attr(dct, '_mutate_' + name, val.make_mutator())
+                flx_set = _make_property_setter(name, val)
+                cls._set_cls_attr(dct, '_mutate_' + name, val.make_mutator(flx_set))
                 # Create setter action?
                 action_name = ('_set' if name.startswith('_') else 'set_') + name
                 if val._settable and not hasattr(cls, action_name):
-                    action_des = ActionDescriptor(val.make_set_action(), action_name,
+                    action_des = ActionDescriptor(val.make_set_action(flx_set),
+                                                  action_name,
                                                   'Setter for the %r property.' % name)
                     cls._set_cls_attr(dct, action_name, action_des)
 
@@ -150,6 +188,12 @@ class Component(with_metaclass(ComponentMeta, object)):
     and :func:`emitter <flexx.event.emitter>` decorators to create actions,
     reactions. and emitters, respectively.
 
+    In Python, a class can set ``__flx_slots__ = True`` to store the values
+    of its (public) properties in slots, which saves memory when there are
+    many instances. Its subclasses inherit this, except classes with multiple
+    Component bases. Two classes that use slots cannot be combined via
+    multiple inheritance.
+
     .. code-block:: python
 
         class MyComponent(event.Component):
@@ -176,6 +220,13 @@ class Component(with_metaclass(ComponentMeta, object)):
 
     """
 
+    __slots__ = ('_id', '_disposed', '_flx_loop', '__handlers',
+                 '__pending_events', '__anonymous_reactions',
+                 '__initial_mutation', '__batch_depth', '__batch',
+                 '__batch_props', '__dict__', '__weakref__')
+
+    __flx_slots__ = False
+
     _IS_COMPONENT = True
     _COUNT = 0
 
@@ -186,22 +237,22 @@ class Component(with_metaclass(ComponentMeta, object)):
         Component._COUNT += 1
         self._id = self.__class__.__name__ + str(Component._COUNT)
         self._disposed = False
+        self._flx_loop = get_current_loop()  # the loop that we belong to
 
         # Init some internal variables. Note that __reactions__ is a list of
         # reaction names for this class, and __handlers a dict of reactions
-        # registered to events of this object.
+        # registered to events of this object. Its lists are created when
+        # a reaction registers, and the lists for anonymous reactions and
+        # batches when needed, to keep many small components cheap.
         # The __pending_events makes that reactions that connect to this
         # component right after it initializes get the initial events.
         self.__handlers = {}
         self.__pending_events = []
-        self.__anonymous_reactions = []
+        self.__anonymous_reactions = None
         self.__initial_mutation = False
-
-        # Prepare handlers with event types that we know
-        for name in self.__emitters__:
-            self.__handlers.setdefault(name, [])
-        for name in self.__properties__:
-            self.__handlers.setdefault(name, [])
+        self.__batch_depth = 0
+        self.__batch = None
+        self.__batch_props = None
 
         # With self as the active component (and thus mutatable), init the
         # values of all properties, and apply user-defined initialization
@@ -254,13 +305,21 @@ class Component(with_metaclass(ComponentMeta, object)):
         # of properties that have one (and that is not auto-generated)
         for name, value in values:
             setter_name = ('_set' if name.startswith('_') else 'set_') + name
-            setter = getattr(self, setter_name, None)
-            if setter is not None:
-                if getattr(setter, 'is_autogenerated', None) is False:
-                    # This is an action, and one that the user wrote
-                    setter(value)
+            if self.__has_custom_setter(setter_name):
+                getattr(self, setter_name)(value)
         self.__initial_mutation = False
 
+    def __has_custom_setter(self, setter_name):
+        # Whether the setter is an action that the user wrote. Checked on
+        # the class, to avoid creating Action objects for autogenerated setters.
+        if this_is_js():
+            setter = getattr(self, setter_name, None)
+            return setter is not None and setter.is_autogenerated is False
+        else:
+            setter = getattr(self.__class__, setter_name, None)
+            return (isinstance(setter, ActionDescriptor) and
+                    setter._func.__name__ != 'flx_setter')
+
     def _comp_make_implicit_setter(self, prop_name, func):
         setter_func = getattr(self, 'set_' + prop_name, None)
         if setter_func is None:
@@ -268,6 +327,8 @@ class Component(with_metaclass(ComponentMeta, object)):
             raise TypeError(t % (self._id, prop_name, prop_name))
         setter_reaction = lambda: setter_func(func())
         reaction = Reaction(self, setter_reaction, 'auto', [])
+        if self.__anonymous_reactions is None:
+            self.__anonymous_reactions = []
         self.__anonymous_reactions.append(reaction)
 
     def _comp_init_reactions(self):
@@ -275,20 +336,20 @@ class Component(with_metaclass(ComponentMeta, object)):
         """
         if self.__pending_events is not None:
             self.__pending_events.append(None)  # marker
-            loop.call_soon(self._comp_stop_capturing_events)
+            self._flx_loop.call_soon(self._comp_stop_capturing_events)
 
         # Instantiate reactions by referencing them, Connections are resolved now.
         # Implicit (auto) reactions need to be invoked to initialize connections.
         for name in self.__reactions__:
             reaction = getattr(self, name)
             if reaction.get_mode() == 'auto':
-                ev = Dict(source=self, type='', label='')
-                loop.add_reaction_event(reaction, ev)
+                ev = Event(source=self, type='', label='')
+                self._flx_loop.add_reaction_event(reaction, ev)
         # Also invoke the anonymouse auto-reactions
-        for reaction in self.__anonymous_reactions:
+        for reaction in self.__anonymous_reactions or ():
             if reaction.get_mode() == 'auto':
-                ev = Dict(source=self, type='', label='')
-                loop.add_reaction_event(reaction, ev)
+                ev = Event(source=self, type='', label='')
+                self._flx_loop.add_reaction_event(reaction, ev)
 
     def _comp_stop_capturing_events(self):
         """ Stop capturing events and flush the captured events.
@@ -306,21 +367,21 @@ class Component(with_metaclass(ComponentMeta, object)):
                 allow_reconnect = True
                 continue
             ev.allow_reconnect = allow_reconnect
-            self.emit(ev.type, ev)
+            self._comp_dispatch_event(ev)
 
     def __enter__(self):
-        loop._activate_component(self)
-        loop.call_soon(self.__check_not_active)
+        self._flx_loop._activate_component(self)
+        self._flx_loop.call_soon(self.__check_not_active)
         return self
 
     def __exit__(self, type, value, traceback):
-        loop._deactivate_component(self)
+        self._flx_loop._deactivate_component(self)
 
     def __check_not_active(self):
         # Note: this adds overhead, especially during initialization, but it
         # is a valuable check ... it is something that could potentially be
         # disabled in "production mode".
-        active_components = loop.get_active_components()
+        active_components = self._flx_loop.get_active_components()
         if self in active_components:
             raise RuntimeError('It seems that the event loop is processing '
                                'events while a Component is active. This has a '
@@ -336,7 +397,7 @@ class Component(with_metaclass(ComponentMeta, object)):
 
     def __del__(self):
         if not self._disposed:
-            loop.call_soon(self._dispose)
+            self._flx_loop.call_soon(self._dispose)
 
     def dispose(self):
         """ Use this to dispose of the object to prevent memory leaks.
@@ -384,7 +445,7 @@ class Component(with_metaclass(ComponentMeta, object)):
         if reactions is None:  # i.e. type not in self.__handlers
             reactions = []
             self.__handlers[type] = reactions
-            if force:
+            if force or self.__is_known_event_type(type):
                 pass
             elif type.startswith('mouse_'):
                 t = 'The event "{}" has been renamed to "pointer{}".'
@@ -410,6 +471,9 @@ class Component(with_metaclass(ComponentMeta, object)):
         # Call hook to keep (subclasses of) the component up to date
         self._registered_reactions_hook()
 
+    def __is_known_event_type(self, type):
+        return type in self.__properties__ or type in self.__emitters__
+
     def disconnect(self, type, reaction=None):
         """ Disconnect reactions.
 
@@ -437,7 +501,7 @@ class Component(with_metaclass(ComponentMeta, object)):
         Arguments:
             type (str): the type of the event. Should not include a label.
             info (dict): Optional. Additional information to attach to
-                the event object. Note that the actual event is a Dict object
+                the event object. Note that the actual event is a dict object
                 that allows its elements to be accesses as attributes.
         """
         info = {} if info is None else info
@@ -448,9 +512,20 @@ class Component(with_metaclass(ComponentMeta, object)):
         if not isinstance(info, dict):
             raise TypeError('Info object (for %r) must be a dict, not %r' %
                             (type, info))
-        ev = Dict(info)  # make copy and turn into nicer Dict on py
+        ev = Event(info)  # make copy and turn into nicer Event on py
         ev.type = type
         ev.source = self
+        if self.__batch_depth > 0:
+            self.__batch.append(ev)  # see batch()
+        else:
+            self._comp_dispatch_event(ev)
+        return ev
+
+    def _comp_dispatch_event(self, ev):
+        """ Dispatch an event object, which must have its type and source
+        set, to the reactions. Used by emit(), and directly by _mutate() to
+        avoid copying the event.
+        """
         # Push the event to the reactions (reactions use labels for dynamism)
         if self.__pending_events is not None:
             # Register pending reactions
@@ -458,16 +533,24 @@ class Component(with_metaclass(ComponentMeta, object)):
         else:
             # Reaction reconnections are applied directly; before a new event
             # occurs that the reaction might be subscribed to after the reconnect.
+            # Reactions that belong to another loop (i.e. thread) are
+            # handled via that loop's call_soon(), which is thread-safe.
+            loop = self._flx_loop
             reactions = self.__handlers.get(ev.type, ())
             for i in range(len(reactions)):
                 label, reaction = reactions[i]
                 if label.startswith('reconnect_'):
                     if getattr(ev, 'allow_reconnect', True) is True:
-                        index = int(label.split('_')[1])
-                        reaction.reconnect(index)
+                        if reaction._loop is loop:
+                            reaction._reconnect_for_event(label, ev)
+                        else:
+                            index = int(label.split('_')[1])
+                            reaction._loop.call_soon(reaction.reconnect, index)
+                elif reaction._loop is loop:
+                    self._flx_loop.add_reaction_event(reaction, ev)
                 else:
-                    loop.add_reaction_event(reaction, ev)
-        return ev
+                    reaction._loop.call_soon(reaction._loop.add_reaction_event,
+                                             reaction, ev)
 
     def _mutate(self, prop_name, value, mutation='set', index=-1):
         """ Mutate a :class:`property <flexx.event.Property>`.
@@ -492,6 +575,9 @@ class Component(with_metaclass(ComponentMeta, object)):
         The 'replace' mutation also supports multidensional (numpy) arrays.
         In this case ``value`` can be an ndarray to patch the data with, and
         ``index`` a tuple of elements.
+
+        For 'remove' and 'replace' mutations of a list, the emitted event
+        has a ``removed`` attribute with the items that were removed.
         """
         if not isinstance(prop_name, str):
             raise TypeError("_mutate's first arg must be str, not %s" %
@@ -500,7 +586,7 @@ class Component(with_metaclass(ComponentMeta, object)):
             cname = self.__class__.__name__
             raise AttributeError('%s object has no property %r' % (cname, prop_name))
 
-        if loop.can_mutate(self) is False:
+        if self._flx_loop.can_mutate(self) is False:
             raise AttributeError('Trying to mutate property %s outside '
                                  'of an action or context.' % prop_name)
 
@@ -510,29 +596,26 @@ class Component(with_metaclass(ComponentMeta, object)):
 
         # Set / Emit
         old = getattr(self, private_name)
+        batching = self.__batch_depth > 0 and self.__initial_mutation is False
+        if batching is True:
+            self.__batch_register(prop_name, old, mutation)
 
         if mutation == 'set':
             # Normal setting of a property
             value2 = getattr(self, validator_name)(value)
             setattr(self, private_name, value2)
             # Emit?
-            if this_is_js():  # pragma: no cover
-                is_equal = old == value2
-            elif hasattr(old, 'dtype') and hasattr(value2, 'dtype'):  # pragma: no cover
-                import numpy as np
-                is_equal = np.array_equal(old, value2)
-            else:
-                is_equal = type(old) == type(value2) and old == value2
+            is_equal = self.__values_equal(old, value2)
             if self.__initial_mutation is True:
                 old = value2
                 is_equal = False  # well, they are, but we want an event!
             if not is_equal:
-                self.emit(prop_name,
-                          dict(new_value=value2, old_value=old, mutation=mutation))
+                if batching is False:
+                    self.__dispatch_set_event(prop_name, value2, old)
                 return True
         else:
             # Array mutations - value is assumed to be a sequence, or int for 'remove'
-            ev = Dict()
+            ev = Event()
             ev.objects = value
             ev.mutation = mutation
             ev.index = index
@@ -545,18 +628,109 @@ class Component(with_metaclass(ComponentMeta, object)):
                 if index < 0:
                     raise IndexError('For insert, remove, and replace mutations, '
                                      'the index must be >= 0.')
+                if mutation != 'insert' and isinstance(old, list):
+                    # Keep the removed items, e.g. to disconnect from them
+                    n = value if mutation == 'remove' else len(value)
+                    ev.removed = old[index:index + n]
                 mutate_array(old, ev)
-            self.emit(prop_name, ev)
+            if batching is False:
+                ev.type = prop_name
+                ev.source = self
+                self._comp_dispatch_event(ev)
             return True
 
+    def __values_equal(self, v1, v2):
+        if this_is_js():  # pragma: no cover
+            return v1 == v2
+        elif hasattr(v1, 'dtype') and hasattr(v2, 'dtype'):  # pragma: no cover
+            import numpy as np
+            return np.array_equal(v1, v2)
+        else:
+            return type(v1) == type(v2) and v1 == v2
+
+    def __dispatch_set_event(self, prop_name, value, old):
+        # Fast path: create the event object directly
+        if this_is_js():  # pragma: no cover
+            ev = {'new_value': value, 'old_value': old,
+                  'mutation': 'set', 'type': prop_name, 'source': self}
+        else:
+            ev = Event(new_value=value, old_value=old,
+                       mutation='set', type=prop_name, source=self)
+        self._comp_dispatch_event(ev)
+
+    def batch(self):
+        """ Get a context manager to apply many mutations to this component
+        at once. The properties are mutated as usual, but the events are held
+        back until the context exits. At that point, the mutations of each
+        property are collapsed into a single 'set' event (if the value has
+        changed), and any other emitted events are dispatched in order.
+
+        .. code-block:: python
+
+            @event.action
+            def add_items(self, items):
+                with self.batch():
+                    for item in items:
+                        self._mutate_items([item], 'insert', len(self.items))
+
+        The context can be nested; the events are dispatched when the
+        outermost context exits. Note that the 'set' event of a list or
+        dict property that was mutated in-place has an ``old_value`` that
+        is a (shallow) copy of the value before the batch.
+        """
+        if this_is_js():  # pragma: no cover
+            return {'__enter__': lambda: self._comp_batch_enter(),
+                    '__exit__': lambda type, value, tb: self._comp_batch_exit()}
+        else:
+            return _ComponentBatch(self)
+
+    def _comp_batch_enter(self):
+        if self.__batch_depth == 0:
+            self.__batch = []
+            self.__batch_props = {}
+        self.__batch_depth += 1
+
+    def _comp_batch_exit(self):
+        self.__batch_depth -= 1
+        if self.__batch_depth > 0:
+            return
+        entries = self.__batch
+        props = self.__batch_props
+        self.__batch = None
+        self.__batch_props = None
+        # Entries are property names (at the first mutation) and events
+        for i in range(len(entries)):
+            entry = entries[i]
+            if isinstance(entry, str):
+                old, set_only = props[entry]
+                value = getattr(self, '_' + entry + '_value')
+                if set_only is False or not self.__values_equal(old, value):
+                    self.__dispatch_set_event(entry, value, old)
+            else:
+                self._comp_dispatch_event(entry)
+
+    def __batch_register(self, prop_name, old, mutation):
+        # Keep the value before the first mutation in the batch
+        entry = self.__batch_props.get(prop_name, None)
+        if entry is None:
+            if mutation != 'set':
+                old = old.copy()  # it is about to be mutated in-place
+            self.__batch.append(prop_name)
+            self.__batch_props[prop_name] = [old, mutation == 'set']
+        elif mutation != 'set':
+            entry[1] = False
+
     def get_event_types(self):
         """ Get the known event types for this component. Returns
         a list of event type names, for which there is a
         property/emitter or for which any reactions are registered.
         Sorted alphabetically. Intended mostly for debugging purposes.
         """
-        types = list(self.__handlers)  # avoid using sorted (one less stdlib func)
-        types.sort()
+        types = list(self.__properties__) + list(self.__emitters__)
+        for key in self.__handlers.keys():
+            if key not in types:
+                types.append(key)
+        types.sort()  # avoid using sorted (one less stdlib func)
         return types
 
     def get_event_handlers(self, type):
@@ -616,6 +790,54 @@ class Component(with_metaclass(ComponentMeta, object)):
             return _react
 
 
+def _make_property_setter(name, prop):
+    """ Create a function to set the value of the given property, which
+    is equivalent to ``_mutate(name, value)``, but with the names and the
+    validation and equality functions resolved in advance. Python only.
+    """
+    private_name = '_' + name + '_value'
+    validate = prop._validate
+    values_equal = prop._values_equal
+    generic_mutate = Component._mutate
+
+    def flx_set(self, value):
+        # Use the generic path for initialization, batches, and subclasses
+        # that overload _mutate()
+        if (self._Component__initial_mutation is True or
+                self._Component__batch_depth > 0 or
+                type(self)._mutate is not generic_mutate):
+            return self._mutate(name, value)
+        if self._flx_loop.can_mutate(self) is False:
+            raise AttributeError('Trying to mutate property %s outside '
+                                 'of an action or context.' % name)
+        old = getattr(self, private_name)
+        value2 = validate(value, name, prop._data)
+        setattr(self, private_name, value2)
+        if not values_equal(old, value2):
+            self._comp_dispatch_event(Event(new_value=value2, old_value=old,
+                                            mutation='set', type=name,
+                                            source=self))
+            return True
+
+    return flx_set
+
+
+class _ComponentBatch:
+    """ Context manager returned by Component.batch().
+    """
+
+    __slots__ = ['_component']
+
+    def __init__(self, component):
+        self._component = component
+
+    def __enter__(self):
+        self._component._comp_batch_enter()
+
+    def __exit__(self, type, value, traceback):
+        self._component._comp_batch_exit()
+
+
 def mutate_dict(d, ev):
     """ Function to mutate an dict property in-place.
     Used by Component. The ``ev`` must be a dict with elements:
@@ -55,11 +55,12 @@ class Dict(_dict):
                 identifier_items.append('%s=%r' % (key, val))
             else:
                 nonidentifier_items.append('(%r, %r)' % (key, val))
+        cname = self.__class__.__name__
         if nonidentifier_items:
-            return 'Dict([%s], %s)' % (', '.join(nonidentifier_items),
-                                       ', '.join(identifier_items))
+            return '%s([%s], %s)' % (cname, ', '.join(nonidentifier_items),
+                                     ', '.join(identifier_items))
         else:
-            return 'Dict(%s)' % (', '.join(identifier_items))
+            return '%s(%s)' % (cname, ', '.join(identifier_items))
 
     def __getattribute__(self, key):
         try:
@@ -85,3 +86,39 @@ class Dict(_dict):
     def __dir__(self):
         names = [k for k in self.keys() if isidentifier(k)]
         return Dict.__reserved_names__ + names
+
+
+class Event(dict):
+    """ The object that represents an event. Like ``Dict``, the items
+    can be get/set as attributes, but this class is leaner: it derives
+    from the builtin dict, has no instance ``__dict__``, and only comes
+    into play when an attribute is not found on the dict itself. This
+    matters, because events are created and accessed in large numbers.
+    """
+
+    __slots__ = []
+    __reserved_names__ = frozenset(Dict.__pure_names__)
+
+    __repr__ = Dict.__repr__
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __setattr__(self, key, val):
+        if key in Event.__reserved_names__:
+            raise AttributeError('Reserved name, this key can only ' +
+                                 'be set via ``d[%r] = X``' % key)
+        self[key] = val
+
+    def __delattr__(self, key):
+        try:
+            del self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __dir__(self):
+        names = [k for k in self.keys() if isidentifier(k)]
+        return Dict.__pure_names__ + names
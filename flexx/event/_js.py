@@ -18,8 +18,9 @@ import re
 import sys
 import json
 import inspect
+from types import MemberDescriptorType
 
-from pscript import JSString, RawJS, py2js
+from pscript import JSString, RawJS, py2js, window
 from pscript.parser2 import get_class_definition
 
 from flexx.event import _property
@@ -117,11 +118,23 @@ class LoopJS:  # pragma: no cover
 
     def __init__(self):
         self._active_components = []
+        self._profiling = False
+        self._profile = {}
+        self._profile_trace = None
         self.reset()
 
     def _call_soon_func(self, func):
         setTimeout(func, 0)
 
+    def _call_later_func(self, delay, func):
+        setTimeout(func, delay * 1000)
+
+    def _call_at_frame_func(self, delay, func):
+        if RawJS('typeof window !== "undefined" && window.requestAnimationFrame'):
+            window.requestAnimationFrame(func)
+        else:
+            setTimeout(func, delay * 1000)
+
     def _iter_callback(self):
         self._scheduled_call_to_iter = False
         return self.iter()
@@ -140,12 +153,16 @@ class ComponentJS:  # pragma: no cover
         RawJS('Component.prototype._COUNT += 1')
         self._id = RawJS("this.__name__ + Component.prototype._COUNT")
         self._disposed = False
+        self._flx_loop = loop
 
         # Init some internal variables
         self.__handlers = {}  # reactions connecting to this component
         self.__pending_events = []
-        self.__anonymous_reactions = []
+        self.__anonymous_reactions = None
         self.__initial_mutation = False
+        self.__batch_depth = 0
+        self.__batch = None
+        self.__batch_props = None
 
         # Create actions
         for i in range(len(self.__actions__)):
@@ -154,12 +171,10 @@ class ComponentJS:  # pragma: no cover
         # Create emitters
         for i in range(len(self.__emitters__)):
             name = self.__emitters__[i]
-            self.__handlers[name] = []
             self.__create_emitter(self[name], name)
         # Create properties
         for i in range(len(self.__properties__)):
             name = self.__properties__[i]
-            self.__handlers[name] = []
             self.__create_property(name)
         # Create attributes
         for i in range(len(self.__attributes__)):
@@ -206,6 +221,8 @@ class ComponentJS:  # pragma: no cover
         setter_reaction = lambda: setter_func(func())
         reaction = self.__create_reaction(setter_reaction,
                                           'auto-' + prop_name, 'auto', [])
+        if self.__anonymous_reactions is None:
+            self.__anonymous_reactions = []
         self.__anonymous_reactions.append(reaction)
 
     def _comp_init_reactions(self):
@@ -224,8 +241,9 @@ class ComponentJS:  # pragma: no cover
                 ev = dict(source=self, type='', label='')
                 loop.add_reaction_event(r, ev)
         # Also invoke the anonymouse implicit reactions
-        for i in range(len(self.__anonymous_reactions)):
-            r = self.__anonymous_reactions[i]
+        anonymous_reactions = self.__anonymous_reactions or []
+        for i in range(len(anonymous_reactions)):
+            r = anonymous_reactions[i]
             if r.get_mode() == 'auto':
                 ev = dict(source=self, type='', label='')
                 loop.add_reaction_event(r, ev)
@@ -275,6 +293,8 @@ class ComponentJS:  # pragma: no cover
                 loop.add_action_invokation(action, arguments)
             return self
         action.is_autogenerated = action_func.name == 'flx_setter'  # also _action.py
+        action._name = name  # used by the profiler
+        action._ob1 = lambda : self  # no weakref in JS
         def getter():
             return action
         def setter(x):
@@ -345,7 +365,10 @@ class ComponentJS:  # pragma: no cover
         reaction._id = RawJS("'r' + Component.prototype._REACTION_COUNT")
         reaction._name = name
         reaction._mode = mode
+        reaction._interval = reaction_func._interval or 0
+        reaction._last_call_time = 0
         reaction._ob1 = lambda : that  # no weakref in JS
+        reaction._loop = loop
         reaction._init(connection_strings, self)
 
         return reaction
@@ -408,6 +431,7 @@ def _create_js_class(PyClass, JSClass):
         jscode = jscode.replace('if (_pyfunc_truthy(this._thread_match(false)))', '')
     # Almost done
     jscode = jscode.replace('new Dict()', '{}').replace('new Dict(', '_pyfunc_dict(')
+    jscode = jscode.replace('new Event()', '{}').replace('new Event(', '_pyfunc_dict(')
     mc.meta['std_functions'].add('dict')
     return mc.attach_meta(jscode)
 
@@ -477,6 +501,9 @@ def create_js_component_class(cls, cls_name, base_class='Component.prototype'):
             # Add mode and connection strings
             funcs_code.append(prototype_prefix + funcname +
                               '._mode = ' + reprs(val._mode))
+            if val._interval:
+                funcs_code.append(prototype_prefix + funcname +
+                                  '._interval = ' + reprs(val._interval))
             if val._connection_strings:
                 funcs_code.append(prototype_prefix + funcname +
                                   '._connection_strings = ' +
@@ -499,8 +526,10 @@ def create_js_component_class(cls, cls_name, base_class='Component.prototype'):
             default_val = json.dumps(val._default)
             t = '%s_%s_value = %s;'
             const_code.append(t % (prototype_prefix, name, default_val))
-        elif isinstance(val, classmethod):
+        elif isinstance(val, (classmethod, staticmethod)):
             pass  # ignore, like magics
+        elif isinstance(val, MemberDescriptorType):
+            pass  # slots for property values, see ComponentMeta
         elif (name.startswith('__') and name not in OK_MAGICS and
                 not name.endswith('_validate')):
             # These are only magics, since class attributes with double-underscores
@@ -8,6 +8,7 @@ Implementation of Flexx' event loop based on asyncio.
 
 import asyncio
 import threading
+from time import perf_counter
 
 from . import logger
 
@@ -15,6 +16,25 @@ def this_is_js():
     return False
 
 
+class _CurrentLoop(threading.local):
+    loop = None  # set to the default loop below
+
+
+_current = _CurrentLoop()
+
+
+class _LoopLocal(threading.local):
+    _deps_tracking = False  # whether an auto reaction runs in this thread
+
+
+def get_current_loop():
+    """ Get the Flexx event loop for the current thread; the loop that
+    was last integrated in this thread, or the default loop
+    (``flexx.event.loop``).
+    """
+    return _current.loop
+
+
 class Loop:
     """ The singleton Flexx event loop at ``flexx.event.loop``. This holds
     the queue of pending calls, actions, and reactions. These are queued
@@ -27,7 +47,10 @@ class Loop:
 
     This event system integrates with Python's builtin asyncio system,
     configurable via ``Loop.integrate()``. This system can run in a separate
-    thread, but there can be only one active flexx event loop per process.
+    thread. Additional loops can be created to run in other threads (e.g.
+    one per session, see ``flexx.config.session_threads``). Each component
+    belongs to the loop of the thread in which it was created. Events for
+    reactions in another loop are passed to that loop in a thread-safe way.
 
     This object can also be used as a context manager; an event loop
     iteration takes place when the context exits.
@@ -42,7 +65,10 @@ class Loop:
         # context manager. We have one list for each thread. Note that we should
         # limit its use to context managers, and execution should never be
         # handed back to the event loop while inside a context.
-        self._local = threading.local()
+        self._local = _LoopLocal()
+        self._profiling = False
+        self._profile = {}
+        self._profile_trace = None
         self.reset()
         self.integrate()
 
@@ -55,14 +81,31 @@ class Loop:
 
         self._processing_action = None
         self._processing_reaction = None
-        self._prop_access = {}
+        self._local._deps_tracking = False
+        self._deps_old = []
+        self._deps_index = 0
+        self._deps_new = None
+        self._deps_seen = None
         self._pending_calls = []
         self._pending_actions = []
         self._pending_reactions = []
         self._pending_reaction_ids = {}
+        self._delayed_reactions = {}
+        self._reset_tail()
+
+    def _reset_tail(self):
+        # The trailing segment of the pending reactions queue, from index
+        # _tail_start, has items with the same representing event (i.e.
+        # source and type). From index _tail_wild, items have no such event.
+        self._tail_start = 0
+        self._tail_wild = 0
+        self._tail_source = None
+        self._tail_type = None
 
     def has_pending(self):
         """ Get whether there are any pending actions, reactions, or calls.
+        Throttled and debounced reactions that wait for their time to come
+        do not count.
         """
         return (len(self._pending_reactions) > 0 or
                 len(self._pending_actions) > 0 or
@@ -81,15 +124,18 @@ class Loop:
         # When there is an active component, only that one can be mutated
         # (so that behavior of an init() is the same regardless whether a
         # component is instantiated from an action), it must the current one.
-        # Otherwise we must be in an action.
+        # Otherwise we must be in an action. Mutations from another thread
+        # are never direct.
         # active = self.get_active_component()
         # if active is not None:
         #     return active is component
-        active_components = self._local._active_components
-        if active_components:
-            return component in active_components
-        else:
-            return self._processing_action is not None
+        if self._thread_match(False):
+            active_components = self._local._active_components
+            if active_components:
+                return component in active_components
+            else:
+                return self._processing_action is not None
+        return False
 
     ## Active components
 
@@ -171,7 +217,8 @@ class Loop:
         # In principal, the mechanics of adding items to the queue is not complex,
         # but this code is performance critical, so we apply several tricks
         # to make this code run fast.
-        # _pending_reactions is a list of tuples (reaction, representing event, events)
+        # _pending_reactions is a list of tuples
+        # (reaction, representing event, events, index in the list)
 
         pending_reactions = self._pending_reactions
 
@@ -185,24 +232,35 @@ class Loop:
                 # Normally, we try to consolidate the events by
                 # appending the event to the existing item in the queue, but
                 # we don't want to break the order, i.e. we can only skip over
-                # events that are the same as the current. Each queue item has
-                # a reference event to make this skipping more efficient.
-                i = len(pending_reactions)
-                while i > 0:
-                    i -= 1
-                    ev2 = pending_reactions[i][1]  # representing event
-                    if pending_reactions[i][0] is reaction:
+                # items whose events are the same as the current. Each queue
+                # item has a reference event to make this check efficient, and
+                # instead of walking the queue, we keep track of the trailing
+                # segment of items that have the same reference event. Items
+                # without reference event match any event.
+                item = self._pending_reaction_ids.get(reaction._id, None)
+                if item is not None:
+                    i = item[3] + 1  # index of the item after it
+                    if (i >= self._tail_wild or
+                            (i >= self._tail_start and
+                             self._tail_source is ev['source'] and
+                             self._tail_type == ev['type'])):
                         # We can simply append the event
-                        pending_reactions[i][2].append(ev)
-                        if not (ev2['source'] is ev['source'] and
-                                ev2['type'] == ev['type']):
+                        item[2].append(ev)
+                        ev2 = item[1]  # representing event
+                        if ev2 is not None and not (ev2['source'] is ev['source'] and
+                                                    ev2['type'] == ev['type']):
                             # Mark that the events are heterogeneous
-                            pending_reactions[i][1] = {'source': None}
+                            item[1] = {'source': None}
+                            if i > self._tail_start:
+                                self._tail_start = i
+                                if i >= self._tail_wild:
+                                    self._tail_source = None
                         return
-                    # Only continue if all events of the next item match the current
-                    if not (ev2 is None or
-                            (ev2['source'] is ev['source'] and ev2.type == ev.type)):
-                        break
+
+            elif mode != 'greedy' and mode != 'auto':
+                # Throttled and debounced reactions are queued later
+                self._add_delayed_reaction_event(reaction, ev)
+                return
 
             else:
                 # For greedy and auto reactions, we consolidate by not adding
@@ -216,15 +274,75 @@ class Loop:
                     return
 
             # Add new item to queue
+            i = len(pending_reactions)
             if len(reaction._connections) > 0:
-                new_item = [reaction, ev, [ev]]
+                new_item = [reaction, ev, [ev], i]
+                # Update the trailing segment of items with the same event
+                if not (self._tail_source is None or
+                        (self._tail_source is ev['source'] and
+                         self._tail_type == ev['type'])):
+                    self._tail_start = self._tail_wild
+                self._tail_source = ev['source']
+                self._tail_type = ev['type']
+                self._tail_wild = i + 1
             else:
-                new_item = [reaction, None, []]
+                new_item = [reaction, None, [], i]
             pending_reactions.append(new_item)
             self._pending_reaction_ids[reaction._id] = new_item
 
             self._schedule_iter()
 
+    def _add_delayed_reaction_event(self, reaction, ev):
+        """ Collect the event for a reaction with mode 'throttle', 'debounce'
+        or 'animation-frame'. The reaction is queued (with all its collected
+        events) when its time has come. Must be called with the lock.
+        """
+        item = self._delayed_reactions.get(reaction._id, None)
+        if item is None:
+            now = perf_counter()
+            if reaction.get_mode() == 'debounce':
+                due = now + reaction._interval
+            else:
+                due = max(now, reaction._last_call_time + reaction._interval)
+            item = [reaction, [], due]
+            self._delayed_reactions[reaction._id] = item
+            self._schedule_delayed(reaction, due - now)
+        elif reaction.get_mode() == 'debounce':
+            item[2] = perf_counter() + reaction._interval  # postpone
+        item[1].append(ev)
+
+    def _schedule_delayed(self, reaction, delay):
+        reaction_id = reaction._id
+        callback = lambda: self._delayed_callback(reaction_id)
+        if reaction.get_mode() == 'animation-frame':
+            self._call_at_frame_func(delay, callback)
+        else:
+            self._call_later_func(delay, callback)
+
+    def _call_at_frame_func(self, delay, func):
+        # There are no animation frames in Python, see LoopJS
+        self._call_later_func(delay, func)
+
+    def _delayed_callback(self, reaction_id):
+        with self._lock:
+            item = self._delayed_reactions.get(reaction_id, None)
+            if item is None:
+                return  # the loop was reset
+            reaction, events, due = item[0], item[1], item[2]
+            now = perf_counter()
+            if due - now > 0.001:
+                self._schedule_delayed(reaction, due - now)  # was postponed
+                return
+            self._delayed_reactions.pop(reaction_id)
+            reaction._last_call_time = now
+            # Queue with all its events. Cannot consolidate with the items
+            # after it, since it represents heterogeneous events.
+            i = len(self._pending_reactions)
+            self._pending_reactions.append([reaction, {'source': None}, events, i])
+            self._tail_start = self._tail_wild = i + 1
+            self._tail_source = None
+            self._schedule_iter()
+
     def register_prop_access(self, component, prop_name):
         """ Register access of a property, to keep track of automatic reactions.
         """
@@ -236,20 +354,63 @@ class Loop:
         # During the invokation of a reaction, the register_prop_access()
         # method is used to track property access by the reaction. That way,
         # connections can be updated as needed.
-
-        # Note that we use a dict here, but for the event reconnecting to
-        # be efficient, the order of connections is imporant, so auto
-        # reactions have really poor performance on Python < 3.6
-        # Make sure not to count access from other threads
-        if self._processing_reaction is not None:
-            if self._processing_reaction.get_mode() == 'auto':
-                if self._thread_match(False):
-                    if component._id not in self._prop_access:
-                        d = {}
-                        self._prop_access[component._id] = component, d
-                    else:
-                        d = self._prop_access[component._id][1]
-                    d[prop_name] = True
+        #
+        # Usually, a reaction accesses the same properties in the same order
+        # each time. Therefore we walk along the connections of the previous
+        # run, which is cheap. Only when the accesses deviate, we collect the
+        # connections in a new list (and a dict to avoid duplicates). The flag
+        # is thread-local, so that access from other threads is not counted.
+        if self._local._deps_tracking is True:
+            if self._deps_new is None:
+                old = self._deps_old
+                i = self._deps_index
+                if i < len(old):
+                    if old[i][0] is component and old[i][1] == prop_name:
+                        self._deps_index = i + 1
+                        return
+                if i > 0:
+                    if old[i - 1][0] is component and old[i - 1][1] == prop_name:
+                        return  # repeated access
+                self._deps_diverge()
+            key = component._id + '.' + prop_name
+            if self._deps_seen.get(key, False) is False:
+                self._deps_seen[key] = True
+                self._deps_new.append((component, prop_name))
+
+    def _deps_diverge(self):
+        # The accessed properties are not the same as in the previous run
+        self._deps_new = self._deps_old[:self._deps_index]
+        self._deps_seen = {}
+        for i in range(len(self._deps_new)):
+            component, prop_name = self._deps_new[i]
+            self._deps_seen[component._id + '.' + prop_name] = True
+
+    def _deps_start(self, reaction):
+        self._deps_old = reaction._implicit_connections[:]  # can be mutated
+        self._deps_index = 0
+        self._deps_new = None
+        self._deps_seen = None
+        self._local._deps_tracking = True
+
+    def _deps_stop(self, reaction):
+        self._local._deps_tracking = False
+        old_conns, new_conns = self._deps_old, self._deps_new
+        self._deps_old = []
+        self._deps_new = self._deps_seen = None
+        if new_conns is None:
+            if self._deps_index == len(old_conns):
+                return  # unchanged: the common case
+            new_conns = old_conns[:self._deps_index]
+        elif len(new_conns) == len(old_conns):
+            changed = False
+            for i in range(len(new_conns)):
+                c1, c2 = new_conns[i], old_conns[i]
+                if c1[0] is not c2[0] or c1[1] != c2[1]:
+                    changed = True
+                    break
+            if changed is False:
+                return  # unchanged, but a property was accessed repeatedly
+        reaction._update_implicit_connections(new_conns)
 
     ## Queue processing
 
@@ -323,15 +484,21 @@ class Loop:
                 self._pending_actions = self._pending_actions[n:]
 
         # Process
+        profiling = self._profiling
         for i in range(len(pending_actions)):
             action, args = pending_actions[i]
             self._processing_action = action
+            if profiling is True:
+                t0 = perf_counter()
             try:
                 action(*args)
             except Exception as err:
                 logger.exception(err)
             finally:
                 self._processing_action = None
+            if profiling is True:
+                self._profile_record('action', action, t0, 0,
+                                     len(pending_actions))
 
     def _process_reactions(self):
         """ Process all pending reactions.
@@ -342,34 +509,126 @@ class Loop:
             pending_reactions = self._pending_reactions
             self._pending_reactions = []
             self._pending_reaction_ids = {}
+            self._reset_tail()
 
         # Process
+        profiling = self._profiling
         for ir in range(len(pending_reactions)):
-            reaction, _, events = pending_reactions[ir]
-            # Call reaction
-            if len(events) > 0 or reaction.get_mode() == 'auto':
-                self._prop_access = {}
+            reaction, _, events, _ = pending_reactions[ir]
+            if profiling is True:
+                t0 = perf_counter()
+            auto = reaction.get_mode() == 'auto'
+            # Call reaction, tracking property access for auto reactions
+            if len(events) > 0 or auto is True:
                 self._processing_reaction = reaction
+                if auto is True:
+                    self._deps_start(reaction)
                 try:
                     reaction(*events)
                 except Exception as err:
                     logger.exception(err)
                 finally:
                     self._processing_reaction = None
-            # Reconnect auto reaction. The _update_implicit_connections()
-            # method is pretty efficient if connections has not changed.
-            try:
-                if reaction.get_mode() == 'auto':
-                    connections = []
-                    for component_names in self._prop_access.values():
-                        component = component_names[0]
-                        for name in component_names[1].keys():
-                            connections.append((component, name))
-                    reaction._update_implicit_connections(connections)
-            except Exception as err:  # pragma: no cover
-                logger.exception(err)
-            finally:
-                self._prop_access = {}
+                # Reconnect auto reaction, if its connections have changed
+                if auto is True:
+                    try:
+                        self._deps_stop(reaction)
+                    except Exception as err:  # pragma: no cover
+                        logger.exception(err)
+            if profiling is True and (len(events) > 0 or auto is True):
+                self._profile_record('reaction', reaction, t0, len(events),
+                                     len(pending_reactions))
+
+    ## Profiling
+
+    def start_profiling(self, trace=False):
+        """ Start profiling the event loop, discarding previous records.
+        For each action and reaction (by class and name), the number of
+        calls, the time spent, the number of events per call, and the
+        queue depth are recorded. If ``trace`` is True, each call is
+        also recorded individually (up to 100000 calls), see
+        ``get_profile_trace()``. Profiling adds a bit of overhead,
+        and is therefore off by default.
+        """
+        self._profile = {}
+        self._profile_trace = [] if trace else None
+        self._profile_t0 = perf_counter()
+        self._profiling = True
+
+    def stop_profiling(self):
+        """ Stop profiling the event loop. The records are kept until
+        ``start_profiling()`` is called again.
+        """
+        self._profiling = False
+
+    def _profile_record(self, kind, ob, t0, n_events, queue_depth):
+        t1 = perf_counter()
+        component = ob._ob1()
+        if component is None:
+            class_name = '?'
+        elif this_is_js():
+            class_name = component.__name__
+        else:
+            class_name = component.__class__.__name__
+        name = class_name + '.' + ob._name
+        key = kind + ' ' + name
+        record = self._profile.get(key, None)
+        if record is None:
+            record = {'kind': kind, 'name': name, 'count': 0,
+                      'time': 0.0, 'max_time': 0.0, 'events': 0,
+                      'max_events': 0, 'max_queue': 0}
+            self._profile[key] = record
+        record['count'] += 1
+        record['time'] += t1 - t0
+        record['max_time'] = max(record['max_time'], t1 - t0)
+        record['events'] += n_events
+        record['max_events'] = max(record['max_events'], n_events)
+        record['max_queue'] = max(record['max_queue'], queue_depth)
+        trace = self._profile_trace
+        if trace is not None and len(trace) < 100000:
+            trace.append({'name': name, 'cat': kind, 'ph': 'X',
+                          'ts': (t0 - self._profile_t0) * 1000000,
+                          'dur': (t1 - t0) * 1000000, 'pid': 0, 'tid': 0,
+                          'args': {'events': n_events, 'queue': queue_depth}})
+
+    def get_profile(self):
+        """ Get the profiling records as a list of dicts, sorted by
+        the total time spent (most expensive first). Each dict has the
+        fields "kind" ("action" or "reaction"), "name" (the class name and
+        the name of the action or reaction), "count" (the number of calls),
+        "time" and "max_time" (in seconds), "events" and "max_events"
+        (the total and maximum number of events per call), and "max_queue"
+        (the maximum number of pending actions or reactions in the
+        iteration in which it was called).
+        """
+        records = list(self._profile.values())
+        records.sort(key=lambda r: -r['time'])
+        return records
+
+    def get_profile_table(self, n=20):
+        """ Get a string with a table of the ``n`` most expensive
+        actions and reactions, as recorded by the profiler.
+        """
+        lines = ['%-8s %-40s %7s %10s %10s %7s %7s %7s' %
+                 ('kind', 'name', 'count', 'total ms', 'max ms',
+                  'events', 'max ev', 'queue')]
+        records = self.get_profile()
+        for i in range(min(n, len(records))):
+            r = records[i]
+            lines.append('%-8s %-40s %7i %10.3f %10.3f %7.1f %7i %7i' %
+                         (r['kind'], r['name'], r['count'], r['time'] * 1000,
+                          r['max_time'] * 1000, r['events'] / r['count'],
+                          r['max_events'], r['max_queue']))
+        return '\n'.join(lines)
+
+    def get_profile_trace(self):
+        """ Get the individual calls recorded by the profiler (when
+        started with ``trace=True``) as a dict in the Chrome trace event
+        format. Write it to a file using ``json.dump()`` to inspect it
+        with e.g. ``chrome://tracing`` or https://ui.perfetto.dev.
+        """
+        trace = self._profile_trace or []
+        return {'traceEvents': list(trace), 'displayTimeUnit': 'ms'}
 
     ## Integration
 
@@ -390,7 +649,9 @@ class Loop:
         with self._lock:
             self._thread_id = threading.get_ident()
             self._local._active_components = []
+            _current.loop = self
             self._call_soon_func = loop.call_soon_threadsafe
+            self._call_later_func = loop.call_later
             self._call_soon_func(self._iter_callback)
             if reset:
                 self.reset()
@@ -478,3 +739,4 @@ class Loop:
 
 
 loop = Loop()
+_CurrentLoop.loop = loop
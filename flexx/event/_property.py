@@ -2,13 +2,30 @@
 Implements the property class and subclasses.
 """
 
-from ._loop import loop, this_is_js
+from ._loop import _current, this_is_js
 from ._action import BaseDescriptor
 from ._dict import Dict
 
 undefined = None
 
 
+def _values_equal(v1, v2):
+    # Generic equality check, also for numpy arrays
+    if hasattr(v1, 'dtype') and hasattr(v2, 'dtype'):  # pragma: no cover
+        import numpy as np
+        return np.array_equal(v1, v2)
+    return type(v1) is type(v2) and v1 == v2
+
+
+def _values_equal_simple(v1, v2):
+    # For values of known type, e.g. validated scalars and tuples
+    return type(v1) is type(v2) and v1 == v2
+
+
+def _values_identical(v1, v2):
+    return v1 is v2
+
+
 class Property(BaseDescriptor):
     """ Base property class. Properties are (readonly) attributes associated
     with :class:`Component <flexx.event.Component>` classes, which can be
@@ -56,6 +73,7 @@ class Property(BaseDescriptor):
 
     _default = None
     _data = None  # Configurable data
+    _values_equal = staticmethod(_values_equal)  # see end of module
 
     def __init__(self, *args, doc='', settable=False):
         self._consume_args(*args)
@@ -93,19 +111,30 @@ class Property(BaseDescriptor):
         if instance is None:
             return self
         private_name = '_' + self._name + '_value'
-        loop.register_prop_access(instance, self._name)
+        _current.loop.register_prop_access(instance, self._name)
         return getattr(instance, private_name)
 
-    def make_mutator(self):
+    def make_mutator(self, flx_set=None):
+        # In Python, the given (compiled) flx_set function can be used
+        # to set the value.
         flx_name = self._name
         def flx_mutator(self, *args):
+            if this_is_js():
+                return self._mutate(flx_name, *args)
+            elif flx_set is not None and len(args) == 1:
+                return flx_set(self, args[0])
             return self._mutate(flx_name, *args)
         return flx_mutator
 
-    def make_set_action(self):
+    def make_set_action(self, flx_set=None):
         flx_name = self._name
         def flx_setter(self, *val):
-            self._mutate(flx_name, val[0] if len(val) == 1 else val)
+            if this_is_js():
+                self._mutate(flx_name, val[0] if len(val) == 1 else val)
+            elif flx_set is not None:
+                flx_set(self, val[0] if len(val) == 1 else val)
+            else:
+                self._mutate(flx_name, val[0] if len(val) == 1 else val)
         return flx_setter
 
     def _validate_py(self, value):
@@ -471,6 +500,15 @@ class ColorProp(Property):
 # class Array
 
 
+# Type-specific equality checks, used when setting properties in Python.
+# These are set here, so that they are not included in the JS classes.
+for cls in (BoolProp, TriStateProp, IntProp, FloatProp, StringProp,
+            TupleProp, ListProp, DictProp, FloatPairProp, EnumProp, ColorProp):
+    cls._values_equal = staticmethod(_values_equal_simple)
+ComponentProp._values_equal = staticmethod(_values_identical)
+del cls
+
+
 __all__ = []
 for name, cls in list(globals().items()):
     if isinstance(cls, type) and issubclass(cls, Property):
@@ -28,7 +28,7 @@ def looks_like_method(func):
         return False
 
 
-def reaction(*connection_strings, mode='normal'):
+def reaction(*connection_strings, mode='normal', interval=None):
     """ Decorator to turn a method of a Component into a
     :class:`Reaction <flexx.event.Reaction>`.
 
@@ -49,6 +49,16 @@ def reaction(*connection_strings, mode='normal'):
     A reaction can operate in a few different modes. By not specifying any
     connection strings, the mode is "auto": the reaction will automatically
     trigger when any of the properties used in the function changes.
+    The modes "throttle" and "debounce" need an ``interval`` (in seconds),
+    which limits how often the reaction is called, e.g. to avoid redundant
+    redraws when a property changes at a high rate:
+
+    .. code-block:: py
+
+        @event.reaction('data', mode='throttle', interval=0.1)
+        def update_plot(self, *events):
+            ...
+
     See :func:`get_mode() <flexx.event.Reaction.get_mode>` for details.
     
     Connection string follow the following syntax rules:
@@ -81,8 +91,20 @@ def reaction(*connection_strings, mode='normal'):
     if not isinstance(mode, str):
         raise TypeError('Reaction mode must be a string.')
     mode = mode.lower()
-    if mode not in ('normal', 'greedy', 'auto'):
-        raise TypeError('Reaction mode must "normal", "greedy" or "auto".')
+    if mode not in ('normal', 'greedy', 'auto',
+                    'throttle', 'debounce', 'animation-frame'):
+        raise TypeError('Reaction mode must "normal", "greedy", "auto", '
+                        '"throttle", "debounce" or "animation-frame".')
+
+    # Validate interval
+    if mode in ('throttle', 'debounce'):
+        if not (isinstance(interval, (int, float)) and interval > 0):
+            raise TypeError('Reaction mode %r needs a positive interval.' % mode)
+    elif mode == 'animation-frame':
+        interval = interval or 1 / 60  # used where there are no animation frames
+    elif interval is not None:
+        raise TypeError('Reaction interval only applies to modes "throttle", '
+                        '"debounce" and "animation-frame".')
 
     # Extract function if we can
     func = None
@@ -100,7 +122,8 @@ def reaction(*connection_strings, mode='normal'):
         if not looks_like_method(func):
             raise TypeError('reaction() decorator requires a method '
                             '(first arg must be self).')
-        return ReactionDescriptor(func, mode, connection_strings)
+        return ReactionDescriptor(func, mode, connection_strings,
+                                  interval=interval)
 
     if func is not None:
         return _connect(func)
@@ -112,10 +135,11 @@ class ReactionDescriptor(BaseDescriptor):
     """ Class descriptor for reactions.
     """
 
-    def __init__(self, func, mode, connection_strings, ob=None):
+    def __init__(self, func, mode, connection_strings, ob=None, interval=None):
         self._name = func.__name__
         self._func = func
         self._mode = mode
+        self._interval = interval or 0
         if len(connection_strings) == 0:
             self._mode = 'auto'
         self._connection_strings = connection_strings
@@ -133,7 +157,9 @@ class ReactionDescriptor(BaseDescriptor):
             reaction = Reaction(instance if self._ob is None else self._ob(),
                                 (self._func, instance),
                                 self._mode,
-                                self._connection_strings)
+                                self._connection_strings,
+                                self._interval)
+            reaction.__doc__ = self.__doc__  # share, rather than a copy per instance
             setattr(instance, private_name, reaction)
 
         # Make the reaction use *our* func one time. In most situations
@@ -159,7 +185,7 @@ class Reaction:
 
     _count = 0
 
-    def __init__(self, ob, func, mode, connection_strings):
+    def __init__(self, ob, func, mode, connection_strings, interval=0):
         Reaction._count += 1
         self._id = 'r%i' % Reaction._count  # to ensure a consistent event order
 
@@ -169,6 +195,7 @@ class Reaction:
         # - ob2 is the object to be passed to func (if it is a method). Is often
         #   the same as ob1, but not per see. Can be None.
         self._ob1 = weakref.ref(ob)
+        self._loop = ob._flx_loop  # the loop that processes this reaction
 
         # Get unbounded version of bound methods.
         self._ob2 = None  # if None, its regarded a regular function
@@ -182,10 +209,12 @@ class Reaction:
 
         # Store func, name, and docstring (e.g. for sphinx docs)
         assert callable(func)
-        assert mode in ('normal', 'greedy', 'auto')
+        assert mode in ('normal', 'greedy', 'auto',
+                        'throttle', 'debounce', 'animation-frame')
         self._func = func
         self._func_once = func
         self._mode = mode
+        self._interval = interval
         self._name = func.__name__
         self.__doc__ = BaseDescriptor._format_doc('reaction', self._name, func.__doc__)
 
@@ -197,6 +226,9 @@ class Reaction:
 
         ichars = '0123456789_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+        # For throttled reactions: when it was last queued by the loop
+        self._last_call_time = 0
+
         # Init explicit connections: (connection-object, type) tuples
         self._connections = []
         # Init implicit connections: (component, type) tuples
@@ -274,6 +306,15 @@ class Reaction:
           automatically triggered when any of these properties changes. Like
           'greedy' there is at most one call per event loop iteration.
           Reactions with zero connection strings always have mode 'auto'.
+        * 'throttle': like 'greedy', but the reaction is called at most once
+          per interval (in seconds). Events that arrive in the meantime are
+          collected and handled in the next call.
+        * 'debounce': like 'greedy', but the reaction is called when no new
+          events have arrived for the duration of the interval.
+        * 'animation-frame': like 'throttle', but in JavaScript the reaction
+          is called at the next animation frame (using
+          ``requestAnimationFrame()``). Useful for drawing. In Python the
+          interval (default 1/60 s) is used instead.
 
         The 'normal' mode generally offers the most consistent behaviour.
         The 'greedy' mode allows the event system to make some optimizations.
@@ -391,6 +432,131 @@ class Reaction:
         # Reconnect in a smart way
         self._connect_and_disconnect(old_objects, new_objects, connection.force)
 
+    def _reconnect_for_event(self, label, ev):
+        """ Update a connection because a property on its path has changed.
+        The label is "reconnect_<index>_<depth>", with depth the length of
+        the path after that property. If possible, only the connections for
+        the items that were added or removed are updated, rather than
+        walking the whole path.
+        """
+        parts = label.split('_')
+        index = int(parts[1])
+        # Events held back during initialization may not match the connected
+        # state, so we only update incrementally for "live" events.
+        if len(parts) == 3 and getattr(ev, 'allow_reconnect', None) is None:
+            if self._reconnect_items(index, int(parts[2]), ev) is True:
+                return
+        self.reconnect(index)
+
+    def _reconnect_items(self, index, depth, ev):
+        """ Update the index'th connection for the items that were added
+        and removed by the given event. Returns False if this is not
+        possible, e.g. if the connections do not match the event.
+        """
+        connection = self._connections[index]
+
+        # Get the path that the items of the changed property were seeked with
+        part = connection.parts[len(connection.parts) - depth - 1]
+        obname = part.rstrip('*')
+        selector = part[len(obname):]
+        path = connection.parts[len(connection.parts) - depth:]
+        if len(selector) > 1:
+            path = [obname + '***'] + path
+
+        # Get old and new items
+        mutation = getattr(ev, 'mutation', None)
+        if mutation == 'set':
+            old_items, new_items = ev.old_value, ev.new_value
+            is_list1 = isinstance(old_items, (tuple, list))
+            is_list2 = isinstance(new_items, (tuple, list))
+            if len(selector) == 0 or is_list1 is False or is_list2 is False:
+                if selector == '*':
+                    return False  # let reconnect() raise the error
+                old_items, new_items = [old_items], [new_items]
+                path = connection.parts[len(connection.parts) - depth:]
+        elif mutation == 'insert' and len(selector) > 0:
+            old_items, new_items = [], ev.objects
+        elif mutation == 'remove' or mutation == 'replace':
+            old_items = getattr(ev, 'removed', None)
+            if len(selector) == 0 or old_items is None:
+                return False
+            new_items = ev.objects if mutation == 'replace' else []
+        else:
+            return False
+
+        # Skip common items from the start and the end
+        i1 = 0
+        while (i1 < len(old_items) and i1 < len(new_items) and
+               old_items[i1] is new_items[i1]):
+            i1 += 1
+        i2, i3 = len(new_items), len(old_items)
+        while i2 > i1 and i3 > i1 and new_items[i2 - 1] is old_items[i3 - 1]:
+            i2 -= 1
+            i3 -= 1
+        if i2 == i1 and i3 == i1:
+            return True  # no items added or removed
+
+        # Seek the objects for the removed and added items
+        objects = connection.objects
+        try:
+            connection.objects = []
+            for i in range(i1, i3):
+                self._seek_event_object(index, path, old_items[i])
+            old_objects = connection.objects
+            connection.objects = []
+            for i in range(i1, i2):
+                self._seek_event_object(index, path, new_items[i])
+            new_objects = connection.objects
+        finally:
+            connection.objects = objects
+
+        # Prepare lookups
+        ids = {}
+        removing = {}
+        for i in range(len(old_objects)):
+            ob, type = old_objects[i]
+            key = ob._id + '-' + type
+            removing[key] = removing.get(key, 0) + 1
+            ids[ob._id] = True
+        adding = {}
+        for i in range(len(new_objects)):
+            ob, type = new_objects[i]
+            adding[ob._id + '-' + type] = True
+            ids[ob._id] = True
+
+        # Remove the old objects. These must be present, and the new objects
+        # must not, otherwise (e.g. when an object can be reached via
+        # multiple paths) we do a full reconnect.
+        staying = {}
+        kept = []
+        for i in range(len(objects)):
+            entry = objects[i]
+            if ids.get(entry[0]._id, False) is True:
+                key = entry[0]._id + '-' + entry[1]
+                if removing.get(key, 0) > 0:
+                    removing[key] -= 1
+                    continue
+                elif adding.get(key, False) is True:
+                    return False
+                staying[key] = True
+            kept.append(entry)
+        for key in removing.keys():
+            if removing[key] > 0:
+                return False
+        connection.objects = kept + new_objects
+
+        # Disconnect the old, unless still needed, and connect the new
+        for i in range(len(old_objects)):
+            ob, type = old_objects[i]
+            key = ob._id + '-' + type
+            if staying.get(key, False) is False and adding.get(key, False) is False:
+                ob.disconnect(type, self)
+                staying[key] = True
+        for i in range(len(new_objects)):
+            ob, type = new_objects[i]
+            ob._register_reaction(type, self, connection.force)
+        return True
+
     def _connect_and_disconnect(self, old_objects, new_objects, force=False):
         """ Update connections by disconnecting old and connecting new,
         but try to keep connections that do not change.
@@ -454,7 +620,7 @@ class Reaction:
             self._seek_event_object(index, path, ob)
         # Select object
         if hasattr(ob, '_IS_COMPONENT') and obname in ob.__properties__:
-            name_label = obname + ':reconnect_' + str(index)
+            name_label = obname + ':reconnect_' + str(index) + '_' + str(len(path))
             connection.objects.append((ob, name_label))
             new_ob = getattr(ob, obname, None)
         else:
@@ -0,0 +1,192 @@
+"""
+Micro-benchmarks for the event loop. Not run as
+part of the test suite; run this module directly.
+"""
+
+import time
+
+from flexx import event
+
+loop = event.loop
+
+
+class Hub(event.Component):
+
+    @event.emitter
+    def foo(self, v):
+        return dict(value=v)
+
+
+class Listener(event.Component):
+
+    count = 0
+
+    hub = event.ComponentProp(settable=True)
+
+    @event.reaction('!hub.foo')
+    def _on_foo(self, *events):
+        self.count += len(events)
+
+
+class Prop(event.Component):
+
+    count = 0
+
+    foo = event.IntProp(settable=True)
+
+    @event.reaction('foo')
+    def _on_foo(self, *events):
+        self.count += len(events)
+
+
+class Many(event.Component):
+
+    foo = event.IntProp(settable=True)
+    bar = event.IntProp(settable=True)
+
+
+class Auto(event.Component):
+
+    count = 0
+
+    items = event.ListProp(settable=True)
+
+    @event.reaction
+    def _sum(self):
+        self.count += 1
+        return sum(item.foo + item.bar for item in self.items)
+
+
+class Node(event.Component):
+
+    children = event.TupleProp(settable=True)
+    text = event.StringProp(settable=True)
+
+
+class Emitter(event.Component):
+
+    count = 0
+
+    @event.emitter
+    def foo(self, v):
+        return dict(value=v)
+
+    @event.reaction('!foo')
+    def _on_foo(self, *events):
+        self.count += len(events)
+
+
+def bench_shared_source(n_components=1000, n_events=100000):
+    """ Many reactions connected to the same source. The events for each
+    reaction can be consolidated, but only by skipping over the items of
+    the other reactions.
+    """
+    hub = Hub()
+    listeners = [Listener(hub=hub) for i in range(n_components)]
+    loop.iter()
+
+    t0 = time.perf_counter()
+    for i in range(n_events // n_components):
+        hub.foo(i)
+    t1 = time.perf_counter()
+    loop.iter()
+    t2 = time.perf_counter()
+
+    assert sum(listener.count for listener in listeners) == n_events
+    print('shared source: %i events over %i components: queue %0.3f s, '
+          'process %0.3f s' % (n_events, n_components, t1 - t0, t2 - t1))
+
+
+def bench_interleaved_sources(n_components=1000, n_events=100000):
+    """ Each component emits to its own reaction, interleaved. Events
+    cannot be consolidated, since that would break the order.
+    """
+    emitters = [Emitter() for i in range(n_components)]
+    loop.iter()
+
+    t0 = time.perf_counter()
+    for i in range(n_events // n_components):
+        for e in emitters:
+            e.foo(i)
+    t1 = time.perf_counter()
+    loop.iter()
+    t2 = time.perf_counter()
+
+    assert sum(e.count for e in emitters) == n_events
+    print('interleaved sources: %i events over %i components: queue %0.3f s, '
+          'process %0.3f s' % (n_events, n_components, t1 - t0, t2 - t1))
+
+
+def bench_property_events(n_components=1000, n_events=100000):
+    """ Setting properties, i.e. applying actions, creating property events,
+    and passing these to a reaction.
+    """
+    props = [Prop() for i in range(n_components)]
+    loop.iter()
+    for p in props:
+        p.count = 0  # discard the initial events
+
+    t0 = time.perf_counter()
+    for i in range(n_events // n_components):
+        for p in props:
+            p.set_foo(i + 1)
+    loop.iter()
+    t1 = time.perf_counter()
+
+    assert sum(p.count for p in props) == n_events
+    print('property events: %i events over %i components: %0.3f s' %
+          (n_events, n_components, t1 - t0))
+
+
+def bench_auto_reaction(n_props=500, n_runs=1000):
+    """ An auto reaction that reads many properties, of which one changes.
+    """
+    items = [Many() for i in range(n_props // 2)]
+    auto = Auto(items=items)
+    loop.iter()
+    auto.count = 0
+
+    t0 = time.perf_counter()
+    for i in range(n_runs):
+        items[0].set_foo(i + 1)
+        loop.iter()
+    t1 = time.perf_counter()
+
+    assert auto.count == n_runs
+    print('auto reaction: %i runs reading %i properties: %0.3f s' %
+          (n_runs, n_props, t1 - t0))
+
+
+def bench_deep_connection(n_nodes=2000, n_inserts=200):
+    """ A reaction connected to a property of all nodes in a tree, via a
+    deep connection string, while nodes are being inserted into the tree.
+    """
+    nodes = [Node() for i in range(n_nodes + 1)]
+    root = nodes[0]
+    for i in range(n_nodes // 10 + 1):
+        nodes[i].set_children(tuple(nodes[i * 10 + 1:i * 10 + 11]))
+    loop.iter()
+    count = []
+    root.reaction(lambda *events: count.append(len(events)), '!children**.text')
+    loop.iter()
+
+    t0 = time.perf_counter()
+    for i in range(n_inserts):
+        parent = nodes[i]
+        parent.set_children(parent.children + (Node(), ))
+        loop.iter()
+    t1 = time.perf_counter()
+
+    nodes[-1].set_text('x')
+    loop.iter()
+    assert sum(count) == 1
+    print('deep connection: %i inserts in a tree of %i nodes: %0.3f s' %
+          (n_inserts, n_nodes, t1 - t0))
+
+
+if __name__ == '__main__':
+    bench_shared_source()
+    bench_interleaved_sources()
+    bench_property_events()
+    bench_auto_reaction()
+    bench_deep_connection()
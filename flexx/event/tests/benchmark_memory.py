@@ -0,0 +1,69 @@
+"""
+Measure the memory used per Component instance, for components with
+a few properties, with a reaction, and with many properties. Not run as
+part of the test suite; run this module directly.
+"""
+
+import gc
+import tracemalloc
+
+from flexx import event
+
+loop = event.loop
+
+
+class Item(event.Component):
+
+    __flx_slots__ = True
+
+    text = event.StringProp(settable=True)
+    checked = event.BoolProp(settable=True)
+    index = event.IntProp(settable=True)
+
+    @event.emitter
+    def clicked(self, v):
+        return dict(value=v)
+
+
+class ItemWithReaction(Item):
+
+    @event.reaction('text')
+    def _on_text(self, *events):
+        pass
+
+
+Wide = event.Component.__class__(
+    'Wide', (event.Component, ),
+    dict([('p%i' % i, event.IntProp(settable=True)) for i in range(40)],
+         __flx_slots__=True))
+
+
+def bytes_per_component(cls, n=10000):
+    """ Get the number of bytes that an instance of the given class
+    takes, including its reactions, after initialization.
+    """
+    cls()
+    loop.iter()
+    gc.collect()
+    tracemalloc.start()
+    snapshot1 = tracemalloc.take_snapshot()
+    components = [cls() for i in range(n)]
+    loop.iter()
+    gc.collect()
+    snapshot2 = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = snapshot2.compare_to(snapshot1, 'filename')
+    nbytes = sum(s.size_diff for s in stats) - len(components) * 8
+    del components
+    loop.iter()
+    return nbytes / n
+
+
+def bench_memory():
+    for cls in (Item, ItemWithReaction, Wide):
+        print('%s: %i bytes per component' % (cls.__name__,
+                                               bytes_per_component(cls)))
+
+
+if __name__ == '__main__':
+    bench_memory()
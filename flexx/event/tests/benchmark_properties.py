@@ -0,0 +1,92 @@
+"""
+Micro-benchmarks for setting properties. Compares the compiled per-property
+setters (used by the mutator functions and setter actions) with the
+generic ``Component._mutate()``. Not run as part of the test suite; run
+this module directly.
+"""
+
+import time
+
+from flexx import event
+
+loop = event.loop
+
+
+class Props(event.Component):
+
+    i = event.IntProp(settable=True)
+    f = event.FloatProp(settable=True)
+    s = event.StringProp(settable=True)
+    t = event.TupleProp(settable=True)
+    c = event.ComponentProp(settable=True)
+    a = event.AnyProp(settable=True)
+
+
+class GenericProps(Props):
+    """ Overloading _mutate() makes the setters use the generic path.
+    """
+
+    def _mutate(self, *args):
+        return super()._mutate(*args)
+
+
+def get_values(name, n):
+    if name == 'i':
+        return list(range(n))
+    elif name == 'f':
+        return [float(i) for i in range(n)]
+    elif name == 's':
+        return ['x%i' % i for i in range(n)]
+    elif name == 't':
+        return [(i, i) for i in range(n)]
+    elif name == 'c':
+        components = [Props(), Props()]
+        return [components[i % 2] for i in range(n)]
+    else:
+        return [i if i % 2 else str(i) for i in range(n)]
+
+
+def bench_mutate(n=100000):
+    """ Mutating properties from within a context, compiled vs generic.
+    Half of the values are equal to the previous value (no event).
+    """
+    p = Props()
+    loop.iter()
+    for name in ('i', 'f', 's', 't', 'c', 'a'):
+        values = get_values(name, n // 2)
+        values = [v for v in values for j in range(2)]  # repeat each value
+        mutator = getattr(p, '_mutate_' + name)
+        with p:
+            t0 = time.perf_counter()
+            for v in values:
+                mutator(v)
+            t1 = time.perf_counter()
+            for v in values:
+                p._mutate(name, v)
+            t2 = time.perf_counter()
+        loop.reset()
+        print('mutate %s: %i times: compiled %0.3f s, generic %0.3f s' %
+              (name, n, t1 - t0, t2 - t1))
+
+
+def bench_set_action(n=100000):
+    """ Invoking setter actions (queued, and applied by the loop),
+    compiled vs generic.
+    """
+    times = []
+    for cls in (Props, GenericProps):
+        p = cls()
+        loop.iter()
+        t0 = time.perf_counter()
+        for i in range(n):
+            p.set_i(i)
+        loop.iter()
+        times.append(time.perf_counter() - t0)
+        assert p.i == n - 1
+    print('set action: %i times: compiled %0.3f s, generic %0.3f s' %
+          (n, times[0], times[1]))
+
+
+if __name__ == '__main__':
+    bench_mutate()
+    bench_set_action()
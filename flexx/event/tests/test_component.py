@@ -640,6 +640,68 @@ def test_mutate_array2():
     print(list(a.flat))
 
 
+class CompWithBatch(event.Component):
+
+    items = event.ListProp(settable=True)
+    name = event.StringProp(settable=True)
+
+    @event.action
+    def add_items(self, *items):
+        with self.batch():
+            for item in items:
+                self._mutate_items([item], 'insert', len(self.items))
+            self.emit('added', dict(count=len(items)))
+            with self.batch():  # nested
+                self._mutate_name('x')
+                self._mutate_name('')
+
+    @event.action
+    def rename(self, name1, name2):
+        with self.batch():
+            self._mutate_name(name1)
+            self._mutate_name(name2)
+
+    @event.reaction('items', 'name', '!added')
+    def on_change(self, *events):
+        for ev in events:
+            if ev.type == 'added':
+                print(ev.type, ev.count)
+            elif ev.mutation == 'set':
+                print(ev.type, ev.mutation, len(ev.old_value), len(ev.new_value))
+            else:
+                print(ev.type, ev.mutation)
+
+
+@run_in_both(CompWithBatch)
+def test_component_batch():
+    """
+    items set 0 0
+    name set 0 0
+    -
+    items set 0 3
+    added 3
+    -
+    name set 0 1
+    [1, 2, 3]
+    -
+    items insert
+    """
+    c = CompWithBatch()
+    loop.iter()
+    print('-')
+    c.add_items(1, 2, 3)
+    loop.iter()
+    print('-')
+    c.rename('a', 'b')
+    c.rename('b', 'b')  # no net change
+    loop.iter()
+    print(c.items)
+    print('-')
+    with c:  # outside a batch, events are emitted as usual
+        c._mutate_items([4], 'insert', 3)
+    loop.iter()
+
+
 def test_produced_js():
     js1 = create_js_component_class(Bar, 'Bar')
     js2 = create_js_component_class(Bar2, 'Bar2')
@@ -655,4 +717,62 @@ def test_produced_js():
     assert js2.count('a_action') == 1
 
 
+def test_component_slots():  # Py only
+
+    class SlotsA(event.Component):
+        __flx_slots__ = True
+        foo = event.IntProp(1, settable=True)
+        _bar = event.IntProp(2, settable=True)  # private: not in a slot
+
+    class SlotsB(event.Component):
+        spam = event.IntProp(3, settable=True)
+
+    class SlotsC(SlotsA):
+        foo = event.IntProp(4, settable=True)  # uses the slot of SlotsA
+        eggs = event.IntProp(5, settable=True)
+
+    class SlotsD(SlotsA, SlotsB):
+        ham = event.IntProp(6, settable=True)
+
+    # Slots are opt-in, and not used with multiple Component bases
+    assert SlotsA.__slots__ == ('_foo_value', )
+    assert '__slots__' not in SlotsB.__dict__
+    assert SlotsC.__slots__ == ('_eggs_value', )
+    assert '__slots__' not in SlotsD.__dict__
+
+    c, d = SlotsC(), SlotsD()
+    assert (c.foo, c._bar, c.eggs) == (4, 2, 5)
+    assert (d.foo, d._bar, d.spam, d.ham) == (1, 2, 3, 6)
+    assert '_foo_value' not in c.__dict__
+    assert '__bar_value' in c.__dict__
+    assert '_ham_value' in d.__dict__
+    d.set_spam(7)
+    loop.iter()
+    assert d.spam == 7
+
+    # Also when the other class is a subclass with slots
+    class SlotsE(SlotsB):
+        __flx_slots__ = True
+        eggs = event.IntProp(8, settable=True)
+
+    class SlotsF(SlotsB, SlotsA):
+        pass
+
+    class SlotsG(SlotsE, SlotsB):
+        pass
+
+    assert SlotsE.__slots__ == ('_eggs_value', )
+    assert SlotsF().foo == 1 and SlotsG().eggs == 8
+
+    # Two classes with slots cannot be combined
+    with raises(TypeError) as err:
+        class SlotsH(SlotsA, SlotsE):
+            pass
+    assert '__flx_slots__ = False' in str(err.value)
+
+    # Actions and handler lists are created when needed
+    assert '_set_foo_action' not in c.__dict__
+    assert c._Component__handlers == {}
+    assert c.get_event_types() == ['_bar', 'eggs', 'foo']
+
 run_tests_if_main()
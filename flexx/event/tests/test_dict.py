@@ -2,7 +2,7 @@
 from flexx.util.testing import run_tests_if_main, skipif, skip, raises
 
 from flexx import event
-from flexx.event._dict import isidentifier
+from flexx.event._dict import isidentifier, Event
 
 
 def test_isidentifier():
@@ -86,4 +86,44 @@ def test_dir_and_repr():
     assert 42 not in names
 
 
+def test_event():
+
+    ev = Event(foo=3)
+    assert isinstance(ev, dict)
+    assert ev.foo == 3 and ev['foo'] == 3
+    ev.bar = 4
+    assert ev == {'foo': 3, 'bar': 4}
+    assert repr(ev) == 'Event(foo=3, bar=4)'
+    assert 'bar' in dir(ev)
+    assert getattr(ev, 'spam', 5) == 5
+    del ev.bar
+    assert 'bar' not in ev
+
+    with raises(AttributeError):
+        ev.spam
+    with raises(AttributeError):
+        del ev.spam
+    with raises(AttributeError):
+        ev.copy = 3
+    with raises(AttributeError):
+        ev.__dict__  # slotted
+
+    # Events are created for properties and emitters
+
+    class MyComponent(event.Component):
+        foo = event.IntProp(settable=True)
+
+    events = []
+    c = MyComponent()
+    c.reaction(lambda *evs: events.extend(evs), 'foo', '!bar')
+    event.loop.iter()
+    c.set_foo(3)
+    c.emit('bar', dict(spam=1))
+    event.loop.iter()
+    assert [type(ev) for ev in events] == [Event, Event, Event]
+    assert events[1].spam == 1 and events[1].source is c  # emitted directly
+    assert events[2] == dict(new_value=3, old_value=0, mutation='set',
+                             type='foo', source=c)
+
+
 run_tests_if_main()
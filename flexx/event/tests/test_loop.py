@@ -2,6 +2,8 @@
 Test the main use of the event loop.
 """
 
+import random
+
 from flexx.util.testing import run_tests_if_main, skipif, skip, raises
 from flexx.event.both_tester import run_in_both
 
@@ -24,6 +26,16 @@ class Foo(event.Component):
         print(len(events))
 
 
+class Foo2(event.Component):
+
+    name = event.StringProp(settable=True)
+    hub = event.ComponentProp(settable=True)
+
+    @event.reaction('!foo', '!hub.foo')
+    def on_foo(self, *events):
+        print(self.name, len(events))
+
+
 ## Tests for both
 
 @run_in_both()
@@ -162,6 +174,137 @@ def test_loop_reset():
     loop.iter()
 
 
+@run_in_both(Foo2)
+def test_loop_consolidation():
+    """
+    hub 3
+    a 3
+    b 3
+    a 2
+    hub 1
+    b 1
+    """
+    hub = Foo2(name='hub')
+    a = Foo2(name='a', hub=hub)
+    b = Foo2(name='b', hub=hub)
+    loop.iter()
+
+    # Events for each reaction are combined
+    hub.emit('foo', {})
+    hub.emit('foo', {})
+    hub.emit('foo', {})
+    # But not if that would break the order of events from different sources
+    a.emit('foo', {})
+    hub.emit('foo', {})
+    loop.iter()
+
+
+@run_in_both(Foo2)
+def test_loop_profiling():
+    """
+    hub 3
+    a 3
+    hub 1
+    a 1
+    ['action Foo2.set_name', 'reaction Foo2.on_foo']
+    [2, 2]
+    [0, 6]
+    [0, 3]
+    [2, 2]
+    true
+    true
+    4 X
+    0
+    """
+    # Emit on each component, because the order in which the reactions
+    # of a shared source are called depends on their ids
+    hub = Foo2(name='hub')
+    a = Foo2(name='a')
+    loop.iter()
+
+    loop.start_profiling(True)
+    for c in (hub, a):
+        c.emit('foo', {})
+        c.emit('foo', {})
+        c.emit('foo', {})
+    hub.set_name('hub')
+    a.set_name('a')
+    loop.iter()
+    loop.stop_profiling()
+    hub.emit('foo', {})  # not recorded
+    a.emit('foo', {})
+    loop.iter()
+
+    records = loop.get_profile()
+    records.sort(key=lambda r: r['kind'])
+    print([r['kind'] + ' ' + r['name'] for r in records])
+    print([r['count'] for r in records])
+    print([r['events'] for r in records])
+    print([r['max_events'] for r in records])
+    print([r['max_queue'] for r in records])
+    print(records[1]['time'] >= records[1]['max_time'] >= 0)
+    print('reaction Foo2.on_foo' in loop.get_profile_table())
+    trace = loop.get_profile_trace()['traceEvents']
+    print(len(trace), trace[0]['ph'])
+
+    loop.start_profiling()
+    print(len(loop.get_profile_trace()['traceEvents']))
+
+
+class FakeReaction:
+
+    def __init__(self, id, connected=True):
+        self._id = id
+        self._connections = [None] if connected else []
+
+    def get_mode(self):
+        return 'normal'
+
+
+def old_add_reaction_event(pending_reactions, reaction, ev):
+    """ The algorithm that Loop.add_reaction_event() used before the tail
+    of the queue was tracked, which walks back over the queue.
+    """
+    i = len(pending_reactions)
+    while i > 0:
+        i -= 1
+        ev2 = pending_reactions[i][1]  # representing event
+        if pending_reactions[i][0] is reaction:
+            pending_reactions[i][2].append(ev)
+            if not (ev2['source'] is ev['source'] and ev2.type == ev.type):
+                pending_reactions[i][1] = {'source': None}
+            return
+        if not (ev2 is None or
+                (ev2['source'] is ev['source'] and ev2.type == ev.type)):
+            break
+    if len(reaction._connections) > 0:
+        pending_reactions.append([reaction, ev, [ev]])
+    else:
+        pending_reactions.append([reaction, None, []])
+
+
+def test_loop_consolidation_random():
+    # The queue must be the same as with the old algorithm
+    rng = random.Random(42)
+    sources = [object() for i in range(3)]
+    for iter in range(200):
+        reactions = [FakeReaction('r%i' % i, i > 0) for i in range(6)]
+        new_loop = event.Loop()
+        old_pending = []
+        for i in range(rng.randint(1, 60)):
+            reaction = rng.choice(reactions)
+            if not reaction._connections:
+                if reaction._id in new_loop._pending_reaction_ids:
+                    continue  # would not get events if not connected
+            ev = event.Dict(source=rng.choice(sources),
+                            type=rng.choice(['foo', 'bar']))
+            new_loop.add_reaction_event(reaction, ev)
+            old_add_reaction_event(old_pending, reaction, ev)
+        new_queue = [(r, evs) for r, _, evs, _ in new_loop._pending_reactions]
+        old_queue = [(r, evs) for r, _, evs in old_pending]
+        assert new_queue == old_queue
+
+
 @run_in_both(Foo)
 def test_loop_cannot_call_iter():
     """
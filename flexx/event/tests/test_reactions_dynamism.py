@@ -480,6 +480,88 @@ def test_deep2():
     print(res)
 
 
+class DeepNode(event.Component):
+
+    val = event.IntProp(settable=True)
+    items = event.ListProp(settable=True)
+
+    @event.action
+    def add_item(self, item):
+        self._mutate_items([item], 'insert', len(self.items))
+
+    @event.action
+    def remove_item(self, index):
+        self._mutate_items(1, 'remove', index)
+
+
+@run_in_both(DeepNode)
+def test_deep3():
+    """
+    True
+    True
+    True
+    True
+    [1, 2, 5, 6]
+    """
+    # deep connectors are updated incrementally, check against a full connect
+
+    root = DeepNode()
+    a, b, c = DeepNode(), DeepNode(), DeepNode()
+    loop.iter()
+
+    res = []
+    def func(*events):
+        for ev in events:
+            if ev.type == 'val':
+                res.append(ev.new_value)
+    def noop(*events):
+        pass
+    handler = root.reaction(func, 'items**.val')
+
+    def check():
+        h = root.reaction(noop, 'items**.val')
+        n = len(h._connections[0].objects)
+        h.dispose()
+        return len(handler._connections[0].objects) == n
+
+    with loop:
+        root.set_items([a, b])
+    with loop:
+        a.add_item(c)  # insert mutation
+    with loop:
+        c.set_val(1)
+        b.set_val(2)
+    print(check())
+
+    # Remove a subtree
+    with loop:
+        root.set_items([b])
+    with loop:
+        c.set_val(3)
+        a.set_val(4)
+        b.set_val(5)
+    print(check())
+
+    # An object that can be reached via multiple paths
+    with loop:
+        b.add_item(c)
+    with loop:
+        root.set_items([b, c])
+    with loop:
+        root.set_items([b])
+    with loop:
+        c.set_val(6)
+    print(check())
+
+    # Remove mutation
+    with loop:
+        b.remove_item(0)
+    with loop:
+        c.set_val(7)
+    print(check())
+    print(res)
+
+
 
 class TestOb(event.Component):
 
@@ -714,6 +796,10 @@ def test_dynamism_and_handler_reconnecting():
 
         bars = event.ListProp(settable=True)
 
+        @event.action
+        def mutate_bars(self, *args):
+            self._mutate_bars(*args)
+
         def disconnect(self, *args):  # Detect disconnections
             super().disconnect(*args)
             disconnects.append(self)
@@ -776,11 +862,12 @@ def test_dynamism_and_handler_reconnecting():
         f.set_bars(f.bars[:-1] + [Bar(), Bar()])
     assert len(disconnects) == 1
 
-    # Append to bars property, drop one at the wrong end: Flexx can't optimize
+    # Append to bars property, drop one at the other end: only the
+    # changed items are reconnected
     disconnects = []
     with event.loop:
         f.set_bars(f.bars[1:] + [Bar(), Bar()])
-    assert len(disconnects) == len(f.bars) - 1
+    assert len(disconnects) == 1
 
     # Prepend to bars property
     disconnects = []
@@ -794,11 +881,47 @@ def test_dynamism_and_handler_reconnecting():
         f.set_bars([Bar(), Bar()] + f.bars[1:])
     assert len(disconnects) == 1
 
-    # Prepend to bars property, drop one at the wrong end: Flexx can't optimize
+    # Prepend to bars property, drop one at the other end
     disconnects = []
     with event.loop:
         f.set_bars([Bar(), Bar()] + f.bars[:-1])
-    assert len(disconnects) == len(f.bars) - 1
+    assert len(disconnects) == 1
+
+    # Reorder: nothing to disconnect
+    disconnects = []
+    with event.loop:
+        f.set_bars(list(reversed(f.bars)))
+    assert len(disconnects) == 0
+    triggers = []
+    with event.loop:
+        for bar in f.bars:
+            bar.set_spam(bar.spam + 1)
+    assert sum(triggers) == len(f.bars)
+
+    # Remove and replace mutations: only the removed items are disconnected,
+    # without a full reconnect
+    reconnects = []
+    reconnect = handle_foo.reconnect
+    def reconnect_and_record(index):
+        reconnects.append(index)
+        reconnect(index)
+    handle_foo.reconnect = reconnect_and_record
+    n = len(f.bars)
+    removed = f.bars[1:3]
+    disconnects = []
+    with event.loop:
+        f.mutate_bars(2, 'remove', 1)
+    assert disconnects == removed
+    disconnects = []
+    with event.loop:
+        f.mutate_bars([f.bars[0], Bar()], 'replace', 0)
+    assert len(disconnects) == 1
+    assert reconnects == []
+    triggers = []
+    with event.loop:
+        for bar in f.bars + removed:
+            bar.set_spam(bar.spam + 1)
+    assert sum(triggers) == len(f.bars) == n - 2
 
 
 run_tests_if_main()
@@ -10,6 +10,7 @@ Test the more fancy stuff like:
 
 import gc
 import sys
+import asyncio
 import weakref
 
 from flexx.util.testing import run_tests_if_main, skipif, skip, raises
@@ -17,6 +18,7 @@ from flexx.event.both_tester import run_in_both, this_is_js
 from flexx.util.logging import capture_log
 
 from flexx import event
+from flexx.event import _loop
 
 loop = event.loop
 logger = event.logger
@@ -82,6 +84,149 @@ def test_reaction_greedy():
     loop.iter()
 
 
+## Throttled and debounced reactions
+
+class MyObjectThrottle(event.Component):
+
+    foo = event.IntProp(settable=True)
+
+    @event.reaction('foo', mode='throttle', interval=0.2)
+    def report1(self, *events):
+        print('throttle ' + ' '.join([str(ev.new_value) for ev in events]))
+
+    @event.reaction('foo', mode='debounce', interval=0.2)
+    def report2(self, *events):
+        print('debounce ' + ' '.join([str(ev.new_value) for ev in events]))
+
+    @event.reaction('foo', mode='animation-frame')
+    def report3(self, *events):
+        print('frame ' + ' '.join([str(ev.new_value) for ev in events]))
+
+
+@run_in_both(MyObjectThrottle)
+def test_reaction_throttle_and_debounce():
+    """
+    throttle debounce animation-frame
+    0
+    throttle 0 1 2 3
+    frame 0 1 2 3
+    debounce 0 1 2 3
+    """
+
+    def scenario():
+        m = MyObjectThrottle()
+        print(m.report1.get_mode(), m.report2.get_mode(), m.report3.get_mode())
+        print(m.report1._last_call_time)  # a number, also in JS
+        loop.iter()
+        m.set_foo(1)
+        m.set_foo(2)
+        m.set_foo(3)
+        loop.iter()
+        # Nothing is called until the timers go off
+        assert not loop.has_pending()
+
+    if this_is_js():
+        # The loop is reset when this function returns, run after that
+        setTimeout(scenario, 0)
+    else:
+        aio_loop = asyncio.new_event_loop()
+        loop.integrate(aio_loop, reset=False)
+        scenario()
+        aio_loop.run_until_complete(asyncio.sleep(0.5))
+        loop.integrate(asyncio.get_event_loop(), reset=False)
+
+
+class FakeClock:
+    """ Replaces the clock and timers of the loop, so that the timing of
+    throttled and debounced reactions can be tested deterministically.
+    """
+
+    def __init__(self):
+        self.time = 100.0  # like perf_counter(), not near zero
+        self.timers = []
+
+    def perf_counter(self):
+        return self.time
+
+    def call_later(self, delay, func):
+        self.timers.append((self.time + delay, len(self.timers), func))
+
+    def sleep(self, duration):
+        end = self.time + duration
+        while True:
+            due = [timer for timer in self.timers if timer[0] <= end]
+            if not due:
+                break
+            timer = min(due)
+            self.timers.remove(timer)
+            self.time = max(self.time, timer[0])
+            timer[2]()
+            loop.iter()
+        self.time = end
+
+
+def test_reaction_throttle_and_debounce_timing():
+
+    clock = FakeClock()
+    calls = []
+
+    class Foo(event.Component):
+        foo = event.IntProp(settable=True)
+
+        @event.reaction('foo', mode='throttle', interval=0.1)
+        def throttled(self, *events):
+            calls.append(('t', clock.time - 100, len(events)))
+
+        @event.reaction('foo', mode='debounce', interval=0.1)
+        def debounced(self, *events):
+            calls.append(('d', clock.time - 100, len(events)))
+
+    ori_perf_counter = _loop.perf_counter
+    ori_call_later = loop._call_later_func
+    _loop.perf_counter = clock.perf_counter
+    loop._call_later_func = clock.call_later
+    try:
+        m = Foo()
+        loop.iter()
+        for i in range(1, 21):
+            m.set_foo(i)
+            loop.iter()
+            clock.sleep(0.02)
+        clock.sleep(0.3)
+    finally:
+        _loop.perf_counter = ori_perf_counter
+        loop._call_later_func = ori_call_later
+
+    # Throttled: all events, but at most one call per interval
+    tcalls = [c for c in calls if c[0] == 't']
+    assert sum(c[2] for c in tcalls) == 21  # initial event plus 20 changes
+    assert [round(c[1], 6) for c in tcalls] == [0.0, 0.1, 0.2, 0.3, 0.4]
+    assert [c[2] for c in tcalls] == [2, 5, 5, 5, 4]
+
+    # Debounced: one call with all events, after the changes stopped
+    dcalls = [c for c in calls if c[0] == 'd']
+    assert len(dcalls) == 1 and dcalls[0][2] == 21
+    assert round(dcalls[0][1], 6) == 0.48  # last change at 0.38
+
+
+def test_reaction_mode_interval_fails():
+
+    def foo(self, *events):
+        pass
+
+    with raises(TypeError):
+        event.reaction('!foo', mode='throttle')(foo)  # needs interval
+    with raises(TypeError):
+        event.reaction('!foo', mode='debounce', interval=0)(foo)
+    with raises(TypeError):
+        event.reaction('!foo', mode='normal', interval=0.1)(foo)
+    with raises(TypeError):
+        event.reaction('!foo', mode='foo')(foo)
+
+    assert event.reaction('!foo', mode='throttle', interval=0.1)(foo)._interval == 0.1
+    assert event.reaction('!foo', mode='animation-frame')(foo)._interval > 0
+
+
 ## Automatic reactions
 
 
@@ -179,6 +324,57 @@ def test_reaction_auto2():
     print('end')
 
 
+class MyObject5(event.Component):
+
+    foo = event.IntProp(settable=True)
+    bar = event.IntProp(7, settable=True)
+    spam = event.IntProp(settable=True)
+
+    @event.reaction
+    def report(self):
+        x = self.foo + self.bar + self.foo  # repeated access
+        if self.bar > 10:
+            x += self.spam
+        print(x)
+
+
+@run_in_both(MyObject5)
+def test_reaction_auto3():
+    """
+    7
+    foo,bar
+    19
+    foo,bar,spam
+    20
+    21
+    3
+    foo,bar
+    end
+    """
+
+    m = MyObject5()
+    loop.iter()
+    print(','.join([c[1] for c in m.report._implicit_connections]))
+
+    # Connect to spam when it is accessed
+    m.set_bar(19)
+    loop.iter()
+    print(','.join([c[1] for c in m.report._implicit_connections]))
+    m.set_spam(1)
+    loop.iter()
+
+    # Disconnect when it is no longer accessed
+    m.set_bar(21)
+    m.set_spam(0)
+    loop.iter()
+    m.set_bar(3)
+    loop.iter()
+    print(','.join([c[1] for c in m.report._implicit_connections]))
+    m.set_spam(2)
+    loop.iter()
+    print('end')
+
+
 ## One liner
 
 class MyObject4(event.Component):
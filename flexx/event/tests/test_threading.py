@@ -1,6 +1,5 @@
 from flexx.util.testing import run_tests_if_main, raises
 
-import time
 import asyncio
 import threading
 
@@ -90,6 +89,9 @@ def test_in_thread4():
             for ev in events:
                 res.append(ev.new_value)
 
+    loops = []
+    ready = threading.Event()
+
     def main():
         # Create fresh ioloop and make flexx use it
         # event.loop.reset()
@@ -97,8 +99,10 @@ def test_in_thread4():
         event.loop.integrate(loop, reset=False)  # no reset!
         # set foo
         component.set_foo(3)
-        # Run mainloop for one iterartion
-        loop.call_later(0.4, loop.stop)
+        loops.append(loop)
+        ready.set()
+        # Run mainloop until the main thread stops it
+        loop.call_later(10, loop.stop)  # just in case
         loop.run_forever()
 
     # Create component and manipulate prop
@@ -107,12 +111,83 @@ def test_in_thread4():
 
     t = threading.Thread(target=main)
     t.start()
-    time.sleep(0.2)
+    assert ready.wait(10)
     component.set_foo(4)  # invoke from main thread
+    loops[0].call_soon_threadsafe(loops[0].stop)  # after the pending iter
     t.join()
     event.loop.integrate(reset=True)  # restore
 
     assert res == [0, 3, 4]
 
 
+def test_loop_per_thread():
+    """ Test components that belong to the loop of another thread.
+    """
+    res = []
+
+    class MyComp1(event.Component):
+        foo = event.IntProp(0, settable=True)
+
+        @event.reaction('foo')
+        def on_foo(self, *events):
+            for ev in events:
+                res.append(ev.new_value)
+            if self.foo == 3:
+                handled.set()
+
+    class MyComp2(event.Component):
+        other = event.ComponentProp(settable=True)
+
+        @event.reaction('!other.foo')
+        def on_other_foo(self, *events):
+            for ev in events:
+                res.append('main %i' % ev.new_value)
+
+    components = []
+    loops = []
+    ready = threading.Event()
+    handled = threading.Event()
+
+    def main():
+        # Create a fresh asyncio loop and a new flexx loop for this thread
+        asyncio_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(asyncio_loop)
+        loop = event.Loop()
+        components.append(MyComp1())
+        assert components[0]._flx_loop is loop
+        loops.append(asyncio_loop)
+        ready.set()
+        # Run until the main thread stops it
+        asyncio_loop.call_later(10, asyncio_loop.stop)  # just in case
+        asyncio_loop.run_forever()
+
+    event.loop.reset()
+    t = threading.Thread(target=main)
+    t.start()
+    assert ready.wait(10)
+    c1 = components[0]
+    assert c1._flx_loop is not event.loop
+
+    # Mutations from a foreign thread are never direct
+    assert not c1._flx_loop.can_mutate(c1)
+
+    # A component in the main loop can connect to it
+    c2 = MyComp2(other=c1)
+    assert c2._flx_loop is event.loop
+    event.loop.iter()
+
+    c1.set_foo(3)  # the action is applied in the other thread
+    assert handled.wait(10)
+    assert c1.foo == 3
+    assert res == [0, 3]
+
+    # The events of the other loop are handled in the main loop
+    event.loop.iter()
+    assert res == [0, 3, 'main 0', 'main 3']
+
+    loops[0].call_soon_threadsafe(loops[0].stop)
+    t.join()
+    event.loop.integrate(reset=True)  # restore
+
+
 run_tests_if_main()
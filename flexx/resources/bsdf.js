@@ -398,6 +398,135 @@ BsdfSerializer.prototype.encode_object = function (f, value, extension_id) {
     }
 };
 
+//---- zlib decompression
+
+// Tables for the lengths and distances of deflate back-references
+var INFLATE_LBASE = [3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31,
+                     35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258];
+var INFLATE_LEXT = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+                    3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0];
+var INFLATE_DBASE = [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193,
+                     257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145,
+                     8193, 12289, 16385, 24577];
+var INFLATE_DEXT = [0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+                    7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13];
+var INFLATE_ORDER = [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15];
+
+function zlib_decompress(src, data_size) {
+    // Decompress zlib data (RFC 1950 and 1951) given as Uint8Array, into
+    // a Uint8Array of the given size. Synchronous and without dependencies,
+    // but not as fast as a native implementation.
+    var out = new Uint8Array(data_size);
+    var outpos = 0;
+    var pos = 2;  // skip the zlib header, we also ignore the adler32 checksum
+    var bitbuf = 0, bitcnt = 0;
+
+    function bits(n) {
+        while (bitcnt < n) {
+            if (pos >= src.length) { throw new Error("Unexpected end of zlib data"); }
+            bitbuf |= src[pos++] << bitcnt;
+            bitcnt += 8;
+        }
+        var v = bitbuf & ((1 << n) - 1);
+        bitbuf >>>= n;
+        bitcnt -= n;
+        return v;
+    }
+    function build(lengths, n) {
+        // Build canonical huffman table from code lengths
+        var counts = new Uint16Array(16), offs = new Uint16Array(16);
+        var symbols = new Uint16Array(n);
+        var i;
+        for (i=0; i<n; i++) { counts[lengths[i]] += 1; }
+        counts[0] = 0;
+        for (i=1; i<16; i++) { offs[i] = offs[i-1] + counts[i-1]; }
+        for (i=0; i<n; i++) { if (lengths[i]) { symbols[offs[lengths[i]]++] = i; } }
+        return {counts: counts, symbols: symbols};
+    }
+    function decode(h) {
+        var code = 0, first = 0, index = 0;
+        for (var len=1; len<16; len++) {
+            code |= bits(1);
+            var count = h.counts[len];
+            if (code - count < first) { return h.symbols[index + (code - first)]; }
+            index += count;
+            first = (first + count) << 1;
+            code <<= 1;
+        }
+        throw new Error("Invalid Huffman code in zlib data");
+    }
+
+    var i, lengths, lencode, distcode, last = 0;
+    while (!last) {
+        last = bits(1);
+        var type = bits(2);
+        if (type === 0) {
+            // Stored block; skip to byte boundary
+            bitbuf = 0; bitcnt = 0;
+            var n = src[pos] | (src[pos+1] << 8);
+            pos += 4;
+            out.set(src.subarray(pos, pos + n), outpos);
+            pos += n;
+            outpos += n;
+            continue;
+        } else if (type === 1) {
+            // Fixed Huffman codes
+            lengths = new Uint8Array(288);
+            for (i=0; i<144; i++) { lengths[i] = 8; }
+            for (i=144; i<256; i++) { lengths[i] = 9; }
+            for (i=256; i<280; i++) { lengths[i] = 7; }
+            for (i=280; i<288; i++) { lengths[i] = 8; }
+            lencode = build(lengths, 288);
+            lengths = new Uint8Array(30);
+            for (i=0; i<30; i++) { lengths[i] = 5; }
+            distcode = build(lengths, 30);
+        } else if (type === 2) {
+            // Dynamic Huffman codes
+            var nlen = bits(5) + 257, ndist = bits(5) + 1, ncode = bits(4) + 4;
+            lengths = new Uint8Array(19);
+            for (i=0; i<ncode; i++) { lengths[INFLATE_ORDER[i]] = bits(3); }
+            var lencodes = build(lengths, 19);
+            lengths = new Uint8Array(nlen + ndist);
+            i = 0;
+            while (i < nlen + ndist) {
+                var sym = decode(lencodes);
+                if (sym < 16) {
+                    lengths[i++] = sym;
+                } else {
+                    var prev = 0, rep;
+                    if (sym == 16) { prev = lengths[i-1]; rep = 3 + bits(2); }
+                    else if (sym == 17) { rep = 3 + bits(3); }
+                    else { rep = 11 + bits(7); }
+                    while (rep--) { lengths[i++] = prev; }
+                }
+            }
+            lencode = build(lengths.subarray(0, nlen), nlen);
+            distcode = build(lengths.subarray(nlen), ndist);
+        } else {
+            throw new Error("Invalid block type in zlib data");
+        }
+        // Decode the compressed data
+        while (true) {
+            var s = decode(lencode);
+            if (s < 256) {
+                out[outpos++] = s;
+            } else if (s == 256) {
+                break;
+            } else {
+                s -= 257;
+                var length = INFLATE_LBASE[s] + bits(INFLATE_LEXT[s]);
+                var d = decode(distcode);
+                var dist = INFLATE_DBASE[d] + bits(INFLATE_DEXT[d]);
+                for (var j=0; j<length; j++) {
+                    out[outpos] = out[outpos - dist];
+                    outpos += 1;
+                }
+            }
+        }
+    }
+    return out;
+}
+
 //---- decoder
 
 function BytesReader(buf) {
@@ -573,6 +702,8 @@ BsdfSerializer.prototype.decode_object = function (f) {
         f.get_bytes(allocated_size - used_size);  // skip extra space
         if (compression == 0) {
             value = new DataView(compressed.buffer, compressed.byteOffset, compressed.byteLength);
+        } else if (compression == 1) {
+            value = new DataView(zlib_decompress(compressed, data_size).buffer);
         } else {
             throw new Error("JS implementation of BSDF does not support compression (" + compression + ')');
         }
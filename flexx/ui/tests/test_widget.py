@@ -0,0 +1,90 @@
+""" Test the Widget class in JS, using a minimal fake DOM in Node.
+"""
+
+from pscript.functions import evaljs
+
+from flexx.util.testing import run_tests_if_main
+from flexx.app import assets
+
+from flexx import ui  # noqa - makes the widget modules known to the asset store
+
+
+FAKE_DOM = """
+var window = global;
+window.addEventListener = function () {};
+window.setInterval = function () {};
+window.getComputedStyle = function (node) { return node.style; };
+window.location = {protocol: 'http:', hostname: 'localhost', port: ''};
+var FakeNode = function (tag) {
+    this.nodeName = tag.toUpperCase();
+    this.children = [];
+    this.childNodes = this.children;
+    this.style = {};
+    this.clientWidth = this.clientHeight = 100;
+    this.classList = {add: function () {}, remove: function () {},
+                      toggle: function () {},
+                      contains: function () { return false; }};
+};
+FakeNode.prototype.addEventListener = function () {};
+FakeNode.prototype.removeEventListener = function () {};
+FakeNode.prototype.setAttribute = function () {};
+FakeNode.prototype.removeAttribute = function () {};
+FakeNode.prototype.appendChild = function (node) { this.children.push(node); };
+FakeNode.prototype.removeChild = function () {};
+FakeNode.prototype.getBoundingClientRect = function () {
+    return {left: 0, top: 0, width: 100, height: 100};
+};
+window.document = {
+    createElement: function (tag) { return new FakeNode(tag); },
+    createElementNS: function (ns, tag) { return new FakeNode(tag); },
+    createTextNode: function (text) { return new FakeNode('#text'); },
+    getElementById: function () { return null; },
+    head: new FakeNode('head'),
+    body: new FakeNode('body'),
+};
+"""
+
+
+def run_widget_js(code):
+    """ Run the given JS code after loading the Flexx core and the widget
+    module, with a JsSession that does not connect.
+    """
+    assets.update_modules()
+    js = FAKE_DOM
+    js += assets.get_asset('flexx-core.js').to_string()
+    js += assets.modules['flexx.ui._widget'].get_js()
+    js += """
+    window.flexx.is_exported = true;  // do not open a socket
+    var JsSession = flexx.require('flexx.app._clientcore').JsSession;
+    var session = new JsSession('app', 'id', 'ws://localhost/flexx/ws/app');
+    session.send_command = function () {};
+    var Widget = flexx.require('flexx.ui._widget').Widget;
+    """
+    return evaljs(js + code, print_result=False)
+
+
+def test_widget_without_parent_in_js():
+    # This is how the session instantiates a top-level widget created in Python
+    code = """
+    var w = session.instantiate_component('flexx.ui._widget', 'Widget',
+                                          'Widget_1', [], {}, []);
+    console.log(w.id + ' ' + (w.parent === null));
+    """
+    assert run_widget_js(code).strip() == 'Widget_1 true'
+
+
+def test_widget_parent_from_active_component_in_js():
+    code = """
+    var w1 = session.instantiate_component('flexx.ui._widget', 'Widget',
+                                           'Widget_1', [], {}, []);
+    var w2 = session.instantiate_component('flexx.ui._widget', 'Widget',
+                                           'Widget_2', [], {}, [w1]);
+    // The parent is set via an action, wait for the loop to apply it
+    setTimeout(function () {
+        console.log(w2.parent.id + ' ' + w1.children.length);
+    }, 10);
+    """
+    assert run_widget_js(code).strip() == 'Widget_1 1'
+
+
+run_tests_if_main()
@@ -91,10 +91,6 @@ class PlotSmartMS(CanvasWidget):
 
         self.time = time()
 
-        self.serving = False
-        self.pending = False
-        
-
         self._last_pos = {}
         # Set mouse capturing mode
         self.set_capture_mouse(1)
@@ -145,16 +141,10 @@ class PlotSmartMS(CanvasWidget):
         ctx.fillStyle = fill
         ctx.fill()
 
-    @event.reaction('background', 'bandindicator', 'mark', 'label', 'line', 'hint', 'cross')
+    @event.reaction('background', 'bandindicator', 'mark', 'label', 'line', 'hint', 'cross',
+                    mode='animation-frame')
     def update(self, *events):
-        if not self.serving:
-            #print('call:'+time())
-            self.serving = True
-            self.pending = False
-            window.requestAnimationFrame(self._update)
-        else:
-            #print('pending:'+time())
-            self.pending = True
+        self._update()
 
     def _update(self):
         w, h = self.node.clientWidth, self.node.clientHeight
@@ -185,14 +175,6 @@ class PlotSmartMS(CanvasWidget):
 
         for key, values in self.dot.items():
             self.create_dot(*values)
-
-        if self.pending:
-            #print('recall')
-            self.serving = True
-            self.pending = False
-            window.requestAnimationFrame(self._update)
-
-        self.serving = False
  
     def show_event(self, ev):
         if -1 in ev.touches:  # Mouse
@@ -102,9 +102,9 @@ class PlotStock(CanvasWidget):
     
     @event.reaction('dat', 'otherseries', 'yrange', 'line_color', 'line_width',
                     'marker_color', 'marker_size', 'xlabel', 'ylabel',
-                    'title', 'size')
+                    'title', 'size', mode='animation-frame')
     def update(self, *events):
-        window.requestAnimationFrame(self._update)
+        self._update()
 
     def _update(self):
         #raise SyntaxError('for debug')
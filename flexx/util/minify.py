@@ -1,111 +1,144 @@
 """
 JavaScript minification tools.
+
+The code is split into tokens using a regular expression, so that strings,
+regular expressions and comments are recognized as such. Comments and
+whitespace can then be removed, local names (variables and arguments of
+functions) can be mangled into short names, and a source map can be
+produced that maps the minified code to the original code.
+
+Mangling is conservative: a function and the functions that enclose it
+are left alone if it uses ``eval``, ``with``, ``class``, or template
+strings with substitutions; names that occur as shorthand properties are
+not mangled; and names at the top level are never mangled.
 """
 
-def minify(code, remove_whitespace=False):
-    """ Very basic minification of JavaScript code. Will likely support
-    more advanced minifcation in the future.
+import re
+import itertools
+
+__all__ = ['minify', 'minify_with_source_map', 'tokenize']
+
+
+_token_re = re.compile(r'''
+    (?P<nl>[ \t\f\v\r\u00a0\ufeff]*\n\s*)
+  | (?P<ws>[ \t\f\v\r\u00a0\ufeff]+)
+  | (?P<comment>//[^\n]*|/\*[\s\S]*?\*/)
+  | (?P<string>"(?:[^"\\\n]|\\[\s\S])*"|'(?:[^'\\\n]|\\[\s\S])*')
+  | (?P<template>`(?:[^`\\]|\\[\s\S])*`)
+  | (?P<name>[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*)
+  | (?P<number>0[xXoObB][\da-fA-F_]+n?|
+               (?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?)
+  | (?P<punct>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|=>|\?\?=?|\?\.(?!\d)|&&=?|\|\|=?|
+              [-+*/%&|^<>!=]=|\+\+|--|<<|>>|\*\*|[{}()\[\];,.<>+\-*/%&|^!~?:=])
+  | (?P<other>[\s\S])
+''', re.VERBOSE)
+
+_regex_re = re.compile(r'/(?![*/])(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[\w$]*')
+
+# Names after which a slash starts a regular expression rather than a
+# division, and after which a curly brace starts an object literal
+_regex_after_names = set('return typeof instanceof in of new delete void throw '
+                         'case do else yield await'.split())
+_object_after_names = _regex_after_names.difference(['do', 'else'])
+
+_reserved = set('''
+    break case catch class const continue debugger default delete do else enum
+    export extends false finally for function if import in instanceof new null
+    return super switch this throw true try typeof var void while with yield
+    let static await implements package protected interface private public
+    undefined NaN Infinity arguments eval'''.split())
+
+# Tokens after and before which a newline can be dropped without the
+# automatic semicolon insertion of JS changing the meaning of the code
+_no_nl_after = set('{ ( [ , ; : ? . = == === != !== < > <= >= + - * / % ** '
+                   '&& || ?? & | ^ ! ~ += -= *= /= %= **= <<= >>= >>>= &= |= '
+                   '^= &&= ||= ??= << >> >>> =>'.split())
+_no_nl_before = set(') ] } , ; : ? . ?. = == === != !== < > <= >= * % ** && || '
+                    '?? & | ^ += -= *= /= %= **= <<= >>= >>>= &= |= ^= &&= '
+                    '||= ??= << >> >>> =>'.split())
+
+_word_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                  '0123456789_$\\')
+
+
+def tokenize(code):
+    """ Split the given JavaScript code into a list of tokens. Each token
+    is a tuple (kind, text), where kind is one of 'nl' (whitespace with a
+    newline), 'ws', 'comment', 'string', 'template', 'regex', 'name',
+    'number', 'punct' or 'other'. Joining the texts gives the original code.
+    """
+    tokens = []
+    pos = 0
+    prev = None  # last significant token
+    match = _token_re.match
+    while pos < len(code):
+        m = match(code, pos)
+        kind = m.lastgroup
+        text = m.group()
+        if kind == 'punct' and text[0] == '/':
+            if (prev is None or
+                    (prev[0] == 'punct' and prev[1] not in (')', ']', '++', '--')) or
+                    (prev[0] == 'name' and prev[1] in _regex_after_names)):
+                m2 = _regex_re.match(code, pos)
+                if m2:
+                    kind, text = 'regex', m2.group()
+        token = kind, text
+        tokens.append(token)
+        if kind not in ('nl', 'ws', 'comment'):
+            prev = token
+        pos += len(text)
+    return tokens
+
+
+def minify(code, remove_whitespace=False, mangle=False):
+    """ Minification of JavaScript code.
 
     Parameters:
         code (str) : the JavaScript code to minify.
         remove_whitespace (bool) : if True, removes all non-functional
             whitespace. Otherwise remove all trailing whitespace and
             indents using tabs to preserve space. Default False.
+        mangle (bool) : if True, rename local variables and function
+            arguments to short names. Default False.
     """
-    code = remove_comments(code)
     if remove_whitespace:
-        code = remove_all_whitespace(code)
-    else:
-        code = remove_trailing_whitespace(code)
-        code = remove_empty_lines(code)
-        code = tabbify(code)
+        return _Minifier(code, mangle).get_code()
+    code = _Minifier(code, mangle, keep_whitespace=True).get_code()
+    code = remove_trailing_whitespace(code)
+    code = remove_empty_lines(code)
+    code = tabbify(code)
     return code
 
+
+def minify_with_source_map(code, filename, mangle=True, source_name=None):
+    """ Minify the given JavaScript code, removing all non-functional
+    whitespace and (by default) mangling local names. Returns a tuple
+    (code, source_map), where source_map is a dict representing a
+    version 3 source map, which includes the original code. The given
+    filename is the name of the result, and source_name that of the
+    original code (default same as filename).
+    """
+    minifier = _Minifier(code, mangle, source_map=True)
+    return minifier.get_code(), minifier.get_source_map(filename, code,
+                                                        source_name)
+
+
 def remove_comments(code):
-    chars = ['\n']
-    class non_local:
-        pass
-    non_local._i = -1
-
-    def read():
-        non_local._i += 1
-        if non_local._i < len(code):
-            return code[non_local._i]
-    def to_end_of_string(c0):
-        chars.append(c0)
-        while True:
-            c = read()
-            if not c:
-                break
-            chars.append(c)
-            if c == c0 and chars[-2] != '\\':
-                return
-    def to_end_of_line():
-        while True:
-            c = read()
-            if c == '\n' or not c:
-                break
-    def to_end_of_mutiline_comment():
-        lastchar = ''
-        while True:
-            c = read()
-            if not c:
-                break
-            if c == '/' and lastchar == '*':
-                return
-            lastchar = c
-    while True:
-        c = read()
-        if not c:
-            break  # end of code
-        elif c == "'" or c == '"':
-            to_end_of_string(c)
-        elif c == '/' and chars[-1] == '/' and chars[-2] != '\\':
-            chars.pop(-1)
-            to_end_of_line()
-            chars.append('\n')
-        elif c == '*' and chars[-1] == '/':
-            chars.pop(-1)
-            to_end_of_mutiline_comment()
-        else:
-            chars.append(c)
-    chars.pop(0)
-    return ''.join(chars)
+    return ''.join(text for kind, text in tokenize(code) if kind != 'comment')
+
 
 def remove_all_whitespace(code):
-    raise RuntimeError('full whitespace removal for minification is currently broken')
-    # todo: this is broken
-    code = code.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
-    space_safe = ' =+-/*&|(){},.><:;'
-    chars = ['\n']
-    class non_local:
-        pass
-    non_local._i = -1
-
-    def read():
-        non_local._i += 1
-        if non_local._i < len(code):
-            return code[non_local._i]
-    while True:
-        c = read()
-        if not c:
-            break  # end of code
-        if c in ' ':
-            if chars[-1] not in space_safe:
-                chars.append(c)
-        elif c in space_safe and chars[-1] == ' ':
-            chars[-1] = c  # replace last char
-        else:
-            chars.append(c)
-    chars.pop(0)
-    return ''.join(chars)
+    return _Minifier(code).get_code()
+
 
 def remove_empty_lines(code):
     return '\n'.join([line for line in code.splitlines() if line])
 
+
 def remove_trailing_whitespace(code):
     return '\n'.join([line.rstrip() for line in code.splitlines()])
 
+
 def tabbify(code):
     lines = []
     for line in code.splitlines():
@@ -115,3 +148,416 @@ def tabbify(code):
             indent_str = indent_str.replace(s1, s2)
         lines.append(indent_str + line2)
     return '\n'.join(lines)
+
+
+class _Scope:
+    """ The scope of a function (or the global scope), spanning a range of
+    token indices.
+    """
+
+    def __init__(self, parent, start, end):
+        self.parent = parent
+        self.start = start
+        self.end = end
+        self.declared = set()
+        self.unmangleable = set()
+        self.unsafe = parent is None  # never mangle the global scope
+        self.counts = {}
+        self.mapping = {}
+        self.children = []
+        if parent is not None:
+            parent.children.append(self)
+
+    def set_unsafe(self):
+        scope = self
+        while scope is not None:
+            scope.unsafe = True
+            scope = scope.parent
+
+
+class _Minifier:
+    """ Object to minify a piece of JS code.
+    """
+
+    def __init__(self, code, mangle=False, keep_whitespace=False,
+                 source_map=False):
+        # Get significant tokens, and their positions in the source
+        self._tokens = []
+        self._nl_before = []  # whether a token is preceded by a newline
+        self._ws_before = []  # the whitespace before a token, if we keep it
+        self._positions = []
+        line = col = 0
+        nl = False
+        ws = ''
+        for kind, text in tokenize(code):
+            if kind in ('nl', 'ws', 'comment'):
+                if '\n' in text:
+                    nl = True
+                if kind != 'comment':
+                    ws += text
+            else:
+                self._tokens.append((kind, text))
+                self._nl_before.append(nl)
+                self._ws_before.append(ws)
+                self._positions.append((line, col))
+                nl = False
+                ws = ''
+            n = text.count('\n')
+            if n:
+                line += n
+                col = len(text) - text.rfind('\n') - 1
+            else:
+                col += len(text)
+        self._ws_after = ws
+        self._keep_whitespace = keep_whitespace
+        self._source_map = source_map
+        self._renames = self._get_renames() if mangle else {}
+
+    ## Mangling
+
+    def _get_renames(self):
+        """ Get a dict that maps token indices to new names.
+        """
+        tokens = self._tokens
+        n = len(tokens)
+        texts = [t[1] for t in tokens]
+
+        # Match brackets
+        match = {}
+        stack = []
+        for i, text in enumerate(texts):
+            if tokens[i][0] != 'punct':
+                continue
+            if text in ('(', '[', '{'):
+                stack.append(i)
+            elif text in (')', ']', '}'):
+                if not stack:
+                    return {}  # unbalanced; leave the code alone
+                match[stack.pop()] = i
+        if stack:
+            return {}
+
+        # Find functions and their arguments
+        global_scope = _Scope(None, 0, n)
+        functions = {}  # start -> (end, names in own scope, name in parent)
+        function_names = []  # (index, name)
+        for i, text in enumerate(texts):
+            if text != 'function' or tokens[i][0] != 'name':
+                continue
+            if i > 0 and texts[i-1] in ('.', '?.'):
+                continue
+            j = i + 1
+            if j < n and texts[j] == '*':
+                j += 1  # generator
+            fname = None
+            if j < n and tokens[j][0] == 'name':
+                fname = texts[j]
+                j += 1
+            if j >= n or texts[j] != '(' or match[j] + 1 >= n:
+                continue
+            elif texts[match[j] + 1] != '{':
+                continue
+            body_end = match[match[j] + 1]
+            own_names = self._get_arg_names(j, match[j])
+            is_declaration = i == 0 or texts[i-1] in (';', '{', '}')
+            if fname and is_declaration:
+                functions[j] = body_end, own_names, fname
+            else:
+                if fname:
+                    own_names.add(fname)
+                functions[i] = body_end, own_names, None
+            # The name of a function is visible via its name attribute
+            if fname:
+                function_names.append((j - 1, fname))
+            elif i > 1 and texts[i-1] == '=' and tokens[i-2][0] == 'name':
+                function_names.append((i - 2, texts[i-2]))  # inferred name
+
+        # Walk the tokens to collect declarations and references
+        skip = set()  # indices of name tokens that are not references
+        keep = []  # (index, scope) of names that must keep their name
+        function_names = dict(function_names)
+        references = []  # (index, scope)
+        kinds = []  # stack of bracket kinds, to detect object literals
+        scope = global_scope
+        for i in range(n):
+            kind, text = tokens[i]
+            while i > scope.end:
+                scope = scope.parent
+            if i in functions:
+                end, own_names, fname = functions[i]
+                if fname:
+                    scope.declared.add(fname)
+                scope = _Scope(scope, i, end)
+                scope.declared.update(own_names)
+            prev = texts[i-1] if i > 0 else None
+            nxt = texts[i+1] if i < n - 1 else None
+            if kind == 'punct':
+                if text == '{':
+                    kinds.append('obj' if self._is_object_literal(i) else 'block')
+                elif text in ('(', '['):
+                    kinds.append(text)
+                elif text in (')', ']', '}'):
+                    kinds.pop()
+            elif kind == 'template':
+                if '${' in text:
+                    scope.set_unsafe()
+            elif kind == 'name':
+                if prev in ('.', '?.'):
+                    skip.add(i)  # property
+                elif nxt == ':' and prev in (None, '{', ',', ';', '}'):
+                    skip.add(i)  # property name or label
+                elif prev in ('break', 'continue') and not self._nl_before[i]:
+                    skip.add(i)  # label
+                elif text in ('eval', 'with', 'class'):
+                    scope.set_unsafe()
+                elif text == 'var':
+                    self._collect_var_names(i, match, scope)
+                elif i in function_names:
+                    keep.append((i, scope))
+                elif kinds and kinds[-1] == 'obj' and prev in ('{', ','):
+                    if text in ('get', 'set', 'async', 'static') and (
+                            nxt is not None and tokens[i+1][0] == 'name'):
+                        skip.add(i)
+                        skip.add(i + 1)  # getter/setter name
+                    elif nxt in (',', '}', '('):
+                        keep.append((i, scope))  # shorthand prop or method
+                if i not in skip and text not in _reserved:
+                    references.append((i, scope))
+
+        # Names used as shorthand properties, and names of functions (which
+        # are available as their name attribute) are not renamed
+        for i, scope in keep:
+            scope = self._resolve(texts[i], scope)
+            if scope is not None:
+                scope.unmangleable.add(texts[i])
+
+        # Count references per scope
+        for i, scope in references:
+            scope = self._resolve(texts[i], scope)
+            if scope is not None:
+                scope.counts[texts[i]] = scope.counts.get(texts[i], 0) + 1
+
+        # Assign new names, top-down, so that a scope can avoid the new
+        # names of its parents. Names used anywhere in the code are avoided
+        # altogether, so that we do not shadow globals or properties.
+        all_names = set(t[1] for t in tokens if t[0] == 'name')
+        todo = [(global_scope, set())]
+        while todo:
+            scope, taken = todo.pop()
+            if not scope.unsafe:
+                names = scope.declared - scope.unmangleable
+                names = sorted(names, key=lambda x: (-scope.counts.get(x, 0), x))
+                new_names = _short_names()
+                for name in names:
+                    new_name = next(new_names)
+                    while new_name in all_names or new_name in taken:
+                        new_name = next(new_names)
+                    if len(new_name) < len(name):
+                        scope.mapping[name] = new_name
+                taken = taken | set(scope.mapping.values())
+            for child in scope.children:
+                todo.append((child, taken))
+
+        # Collect renames
+        renames = {}
+        for i, scope in references:
+            scope = self._resolve(texts[i], scope)
+            if scope is not None and texts[i] in scope.mapping:
+                renames[i] = scope.mapping[texts[i]]
+        return renames
+
+    def _resolve(self, name, scope):
+        """ Get the scope in which the given name is declared, or None.
+        """
+        while scope is not None:
+            if name in scope.declared:
+                return scope
+            scope = scope.parent
+        return None
+
+    def _get_arg_names(self, i1, i2):
+        """ Get the names of the arguments of a function, given the indices
+        of the opening and closing parenthesis.
+        """
+        names = set()
+        depth = 0
+        for i in range(i1 + 1, i2):
+            kind, text = self._tokens[i]
+            if text in ('(', '[', '{'):
+                depth += 1
+            elif text in (')', ']', '}'):
+                depth -= 1
+            elif kind == 'name' and depth == 0 and (
+                    self._tokens[i-1][1] in ('(', ',', '...')):
+                names.add(text)
+        return names
+
+    def _collect_var_names(self, i, match, scope):
+        """ Collect the names declared by the var statement at index i.
+        """
+        tokens = self._tokens
+        expect_name = True
+        j = i + 1
+        while j < len(tokens):
+            kind, text = tokens[j]
+            if (self._nl_before[j] and kind == 'name' and not expect_name and
+                    tokens[j-1][1] not in _no_nl_after):
+                break  # end of statement by automatic semicolon insertion
+            if kind == 'name' and expect_name:
+                scope.declared.add(text)
+                expect_name = False
+            elif text in ('(', '[', '{'):
+                expect_name = False
+                j = match[j]  # skip initializer or destructuring
+            elif text in (')', ']', '}', ';'):
+                break
+            elif text == ',':
+                expect_name = True
+            j += 1
+
+    def _is_object_literal(self, i):
+        """ Get whether the curly brace at the given index opens an object
+        literal (rather than a block). Errs on the side of object literals,
+        which makes mangling more conservative.
+        """
+        if i == 0:
+            return False
+        kind, text = self._tokens[i-1]
+        if kind == 'punct':
+            return text not in (')', ']', '}', ';', '{', '=>')
+        elif kind == 'name':
+            return text in _object_after_names
+        return False
+
+    ## Output
+
+    def get_code(self):
+        """ Get the minified code.
+        """
+        tokens = self._tokens
+        renames = self._renames
+        keep_whitespace = self._keep_whitespace
+        record = self._source_map
+        parts = []
+        self._mappings = mappings = [[]]
+        self._names = names = []
+        name_indices = {}
+        col = 0
+        prev = prev_kind = ''
+        for i, (kind, text) in enumerate(tokens):
+            new_text = renames.get(i, text)
+            # Get separator
+            if keep_whitespace:
+                sep = self._ws_before[i]
+                if not sep and _needs_space(prev, new_text):
+                    sep = ' '  # a comment was removed
+            elif (self._nl_before[i] and prev and prev not in _no_nl_after and
+                    new_text not in _no_nl_before):
+                sep = '\n'
+            elif _needs_space(prev, new_text) or (
+                    prev_kind == 'regex' and new_text[0] in _word_chars):
+                sep = ' '
+            else:
+                sep = ''
+            if sep:
+                parts.append(sep)
+                nls = sep.count('\n')
+                if nls:
+                    mappings.extend([] for j in range(nls))
+                    col = len(sep) - sep.rfind('\n') - 1
+                else:
+                    col += len(sep)
+            # Record mapping
+            if record:
+                line, src_col = self._positions[i]
+                if new_text != text:
+                    if text not in name_indices:
+                        name_indices[text] = len(names)
+                        names.append(text)
+                    mappings[-1].append((col, line, src_col, name_indices[text]))
+                elif kind != 'punct' or not mappings[-1]:
+                    mappings[-1].append((col, line, src_col))
+            # Add token
+            parts.append(new_text)
+            nls = new_text.count('\n')
+            if nls:  # multiline strings and templates
+                mappings.extend([] for j in range(nls))
+                col = len(new_text) - new_text.rfind('\n') - 1
+            else:
+                col += len(new_text)
+            prev, prev_kind = new_text, kind
+        if keep_whitespace:
+            parts.append(self._ws_after)
+        return ''.join(parts)
+
+    def get_source_map(self, filename, code, source_name=None):
+        """ Get the source map (as a dict) for the code produced by
+        get_code(), which must be called first.
+        """
+        lines = []
+        prev = [0, 0, 0, 0]  # src col, src line, src col, name index
+        for segments in self._mappings:
+            prev[0] = 0  # the output column is relative to the line
+            line = []
+            for segment in segments:
+                values = [segment[0] - prev[0], 0, segment[1] - prev[1],
+                          segment[2] - prev[2]]
+                prev[:3] = segment[:3]
+                if len(segment) > 3:
+                    values.append(segment[3] - prev[3])
+                    prev[3] = segment[3]
+                line.append(''.join(_vlq_encode(v) for v in values))
+            lines.append(','.join(line))
+        return dict(version=3, file=filename, sources=[source_name or filename],
+                    sourcesContent=[code], names=self._names,
+                    mappings=';'.join(lines))
+
+
+def _needs_space(prev, text):
+    """ Get whether a space is needed between two pieces of code.
+    """
+    if not prev:
+        return False
+    a, b = prev[-1], text[0]
+    if a in _word_chars and b in _word_chars:
+        return True
+    elif b == '.' and prev[0] in '0123456789' and a != '.':
+        return True  # e.g. "1 .toString()"
+    elif a in '+-' and b == a:
+        return True  # e.g. "a - -b"
+    elif a == '/' and b in '/*':
+        return True  # would become a comment
+    elif (a == '<' and b == '!') or (prev.endswith('--') and b == '>'):
+        return True  # would become a HTML comment
+    return False
+
+
+_vlq_chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+
+def _vlq_encode(value):
+    """ Encode an integer using base64 VLQ, as used in source maps.
+    """
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    chars = []
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digit |= 32
+        chars.append(_vlq_chars[digit])
+        if not value:
+            return ''.join(chars)
+
+
+def _short_names():
+    """ Generate short names: a, b, ..., aa, ab, ...
+    """
+    first = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_$'
+    rest = first + '0123456789'
+    for c in first:
+        yield c
+    for size in itertools.count(1):
+        for c in first:
+            for cc in itertools.product(rest, repeat=size):
+                yield c + ''.join(cc)
@@ -0,0 +1,124 @@
+from flexx.util.testing import run_tests_if_main
+
+from pscript import evaljs, get_full_std_lib
+
+from flexx.util.minify import minify, minify_with_source_map, tokenize
+from flexx.util.minify import remove_comments, _vlq_encode
+
+
+CODE = r"""
+// A comment
+var make_counter = function (start, step) {
+    var count = start || 0;  /* block
+    comment */
+    var result = {count: count, step: step};
+    function increase (amount) {
+        count += amount === undefined ? step : amount;
+        return count / 2 / 1;
+    }
+    result.increase = increase;
+    return result;
+};
+var counter = make_counter(3, 2);
+counter.increase();
+counter.increase(4);
+var re = /[/"]+\/x/g;
+var s = "a // not a comment" + '/* neither */' + "x".replace(re, '');
+label:
+for (var i = 0; i < 3; i++) {
+    if (i == 1) { continue label; }
+    s += -i - -1 + +i;
+}
+counter.increase(1) + ' ' + s + ' ' + counter.count + ' ' + counter.step
+"""
+
+
+def test_tokenize():
+    tokens = tokenize(CODE)
+    assert ''.join(t[1] for t in tokens) == CODE
+    kinds = dict((text, kind) for kind, text in tokens)
+    assert kinds['// A comment'] == 'comment'
+    assert kinds['"a // not a comment"'] == 'string'
+    assert kinds["'/* neither */'"] == 'string'
+    assert kinds['/[/"]+\\/x/g'] == 'regex'
+    assert kinds["==="] == 'punct'
+    # Division is not a regex
+    assert [t for t in tokenize('a / b / c') if t[0] == 'regex'] == []
+    assert [t for t in tokenize('(a) / b / c') if t[0] == 'regex'] == []
+    assert tokenize('return /x/g')[-1] == ('regex', '/x/g')
+
+
+def test_minify_whitespace_and_comments():
+    code = remove_comments(CODE)
+    assert 'A comment' not in code and 'block' not in code
+    assert 'not a comment' in code
+
+    code1 = minify(CODE)
+    assert 'A comment' not in code1
+    assert '\n\tvar count' in code1  # indentation is tabbified
+
+    code2 = minify(CODE, remove_whitespace=True)
+    assert len(code2) < len(code1) < len(CODE)
+    assert 'var count=start||0;' in code2
+    assert '- -1' in code2 and '+ +i' in code2
+    assert 'var make_counter' in code2 and 'start' in code2
+
+    result = evaljs(CODE)
+    assert evaljs(code1) == result
+    assert evaljs(code2) == result
+
+
+def test_minify_mangle():
+    code = minify(CODE, True, True)
+    # Local names are mangled, but not top-level names, properties and labels
+    assert 'amount' not in code and 'start' not in code
+    assert 'make_counter' in code and 'counter.increase' in code
+    assert 'count:' in code and 'step:' in code and 'label' in code
+    # Names of functions are kept, because Flexx uses func.name
+    assert 'function increase(' in code
+    assert evaljs(code) == evaljs(CODE)
+
+    # Also works for the PScript standard library
+    code = get_full_std_lib() + '\nconsole.log(_pyfunc_op_mult("ab", 3));'
+    code2 = minify(code, True, True)
+    assert len(code2) < 0.75 * len(code)
+    assert evaljs(code2, print_result=False) == 'ababab'
+
+
+def test_minify_mangle_unsafe():
+
+    # No mangling in functions that use eval, and the functions around it
+    code = 'var f = function (foo) { return function () { return eval("foo"); }; };'
+    assert 'foo' in minify(code, True, True).replace('"foo"', '')
+
+    # Shorthand properties are not mangled
+    code = 'var f = function (foo, bar) { return {foo, bar: bar}; };'
+    code2 = minify(code, True, True)
+    assert '{foo,bar:' in code2
+    assert evaljs(code2 + "JSON.stringify(f(1, 2))") == \
+        '{"foo":1,"bar":2}'
+
+    # Template strings with substitutions
+    code = 'var f = function (foo) { return `x ${foo}`; };'
+    assert '${foo}' in minify(code, True, True)
+
+
+def test_minify_source_map():
+    code, source_map = minify_with_source_map(CODE, 'foo.js')
+    assert code == minify(CODE, True, True)
+    assert source_map['version'] == 3
+    assert source_map['file'] == 'foo.js'
+    assert source_map['sources'] == ['foo.js']
+    assert source_map['sourcesContent'] == [CODE]
+    assert 'amount' in source_map['names']
+    assert source_map['mappings'].count(';') == code.count('\n')
+
+    _, source_map = minify_with_source_map(CODE, 'foo.js', False, 'foo.src.js')
+    assert source_map['sources'] == ['foo.src.js']
+    assert source_map['names'] == []
+
+    assert [_vlq_encode(i) for i in (0, 1, -1, 15, 16, 123)] == \
+        ['A', 'C', 'D', 'e', 'gB', '2H']
+
+
+run_tests_if_main()